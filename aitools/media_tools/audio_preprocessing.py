@@ -0,0 +1,208 @@
+"""
+Compact, cached audio conversion before transcription.
+
+Speech recognition models resample everything to 16 kHz mono, so uploading a
+stereo 44.1 kHz MP3 costs upload time without improving the transcript.
+`preprocess_audio` pipes audio through ffmpeg, downmixes it to mono, resamples
+it to 16 kHz and encodes it with Opus at a speech bitrate, which is typically a
+tenth of the source's size. ffmpeg writes to a pipe, so no full-bitrate copy is
+written next to the input, and it never prompts.
+
+Converted files are cached on disk, named after the source's content hash and
+the conversion settings, so reruns skip ffmpeg entirely. The cache is bounded
+by size with least-recently-used eviction.
+
+Usage:
+    from aitools.media_tools.audio_preprocessing import configure_audio_preprocessing
+
+    configure_audio_preprocessing(bitrate="32k", cache_dir="/mnt/scratch/audio")
+"""
+
+import hashlib
+import os
+import subprocess
+import threading
+from typing import Union
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_settings = {
+    "enabled": True,
+    "sample_rate": 16000,
+    "channels": 1,
+    "codec": "libopus",
+    "bitrate": "24k",
+    "format": "ogg",
+    "cache_dir": "~/.cache/aitools/audio",
+    "cache_max_bytes": 2 * 1024**3,
+}
+
+_lock = threading.Lock()
+# (path, mtime_ns, size) -> content digest, so unchanged files are only hashed once
+_digests = {}
+_stats = {"hits": 0, "misses": 0, "bytes_before": 0, "bytes_after": 0}
+
+
+def configure_audio_preprocessing(
+    enabled: bool = None,
+    sample_rate: int = None,
+    channels: int = None,
+    codec: str = None,
+    bitrate: str = None,
+    format: str = None,
+    cache_dir: str = None,
+    cache_max_bytes: int = None,
+):
+    '''
+    Change how audio is prepared for speech recognition. Arguments left as None keep their current values.
+
+    Args:
+    - enabled (bool): Set to False to send audio as it is (non-MP3 files are still converted to MP3).
+    - sample_rate (int): Output sample rate in Hz.
+    - channels (int): Output channels. 1 downmixes to mono.
+    - codec (str): The ffmpeg audio encoder, e.g. "libopus" or "libmp3lame".
+    - bitrate (str): The encoder bitrate, e.g. "24k".
+    - format (str): The output container, which must be one the model accepts, e.g. "ogg" or "mp3".
+    - cache_dir (str): Where converted files are kept.
+    - cache_max_bytes (int): Total size of converted files kept in cache_dir.
+    '''
+    if sample_rate is not None:
+        assert sample_rate > 0, f"Sample rate must be positive, but you requested {sample_rate}."
+    if channels is not None:
+        assert channels in [1, 2], f"Audio can be converted to 1 or 2 channels, not {channels}."
+
+    updates = {
+        "enabled": enabled,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "codec": codec,
+        "bitrate": bitrate,
+        "format": format,
+        "cache_dir": cache_dir,
+        "cache_max_bytes": cache_max_bytes,
+    }
+    with _lock:
+        _settings.update({key: value for key, value in updates.items() if value is not None})
+
+
+def audio_preprocessing_enabled() -> bool:
+    return _settings["enabled"]
+
+
+def audio_preprocessing_settings() -> dict:
+    '''A copy of the current settings, e.g. to pass to configure_audio_preprocessing in a worker process.'''
+    with _lock:
+        return dict(_settings)
+
+
+def audio_preprocessing_stats() -> dict:
+    '''Cache hits and misses, and the total size of converted sources before and after conversion.'''
+    with _lock:
+        return dict(_stats)
+
+
+def _variant() -> str:
+    # Names the conversion, so a settings change never serves a file converted differently.
+    settings = "-".join(str(_settings[k]) for k in ("sample_rate", "channels", "codec", "bitrate", "format"))
+    return hashlib.sha256(settings.encode("utf-8")).hexdigest()[:12]
+
+
+def audio_digest(path: str) -> str:
+    '''The sha256 of an audio file's content. Unchanged files are only hashed once per process.'''
+    stat = os.stat(path)
+    file_key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if file_key in _digests:
+            return _digests[file_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    with _lock:
+        _digests[file_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+
+def output_format() -> str:
+    '''The container converted audio is written in, e.g. "ogg". Use it as the file extension.'''
+    return _settings["format"]
+
+
+def ffmpeg_output_args() -> list:
+    '''ffmpeg output options for compact speech audio, for other stages that re-encode (e.g. silence trimming).'''
+    return [
+        "-vn", "-ac", str(_settings["channels"]), "-ar", str(_settings["sample_rate"]),
+        "-c:a", _settings["codec"], "-b:a", _settings["bitrate"],
+        "-f", _settings["format"],
+    ]
+
+
+def _ffmpeg_command(input_arg: str) -> list:
+    return ["ffmpeg", "-hide_banner", "-v", "error", "-i", input_arg, *ffmpeg_output_args(), "pipe:1"]
+
+
+def _evict_cache(cache_dir: str):
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith(".tmp"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= _settings["cache_max_bytes"]:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def preprocess_audio(source: Union[str, bytes]) -> str:
+    '''
+    Convert audio to compact mono speech audio, or reuse an earlier conversion of the same content.
+
+    Args:
+    - source (str | bytes): The path to an audio file, or the file's bytes.
+
+    Returns:
+    - str: The path to the converted file in the cache directory.
+    '''
+    if isinstance(source, bytes):
+        digest = hashlib.sha256(source).hexdigest()
+        size_before = len(source)
+    else:
+        digest = audio_digest(source)
+        size_before = os.path.getsize(source)
+
+    cache_dir = os.path.expanduser(_settings["cache_dir"])
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{digest}-{_variant()}.{_settings['format']}")
+
+    if os.path.exists(path):
+        # Record the use so eviction is least-recently-used rather than oldest-first.
+        os.utime(path)
+        with _lock:
+            _stats["hits"] += 1
+        return path
+
+    # A path is read by ffmpeg directly, since some containers (e.g. m4a) need seeking;
+    # bytes are piped in. The output always comes back through a pipe.
+    if isinstance(source, bytes):
+        result = subprocess.run(_ffmpeg_command("pipe:0"), input=source, capture_output=True, check=True)
+    else:
+        result = subprocess.run(_ffmpeg_command(source), stdin=subprocess.DEVNULL, capture_output=True, check=True)
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(result.stdout)
+    os.replace(tmp_path, path)
+    _evict_cache(cache_dir)
+
+    with _lock:
+        _stats["misses"] += 1
+        _stats["bytes_before"] += size_before
+        _stats["bytes_after"] += len(result.stdout)
+    return path
@@ -1,30 +1,94 @@
+import contextvars
+import json
 import os
+import queue
+import re
+import threading
 import subprocess
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Iterable, List, Tuple, Union
 from tabulate import tabulate
 
+from aitools.media_tools.audio_preprocessing import (
+    audio_digest,
+    audio_preprocessing_enabled,
+    audio_preprocessing_settings,
+    configure_audio_preprocessing,
+    ffmpeg_output_args,
+    output_format,
+    preprocess_audio,
+)
+from aitools.media_tools.response_cache import get_transcription_cache, make_transcription_key
+from aitools.media_tools.usage_ledger import collect_usage, is_quiet, record_usage
 from aitools.third_party_apis.models import SpeechRecList, ALL_SPEECH_REC
 
 DEFAULT_SPEECH_REC = "whisper-1"
+# Long-audio mode: the longest chunk sent in one request, and how many requests run at once.
+DEFAULT_MAX_CHUNK_SECONDS = 600
+DEFAULT_TRANSCRIPTION_CONCURRENCY = 4
+# Chunks are sized to this fraction of the upload limit, leaving room for bitrate variation.
+UPLOAD_SAFETY_MARGIN = 0.9
+# silencedetect settings for choosing chunk boundaries.
+SILENCE_NOISE_DB = -30
+SILENCE_MIN_SECONDS = 0.5
+# Silence trimming: silences at least this long are cut, keeping this much padding on each side.
+TRIM_MIN_SILENCE_SECONDS = 1.0
+TRIM_PADDING_SECONDS = 0.25
+# Pipelined transcribe-then-translate: shorter chunks get translation started sooner.
+PIPELINE_CHUNK_SECONDS = 120
+DEFAULT_TRANSLATION_CONCURRENCY = 4
+# Files picked up when transcribe_many is given a directory.
+AUDIO_EXTENSIONS = {".mp3", ".m4a", ".mp4", ".mpeg", ".mpga", ".ogg", ".oga", ".opus", ".wav", ".webm", ".flac", ".aac"}
 
 
-def convert_to_mp3(filepath: str) -> str:
+@dataclass
+class Transcription:
+    '''
+    A transcription, stitched together from one or more requests.
+
+    Args:
+    - text (str): The full transcript.
+    - language (str): The detected language.
+    - duration (float): Audio duration sent to the model (and billed), in seconds.
+    - segments (List[dict]): verbose_json segments (id, start, end, text), with times relative to the original file.
+    - chunks (int): The number of requests the audio was sent in.
+    - trimmed_seconds (float): Silence cut before transcription. The original file is duration + trimmed_seconds long.
+    '''
+    text: str
+    language: str = None
+    duration: float = 0.0
+    segments: List[dict] = field(default_factory=list)
+    chunks: int = 1
+    trimmed_seconds: float = 0.0
+
+
+def _segment_dict(segment) -> dict:
+    if isinstance(segment, dict):
+        return dict(segment)
+    if hasattr(segment, "model_dump"):
+        return segment.model_dump()
+    return {"id": segment.id, "start": segment.start, "end": segment.end, "text": segment.text}
+
+
+def convert_to_mp3(filepath: str, overwrite: bool = False) -> str:
     """
     Convert an audio file to mp3 format using ffmpeg.
     The output file will be saved in the same directory as the input file.
 
     Args:
     - filepath (str): The path to the audio file.
+    - overwrite (bool): Convert again even if the mp3 file already exists. Otherwise it is reused.
 
     Returns:
     - output_file (str): The path to the converted mp3 file.
     """
     output_file = os.path.splitext(filepath)[0] + ".mp3"
-    if os.path.exists(output_file):
-        overwrite = input(f"Overwrite {output_file}? (y/n): ")
-        if overwrite.lower() != "y":
-            return output_file
+    if os.path.exists(output_file) and not overwrite:
+        return output_file
     subprocess.run(
-        ["ffmpeg", "-y", "-i", filepath, output_file],
+        ["ffmpeg", "-y", "-nostdin", "-i", filepath, output_file],
         stdout=subprocess.DEVNULL,
         stderr=subprocess.DEVNULL,
         check=True
@@ -35,13 +99,18 @@ def convert_to_mp3(filepath: str) -> str:
 def log_transcription_cost(
     duration: float,
     model:SpeechRecList = DEFAULT_SPEECH_REC,
+    latency: float = None,
+    cache_hit: bool = False,
 ):
     '''
-    Log the cost of a transcription response.
+    Log the cost of a transcription response, and record it in the usage ledger.
 
     Args:
     - duration (int): The duration of the audio file in seconds.
     - model (str): The speech recognition model used.
+    - latency (float): How long the transcription request took, in seconds, if known.
+    - cache_hit (bool): The transcription came from the transcription cache, so it cost nothing.
+        The cost it saved is shown and recorded instead.
     '''
 
     duration_sec = round(duration)
@@ -49,40 +118,582 @@ def log_transcription_cost(
     
     cost = duration_min * ALL_SPEECH_REC[model]['cost_per_min']
 
+    if cache_hit:
+        record_usage(
+            "transcription", model, ALL_SPEECH_REC[model]['provider'],
+            duration_seconds=0, cost=0, saved_cost=cost, response_cache_hit=True, latency=latency,
+        )
+    else:
+        record_usage(
+            "transcription", model, ALL_SPEECH_REC[model]['provider'],
+            duration_seconds=duration, cost=cost, latency=latency,
+        )
+    if is_quiet():
+        return
+
     minutes = int(duration_sec // 60)
     seconds = duration_sec % 60
 
     data = [
         ["Duration", f"{minutes}m {seconds}s"],
-        ["Cost", f"${cost:.5f}"],
+        ["Cost", f"${0 if cache_hit else cost:.5f}"],
     ]
+    if cache_hit:
+        data.append(["Saved (cached)", f"${cost:.5f}"])
 
     print(tabulate(data, colalign=("left", "right")))
 
     return
 
 
+def audio_duration(file_path: str) -> float:
+    '''The duration of an audio file in seconds, read with ffprobe.'''
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", file_path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip())
+
+
+def detect_silences(
+    file_path: str,
+    noise_db: float = SILENCE_NOISE_DB,
+    min_silence: float = SILENCE_MIN_SECONDS,
+) -> List[Tuple[float, float]]:
+    '''
+    Find the silent stretches of an audio file with ffmpeg's silencedetect filter.
+
+    Args:
+    - file_path (str): The path to the audio file.
+    - noise_db (float): Audio quieter than this, in dB, counts as silence.
+    - min_silence (float): The shortest stretch, in seconds, reported as silence.
+
+    Returns:
+    - list: (start, end) of each silence, in seconds.
+    '''
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-nostats", "-i", file_path,
+            "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    starts = [float(t) for t in re.findall(r"silence_start: (-?[\d.]+)", result.stderr)]
+    ends = [float(t) for t in re.findall(r"silence_end: ([\d.]+)", result.stderr)]
+    # Silence running to the end of the file has no silence_end.
+    return list(zip(starts, ends + [float("inf")] * (len(starts) - len(ends))))
+
+
+def plan_chunks(
+    duration: float,
+    silences: List[Tuple[float, float]],
+    max_chunk_seconds: float,
+) -> List[Tuple[float, float]]:
+    '''
+    Split audio into chunks of at most max_chunk_seconds, cutting in the middle of a silence
+    where there is one in the second half of the chunk, so words aren't cut in two.
+
+    Returns:
+    - list: (start, end) of each chunk, in seconds, covering the whole file.
+    '''
+    midpoints = sorted((start + min(end, duration)) / 2 for start, end in silences)
+    chunks = []
+    cursor = 0.0
+    while duration - cursor > max_chunk_seconds:
+        limit = cursor + max_chunk_seconds
+        cuts = [t for t in midpoints if cursor + max_chunk_seconds / 2 < t <= limit]
+        cut = cuts[-1] if cuts else limit
+        chunks.append((cursor, cut))
+        cursor = cut
+    chunks.append((cursor, duration))
+    return chunks
+
+
+def split_audio(file_path: str, chunks: List[Tuple[float, float]], directory: str) -> List[str]:
+    '''Cut an audio file into the given (start, end) chunks with ffmpeg, without re-encoding.'''
+    ext = os.path.splitext(file_path)[1]
+    paths = []
+    for i, (start, end) in enumerate(chunks):
+        path = os.path.join(directory, f"chunk_{i:04d}{ext}")
+        subprocess.run(
+            ["ffmpeg", "-y", "-v", "error", "-ss", str(start), "-t", str(end - start), "-i", file_path, "-c", "copy", path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        paths.append(path)
+    return paths
+
+
+def plan_speech_spans(
+    duration: float,
+    silences: List[Tuple[float, float]],
+    min_silence: float = TRIM_MIN_SILENCE_SECONDS,
+    padding: float = TRIM_PADDING_SECONDS,
+) -> List[Tuple[float, float]]:
+    '''
+    The stretches of audio to keep when trimming silence: everything except silences of at
+    least min_silence, which are cut down to `padding` seconds on each side.
+
+    Returns:
+    - list: (start, end) of each span to keep, in seconds.
+    '''
+    spans = []
+    cursor = 0.0
+    for start, end in sorted(silences):
+        end = min(end, duration)
+        if end - start < max(min_silence, 2 * padding):
+            continue
+        # Silence at either end of the file only needs padding on its speech side.
+        if start > 0 and start + padding > cursor:
+            spans.append((cursor, start + padding))
+        cursor = end - padding if end < duration else duration
+    if cursor < duration:
+        spans.append((cursor, duration))
+    return spans
+
+
+def offset_map(spans: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    '''For each kept span, (start in the trimmed audio, start in the original audio).'''
+    mapping = []
+    trimmed = 0.0
+    for start, end in spans:
+        mapping.append((trimmed, start))
+        trimmed += end - start
+    return mapping
+
+
+def original_time(t: float, mapping: List[Tuple[float, float]]) -> float:
+    '''Map a time in the trimmed audio back to the original audio.'''
+    trimmed_start, original_start = mapping[0]
+    for span_trimmed, span_original in mapping:
+        if span_trimmed > t:
+            break
+        trimmed_start, original_start = span_trimmed, span_original
+    return original_start + t - trimmed_start
+
+
+def trim_audio(file_path: str, spans: List[Tuple[float, float]], output_path: str) -> str:
+    '''Keep only the given (start, end) spans of an audio file, re-encoded as compact speech audio.'''
+    selection = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in spans)
+    subprocess.run(
+        [
+            "ffmpeg", "-y", "-hide_banner", "-v", "error", "-nostdin", "-i", file_path,
+            "-af", f"aselect='{selection}',asetpts=N/SR/TB", *ffmpeg_output_args(), output_path,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return output_path
+
+
+def _prepare_audio(file_path: str) -> str:
+    if audio_preprocessing_enabled():
+        return preprocess_audio(file_path)
+    if file_path.endswith(".mp3"):
+        return file_path
+    return convert_to_mp3(file_path)
+
+
+def _trim_silence(audio_file: str, directory: str):
+    # Returns the audio to send, the offset map (None if nothing was cut) and the seconds cut.
+    duration = audio_duration(audio_file)
+    spans = plan_speech_spans(duration, detect_silences(audio_file))
+    trimmed_seconds = duration - sum(end - start for start, end in spans)
+    # Audio that is all silence is sent as it is.
+    if not spans or trimmed_seconds <= 0:
+        return audio_file, None, 0.0
+
+    trimmed = trim_audio(audio_file, spans, os.path.join(directory, f"trimmed.{output_format()}"))
+    if not is_quiet():
+        print(
+            f"Trimmed {trimmed_seconds:.0f}s of silence ({trimmed_seconds / duration:.0%} of the audio), "
+            f"saving {trimmed_seconds / 60:.1f} billed minutes.\n"
+        )
+    return trimmed, offset_map(spans), trimmed_seconds
+
+
+def _restore_timestamps(transcription: Transcription, mapping: list, trimmed_seconds: float):
+    for segment in transcription.segments:
+        segment["start"] = original_time(segment["start"], mapping)
+        segment["end"] = original_time(segment["end"], mapping)
+    transcription.trimmed_seconds = trimmed_seconds
+
+
+def _transcribe_file(file_path: str, model: str, language: str = None):
+    from aitools.third_party_apis.openai_tools import transcribe_via_openai as _transcribe
+
+    with open(file_path, "rb") as audio_file:
+        return _transcribe(audio_file, model=model, language=language)
+
+
+def _stitch(responses: list, offsets: List[float]) -> Transcription:
+    texts, segments = [], []
+    for response, offset in zip(responses, offsets):
+        texts.append(response.text.strip())
+        for segment in getattr(response, "segments", None) or []:
+            segment = _segment_dict(segment)
+            segment["id"] = len(segments)
+            segment["start"] += offset
+            segment["end"] += offset
+            segments.append(segment)
+    return Transcription(
+        text=" ".join(text for text in texts if text),
+        language=next((r.language for r in responses if getattr(r, "language", None)), None),
+        duration=sum(r.duration for r in responses),
+        segments=segments,
+        chunks=len(responses),
+    )
+
+
 def transcribe(
     file_path: str,
     model:SpeechRecList = DEFAULT_SPEECH_REC,
-):
+    long_audio: bool = None,
+    max_chunk_seconds: float = DEFAULT_MAX_CHUNK_SECONDS,
+    concurrency: int = DEFAULT_TRANSCRIPTION_CONCURRENCY,
+    language: str = None,
+    bypass_cache: bool = False,
+    trim_silence: bool = False,
+) -> Transcription:
     """
     Transcribe an audio file using the Whisper model.
+    The audio is first converted to compact mono speech audio (see audio_preprocessing.py).
+
+    Args:
+    - file_path (str): The path to the audio file.
+    - model (str): The speech recognition model to use.
+    - long_audio (bool): Split the audio on silences and transcribe the chunks concurrently.
+        By default, only files over the model's upload limit are split.
+    - max_chunk_seconds (float): The longest chunk in long-audio mode. Chunks are also kept
+        under the upload limit.
+    - concurrency (int): Chunks transcribed at once in long-audio mode.
+    - language (str): The audio's language as an ISO-639-1 code, e.g. "en". Detected if not given.
+    - bypass_cache (bool): Skip the transcription cache (see `enable_transcription_cache`) for this call.
+    - trim_silence (bool): Cut long silences before sending the audio, so fewer minutes are uploaded
+        and billed. Segment timestamps still refer to the original file.
+
+    Returns:
+    - Transcription: The text, language, duration and timestamped segments.
     """
 
-    from aitools.third_party_apis.openai_tools import transcribe_via_openai as _transcribe
+    from concurrent.futures import ThreadPoolExecutor
 
-    if file_path.endswith(".mp3"):
-        mp3_file = file_path
-    else:
-        mp3_file = convert_to_mp3(file_path)
+    cache = None if bypass_cache else get_transcription_cache()
+    if cache is not None:
+        options = {"trim_silence": True} if trim_silence else None
+        cache_key = make_transcription_key(audio_digest(file_path), model, language, options)
+        started = time.perf_counter()
+        cached = cache.get(cache_key)
+        if cached is not None:
+            transcription = Transcription(**cached)
+            log_transcription_cost(transcription.duration, model, latency=time.perf_counter() - started, cache_hit=True)
+            return transcription
+
+    audio_file = _prepare_audio(file_path)
+
+    with tempfile.TemporaryDirectory() as directory:
+        mapping, trimmed_seconds = None, 0.0
+        if trim_silence:
+            audio_file, mapping, trimmed_seconds = _trim_silence(audio_file, directory)
+
+        max_upload_bytes = ALL_SPEECH_REC[model].get('max_upload_bytes')
+        file_size = os.path.getsize(audio_file)
+        if long_audio is None:
+            long_audio = bool(max_upload_bytes) and file_size > max_upload_bytes
+
+        print(f'Calling speech recognition model "{model}"...\n')
+
+        started = time.perf_counter()
+        if not long_audio:
+            responses, offsets = [_transcribe_file(audio_file, model, language)], [0.0]
+        else:
+            duration = audio_duration(audio_file)
+            if max_upload_bytes:
+                bytes_per_second = file_size / duration
+                max_chunk_seconds = min(max_chunk_seconds, max_upload_bytes * UPLOAD_SAFETY_MARGIN / bytes_per_second)
+            chunks = plan_chunks(duration, detect_silences(audio_file), max_chunk_seconds)
+            offsets = [start for start, _ in chunks]
+            paths = split_audio(audio_file, chunks, directory)
+            print(f"Transcribing {len(paths)} chunks...\n")
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                responses = list(executor.map(lambda path: _transcribe_file(path, model, language), paths))
+        latency = time.perf_counter() - started
+
+    transcription = _stitch(responses, offsets)
+    if mapping:
+        _restore_timestamps(transcription, mapping, trimmed_seconds)
+    log_transcription_cost(transcription.duration, model, latency=latency)
+    if cache is not None:
+        cache.put(cache_key, asdict(transcription))
+
+    return transcription
+
+
+def _convert(file_path: str, settings: dict) -> str:
+    # Runs in a worker process, which may not have inherited the parent's settings.
+    configure_audio_preprocessing(**settings)
+    return _prepare_audio(file_path)
+
+
+def _audio_files(sources: Union[str, Iterable[str]]) -> List[str]:
+    if isinstance(sources, str):
+        sources = [sources]
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, names in os.walk(source):
+                dirs.sort()
+                files += [os.path.join(root, n) for n in sorted(names) if os.path.splitext(n)[1].lower() in AUDIO_EXTENSIONS]
+        else:
+            files.append(source)
+    return [os.path.abspath(f) for f in files]
+
+
+def _read_results(output_path: str) -> dict:
+    results = {}
+    if not os.path.exists(output_path):
+        return results
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; the file is transcribed again.
+                continue
+            results[record["file"]] = record
+    return results
+
+
+def transcribe_many(
+    sources: Union[str, Iterable[str]],
+    output_path: str,
+    model:SpeechRecList = DEFAULT_SPEECH_REC,
+    concurrency: int = DEFAULT_TRANSCRIPTION_CONCURRENCY,
+    processes: int = None,
+    language: str = None,
+    trim_silence: bool = False,
+) -> List[dict]:
+    """
+    Transcribe a folder (or list) of audio files, writing each result to a JSON Lines file as it completes.
+
+    Conversion runs in a process pool while earlier files are being transcribed, so ffmpeg
+    and uploads overlap. Files that already have a result in output_path are skipped, so
+    rerunning after a crash picks up where it stopped; failed files are tried again.
+
+    Args:
+    - sources (str | Iterable[str]): A directory (searched recursively for AUDIO_EXTENSIONS), a file, or a list of either.
+    - output_path (str): The JSON Lines file. Each line is a Transcription's fields plus "file",
+        or "file" and "error" for a failure.
+    - model (str): The speech recognition model to use.
+    - concurrency (int): Files transcribed at once.
+    - processes (int): Conversion worker processes. Defaults to the number of CPU cores.
+    - language (str): The audio's language as an ISO-639-1 code. Detected if not given.
+    - trim_silence (bool): Cut long silences before sending the audio (see `transcribe`).
+
+    Returns:
+    - list: The record for every file, in input order, including those from earlier runs.
+    """
+
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+    files = _audio_files(sources)
+    results = _read_results(output_path)
+    todo = [f for f in files if f not in results or "error" in results[f]]
+    print(f"Transcribing {len(todo)} files ({len(files) - len(todo)} already done)...\n")
+
+    def _transcribe(file_path):
+        return transcribe(file_path, model=model, language=language, trim_silence=trim_silence)
+
+    def _write(record):
+        results[record["file"]] = record
+        output.write(json.dumps(record) + "\n")
+        # Flushed per line, so a crash loses at most the files in flight.
+        output.flush()
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    settings = audio_preprocessing_settings()
+    with open(output_path, "a", encoding="utf-8") as output, \
+            ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as converters, \
+            ThreadPoolExecutor(max_workers=concurrency) as transcribers:
+        pending = {converters.submit(_convert, f, settings): ("convert", f) for f in todo}
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, file_path = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    _write({"file": file_path, "error": f"{type(e).__name__}: {e}"})
+                    continue
+                if stage == "convert":
+                    # The conversion is now cached, so transcribe picks it up without running ffmpeg again.
+                    pending[transcribers.submit(_transcribe, file_path)] = ("transcribe", file_path)
+                else:
+                    _write({"file": file_path, **asdict(result)})
+
+    failed = sum(1 for f in todo if "error" in results[f])
+    print(f"Transcribed {len(todo) - failed} files; {failed} failed. Results are in {output_path}.\n")
+    return [results[f] for f in files]
+
+
+def _log_pipeline_cost(records: List[dict]):
+    rows, total = {}, 0.0
+    for record in records:
+        label = f"{record['kind'].title()} ({record['model']})"
+        row = rows.setdefault(label, {"calls": 0, "cost": 0.0})
+        row["calls"] += 1
+        row["cost"] += record.get("cost") or 0
+        total += record.get("cost") or 0
+    if is_quiet():
+        return total
+
+    data = [[label, row["calls"], f"${row['cost']:.5f}"] for label, row in rows.items()]
+    data.append(["Total", "", f"${total:.5f}"])
+    print(tabulate(data, headers=["", "Calls", "Cost"], colalign=("left", "right", "right")))
+    return total
+
+
+def transcribe_and_translate(
+    file_path: str,
+    target_lang: str = "English",
+    transcriber:SpeechRecList = DEFAULT_SPEECH_REC,
+    llm: str = None,
+    chunk_seconds: float = PIPELINE_CHUNK_SECONDS,
+    transcribe_concurrency: int = DEFAULT_TRANSCRIPTION_CONCURRENCY,
+    translate_concurrency: int = DEFAULT_TRANSLATION_CONCURRENCY,
+    language: str = None,
+    trim_silence: bool = False,
+) -> dict:
+    """
+    Transcribe an audio file and translate it, with the two stages pipelined.
+
+    The audio is cut on silences into chunks of about chunk_seconds. Each chunk goes to
+    translation as soon as it is transcribed, through a bounded queue, so a long recording
+    finishes in about the time of the slower stage rather than the sum of both. Chunks already
+    in the target language are passed through untranslated. The pieces are reassembled in
+    order, and one combined cost report is printed at the end. With the transcription cache
+    enabled (see `enable_transcription_cache`), a cached transcription is reused.
+
+    Args:
+    - file_path (str): The path to the audio file.
+    - target_lang (str): The language to translate into.
+    - transcriber (str): The speech recognition model to use.
+    - llm (str): The model that translates. Defaults to translate's default.
+    - chunk_seconds (float): The longest chunk. Chunks are also kept under the upload limit.
+    - transcribe_concurrency (int): Chunks transcribed at once.
+    - translate_concurrency (int): Chunks translated at once. The queue between the stages holds
+        as many chunks again, so transcription pauses when translation falls behind.
+    - language (str): The audio's language as an ISO-639-1 code. Detected if not given.
+    - trim_silence (bool): Cut long silences before sending the audio (see `transcribe`).
+
+    Returns:
+    - dict: "transcription" (Transcription), "translation" (str) and "cost" (float, both stages).
+    """
+
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    from aitools.media_tools.text_tools import translate
+
+    def _translate(text, detected_language):
+        if (detected_language or "").lower() == target_lang.lower() or not text:
+            return text
+        return translate(text, target_lang, **({"model": llm} if llm else {}))
+
+    # A cached transcription leaves nothing to overlap; translate it in one go.
+    cache = get_transcription_cache()
+    if cache is not None:
+        cache_key = make_transcription_key(
+            audio_digest(file_path), transcriber, language, {"trim_silence": True} if trim_silence else None,
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            transcription = Transcription(**cached)
+            with collect_usage() as records:
+                log_transcription_cost(transcription.duration, transcriber, cache_hit=True)
+                translation = _translate(transcription.text, transcription.language)
+            return {"transcription": transcription, "translation": translation, "cost": _log_pipeline_cost(records)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        audio_file = _prepare_audio(file_path)
+        mapping, trimmed_seconds = None, 0.0
+        if trim_silence:
+            audio_file, mapping, trimmed_seconds = _trim_silence(audio_file, directory)
+        max_upload_bytes = ALL_SPEECH_REC[transcriber].get('max_upload_bytes')
+        duration = audio_duration(audio_file)
+        if max_upload_bytes:
+            bytes_per_second = os.path.getsize(audio_file) / duration
+            chunk_seconds = min(chunk_seconds, max_upload_bytes * UPLOAD_SAFETY_MARGIN / bytes_per_second)
+        chunks = plan_chunks(duration, detect_silences(audio_file), chunk_seconds)
+
+        transcribed = queue.Queue(maxsize=translate_concurrency)
+        responses, translations = {}, {}
+        errors = []
+
+        def _transcribe_chunk(index, path):
+            started = time.perf_counter()
+            response = _transcribe_file(path, transcriber, language)
+            log_transcription_cost(response.duration, transcriber, latency=time.perf_counter() - started)
+            return index, response
+
+        def _translate_chunks():
+            while True:
+                item = transcribed.get()
+                if item is None:
+                    return
+                index, response = item
+                try:
+                    translations[index] = _translate(response.text.strip(), getattr(response, "language", None))
+                except Exception as e:
+                    errors.append(e)
+
+        print(f'Transcribing and translating {len(chunks)} chunks with "{transcriber}"...\n')
+
+        with collect_usage() as records:
+            paths = [audio_file] if len(chunks) == 1 else split_audio(audio_file, chunks, directory)
+            # Threads don't inherit context variables; run each in a copy so its usage is collected.
+            translators = [
+                threading.Thread(target=contextvars.copy_context().run, args=(_translate_chunks,), daemon=True)
+                for _ in range(translate_concurrency)
+            ]
+            for translator in translators:
+                translator.start()
 
-    print(f'Calling speech recognition model "{model}"...\n')
+            try:
+                with ThreadPoolExecutor(max_workers=transcribe_concurrency) as executor:
+                    waiting = list(enumerate(paths))
+                    in_flight = set()
+                    while (waiting or in_flight) and not errors:
+                        # Only submit more work while there is room, so a slow translation stage holds transcription back.
+                        while waiting and len(in_flight) < transcribe_concurrency:
+                            index, path = waiting.pop(0)
+                            in_flight.add(executor.submit(contextvars.copy_context().run, _transcribe_chunk, index, path))
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            index, response = future.result()
+                            responses[index] = response
+                            transcribed.put((index, response))
+            finally:
+                for _ in translators:
+                    transcribed.put(None)
+                for translator in translators:
+                    translator.join()
 
-    with open(mp3_file, "rb") as audio_file:
-        transcription_response = _transcribe(audio_file)
+    if errors:
+        raise errors[0]
 
-    duration = transcription_response.duration
-    log_transcription_cost(duration, model)
+    transcription = _stitch([responses[i] for i in range(len(chunks))], [start for start, _ in chunks])
+    if mapping:
+        _restore_timestamps(transcription, mapping, trimmed_seconds)
+    translation = " ".join(translations[i] for i in range(len(chunks)) if translations[i])
+    if cache is not None:
+        cache.put(cache_key, asdict(transcription))
 
-    return transcription_response
\ No newline at end of file
+    cost = _log_pipeline_cost(records)
+    return {"transcription": transcription, "translation": translation, "cost": cost}
@@ -0,0 +1,189 @@
+"""Offline batch prompting through the OpenAI Batch and Anthropic Message Batches APIs.
+
+Batches trade latency (results within 24 hours) for half-price tokens and no
+rate-limit pressure. Submitted batches are recorded in a local JSON state file
+so they can be polled and collected from a later process.
+
+    batch_id = submit_batch(prompts, model="claude-haiku-4-5")
+    poll_batch(batch_id, wait=True)
+    for prompt_id, response in collect_batch(batch_id):
+        ...
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Iterable, Iterator, Tuple
+
+from aitools.media_tools.text_tools import _add_usage, _prepare_llm_call, _record_llm_usage, log_token_usage
+from aitools.third_party_apis.models import ALL_LLMS, LLMsList
+
+DEFAULT_STATE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "aitools", "batches.json")
+DEFAULT_POLL_INTERVAL = 60
+
+_state_lock = threading.Lock()
+
+
+def _get_batch_functions(provider: str):
+    """Import and return the submit, poll and collect functions for a provider."""
+
+    if provider == "openai":
+        from aitools.third_party_apis.openai_tools import (
+            submit_openai_batch as _submit,
+            poll_openai_batch as _poll,
+            collect_openai_batch as _collect,
+        )
+    elif provider == "anthropic":
+        from aitools.third_party_apis.anthropic_tools import (
+            submit_claude_batch as _submit,
+            poll_claude_batch as _poll,
+            collect_claude_batch as _collect,
+        )
+    else:
+        raise ValueError(f"Provider '{provider}' does not have batch support. Batches are available for OpenAI and Anthropic models.")
+
+    return _submit, _poll, _collect
+
+
+def _read_state(state_file: str) -> dict:
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, "r") as f:
+        return json.load(f)
+
+
+def _update_state(state_file: str, batch_id: str, record: dict):
+    with _state_lock:
+        state = _read_state(state_file)
+        state[batch_id] = {**state.get(batch_id, {}), **record}
+        if os.path.dirname(state_file):
+            os.makedirs(os.path.dirname(state_file), exist_ok=True)
+        # Write then rename so a crash never leaves a truncated state file.
+        tmp_file = f"{state_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_file, state_file)
+
+
+def _get_record(state_file: str, batch_id: str) -> dict:
+    record = _read_state(state_file).get(batch_id)
+    if record is None:
+        raise ValueError(f"Batch '{batch_id}' is not recorded in {state_file}.")
+    return record
+
+
+def submit_batch(
+    prompts: Iterable[dict],
+    model: LLMsList,
+    state_file: str = DEFAULT_STATE_FILE,
+) -> str:
+    """
+    Submit prompts to a provider's batch API.
+
+    Args:
+    - prompts (Iterable[dict]): Prompt specs. Each has a unique "id" plus the keyword
+        arguments of `prompt_llm` (messages, system_prompt, max_tokens, temperature,
+        json_output, truncate_input); only "id" and "messages" are required.
+    - model (str): The model for every prompt in the batch. Must be an OpenAI or Anthropic model.
+    - state_file (str): JSON file where the batch is recorded for later polling and collection.
+
+    Returns:
+    - str: The batch ID.
+    """
+
+    provider = ALL_LLMS[model]['provider']
+    _submit, _, _ = _get_batch_functions(provider)
+
+    requests = []
+    ids = {}
+    for i, spec in enumerate(prompts):
+        # Providers restrict custom IDs to short alphanumeric strings, so map caller IDs to our own.
+        custom_id = f"request-{i}"
+        ids[custom_id] = spec["id"]
+        _, request = _prepare_llm_call(
+            spec["messages"],
+            model,
+            spec.get("system_prompt", "You are a helpful assistant."),
+            spec.get("max_tokens", 0),
+            spec.get("temperature"),
+            spec.get("json_output", False),
+            spec.get("cache_system_prompt", False),
+            truncate_input=spec.get("truncate_input", False),
+        )
+        requests.append({"custom_id": custom_id, **request})
+
+    if len(set(ids.values())) != len(ids):
+        raise ValueError("Prompt IDs must be unique within a batch.")
+
+    print(f'Submitting batch of {len(requests)} prompts to LLM "{model}"...\n')
+
+    batch_id = _submit(requests)
+    _update_state(state_file, batch_id, {
+        "provider": provider,
+        "model": model,
+        "submitted_at": time.time(),
+        "status": "submitted",
+        "ids": ids,
+    })
+
+    return batch_id
+
+
+def poll_batch(
+    batch_id: str,
+    wait: bool = False,
+    interval: float = DEFAULT_POLL_INTERVAL,
+    state_file: str = DEFAULT_STATE_FILE,
+) -> dict:
+    """
+    Check the progress of a submitted batch.
+
+    Args:
+    - batch_id (str): The ID returned by `submit_batch`.
+    - wait (bool): Keep polling every `interval` seconds until the batch has ended.
+    - state_file (str): The state file the batch was recorded in.
+
+    Returns:
+    - dict: "ended" (bool), the provider's "status", and provider-specific request "counts".
+    """
+
+    record = _get_record(state_file, batch_id)
+    _, _poll, _ = _get_batch_functions(record["provider"])
+
+    while True:
+        progress = _poll(batch_id)
+        _update_state(state_file, batch_id, {"status": progress["status"]})
+        if progress["ended"] or not wait:
+            return progress
+        time.sleep(interval)
+
+
+def collect_batch(
+    batch_id: str,
+    state_file: str = DEFAULT_STATE_FILE,
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Stream the results of an ended batch, mapped back to the caller's prompt IDs.
+
+    Yields:
+    - tuple: (prompt ID, response). Responses have the same shape as the provider's
+        prompt function returns, or {"error": str} for prompts that failed.
+
+    Once every result has been yielded, total usage is logged at the batch discount.
+    """
+
+    record = _get_record(state_file, batch_id)
+    _, _, _collect = _get_batch_functions(record["provider"])
+
+    usage = {}
+    for custom_id, response in _collect(batch_id):
+        if "error" not in response:
+            _record_llm_usage(response, record["model"], batch=True)
+            _add_usage(usage, response)
+        yield record["ids"][custom_id], response
+
+    _update_state(state_file, batch_id, {"status": "collected"})
+
+    if usage:
+        log_token_usage(usage, record["model"], batch=True, record=False)
@@ -0,0 +1,210 @@
+"""
+Bounded conversation history for `chat_with_llm`.
+
+Without a policy, every turn is resent forever, so input tokens (and latency)
+grow with each turn until the model's input limit is hit. A `ChatContextPolicy`
+compacts the history once it crosses a high-water mark:
+- The most recent turns are kept verbatim, down to a low-water mark.
+- Older turns are folded into a running summary written by a cheap model, or
+  simply dropped with `summarize=False`.
+
+Compaction is deliberately lumpy: between compactions the history only grows at
+the end, so the provider's cached prefix (system prompt, summary, older turns)
+stays valid, and each compaction buys many turns before the next one.
+
+Usage:
+    from aitools.media_tools.chat_context import ChatContextPolicy
+
+    chat_with_llm(model="claude-haiku-4-5", context_policy=ChatContextPolicy(max_history_tokens=20000, keep_last_turns=6))
+"""
+
+from typing import List, Tuple
+
+from aitools.media_tools.usage_ledger import is_quiet
+from aitools.third_party_apis.models import ALL_LLMS
+from aitools.third_party_apis.token_counting import estimate_text_tokens
+
+# With no explicit budget, compact once the history reaches this fraction of the model's input limit.
+DEFAULT_BUDGET_FRACTION = 0.75
+# Flat per-image estimate; the original dimensions are gone once an image has been formatted.
+TOKENS_PER_IMAGE = 1000
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+SUMMARY_ACKNOWLEDGEMENT = "Understood. I'll continue the conversation with that context."
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Merge the existing summary with the new turns into one concise summary. Keep facts, "
+    "decisions, names, numbers, open questions and the user's preferences; drop pleasantries. "
+    "Reply with the summary only."
+)
+
+
+class ChatContextPolicy:
+    '''
+    When and how to compact a chat's history.
+
+    Args:
+    - max_history_tokens (int): High-water mark for the history (and summary) in estimated tokens.
+        Defaults to DEFAULT_BUDGET_FRACTION of the model's input limit.
+    - max_turns (int): Also compact once the history holds more than this many turns.
+    - keep_last_turns (int): The most turns kept verbatim after a compaction.
+    - low_water (float): After a compaction, the kept turns use at most this fraction of max_history_tokens.
+        The gap to the high-water mark is what keeps the cached prefix stable for many turns.
+    - summarize (bool): Fold compacted turns into a running summary. If False, they are dropped.
+    - summary_model (str): The model that writes the summary. A cheap, fast model is best. Defaults to
+        the cheapest model from the chat model's provider (see `default_summary_model`), so no other
+        provider's API key is needed.
+    - summary_max_tokens (int): Cap on the summary's length.
+    '''
+
+    def __init__(
+        self,
+        max_history_tokens: int = None,
+        max_turns: int = None,
+        keep_last_turns: int = 4,
+        low_water: float = 0.5,
+        summarize: bool = True,
+        summary_model: str = None,
+        summary_max_tokens: int = 1000,
+    ):
+        assert keep_last_turns >= 1, "keep_last_turns must be at least 1; the latest turn is always sent."
+        assert 0 < low_water < 1, "low_water must be between 0 and 1."
+        if max_turns is not None:
+            assert max_turns > keep_last_turns, "max_turns must be greater than keep_last_turns, or every turn compacts."
+        self.max_history_tokens = max_history_tokens
+        self.max_turns = max_turns
+        self.keep_last_turns = keep_last_turns
+        self.low_water = low_water
+        self.summarize = summarize
+        self.summary_model = summary_model
+        self.summary_max_tokens = summary_max_tokens
+
+    def budget(self, model: str) -> int:
+        if self.max_history_tokens is not None:
+            return self.max_history_tokens
+        return int(ALL_LLMS[model]['input_limit'] * DEFAULT_BUDGET_FRACTION)
+
+    def compact(self, history: List[dict], model: str, summary: str = "") -> Tuple[List[dict], str]:
+        '''
+        Compact the history if it is past the high-water mark.
+
+        Args:
+        - history (List[dict]): Formatted messages, oldest first, ending with the latest user message.
+        - model (str): The chat model, used for token estimates.
+        - summary (str): The running summary from earlier compactions.
+
+        Returns:
+        - tuple: The history to keep and the updated summary. The history is returned unchanged
+            (the same list) when no compaction is needed.
+        '''
+        turns = split_turns(history)
+        turn_tokens = [sum(message_tokens(m, model) for m in turn) for turn in turns]
+        summary_tokens = estimate_text_tokens(summary, model) if summary else 0
+        budget = self.budget(model)
+
+        over_tokens = sum(turn_tokens) + summary_tokens > budget
+        over_turns = self.max_turns is not None and len(turns) > self.max_turns
+        if not (over_tokens or over_turns) or len(turns) <= 1:
+            return history, summary
+
+        # Keep recent turns until the low-water mark or keep_last_turns is reached, always keeping the latest.
+        low_water = budget * self.low_water - summary_tokens
+        kept, kept_tokens = 1, turn_tokens[-1]
+        while kept < min(self.keep_last_turns, len(turns)) and kept_tokens + turn_tokens[-kept - 1] <= low_water:
+            kept_tokens += turn_tokens[-kept - 1]
+            kept += 1
+
+        dropped = [message for turn in turns[:-kept] for message in turn]
+        kept_messages = [message for turn in turns[-kept:] for message in turn]
+        if self.summarize:
+            summary = self._summarize(dropped, summary, model)
+        if not is_quiet():
+            print(f"\n[Compacted {len(turns) - kept} earlier turns of the conversation; keeping the last {kept}.]\n")
+        return kept_messages, summary
+
+    def _summarize(self, messages: List[dict], summary: str, model: str) -> str:
+        # Imported here to avoid a circular import; text_tools imports this module.
+        from aitools.media_tools.text_tools import prompt_llm
+
+        summary_model = self.summary_model or default_summary_model(model)
+
+        prompt = []
+        if summary:
+            prompt.append({"text": SUMMARY_HEADER + summary})
+        prompt.append({"text": "New turns:\n" + transcript(messages)})
+        try:
+            return prompt_llm(
+                prompt,
+                model=summary_model,
+                system_prompt=SUMMARY_SYSTEM_PROMPT,
+                max_tokens=self.summary_max_tokens,
+                truncate_input=True,
+            )
+        except Exception as e:
+            # A failed summary shouldn't end the chat; the turns are dropped instead.
+            if not is_quiet():
+                print(f"Couldn't summarize the earlier conversation with {summary_model}: {e}")
+            return summary
+
+
+def default_summary_model(model: str) -> str:
+    '''The cheapest model from the same provider as `model`, by input plus output price.'''
+    provider = ALL_LLMS[model]['provider']
+    return min(
+        (name for name, info in ALL_LLMS.items() if info['provider'] == provider),
+        key=lambda name: ALL_LLMS[name]['input_cost_per_M'] + ALL_LLMS[name]['output_cost_per_M'],
+    )
+
+
+def _text_parts(message: dict) -> list:
+    content = message.get('content', [])
+    if isinstance(content, str):
+        return [content]
+    return [part['text'] for part in content if 'text' in part]
+
+
+def _image_count(message: dict) -> int:
+    content = message.get('content', [])
+    if isinstance(content, str):
+        return 0
+    return sum(1 for part in content if part.get('type') in ('image', 'image_url'))
+
+
+def message_tokens(message: dict, model: str) -> int:
+    '''Estimate the tokens in one formatted message.'''
+    return sum(estimate_text_tokens(text, model) for text in _text_parts(message)) + _image_count(message) * TOKENS_PER_IMAGE
+
+
+def split_turns(history: List[dict]) -> List[List[dict]]:
+    '''Group formatted messages into turns, each starting at a user message that follows an assistant message.'''
+    turns = []
+    for message in history:
+        if not turns or (message['role'] == "user" and turns[-1][-1]['role'] != "user"):
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def transcript(messages: List[dict]) -> str:
+    '''Render formatted messages as plain "User:"/"Assistant:" lines for summarization.'''
+    lines = []
+    for message in messages:
+        speaker = "User" if message['role'] == "user" else "Assistant"
+        text = "\n".join(_text_parts(message))
+        images = _image_count(message)
+        if images:
+            text = (text + "\n" if text else "") + "[image]" * images
+        lines.append(f"{speaker}: {text}")
+    return "\n\n".join(lines)
+
+
+def summary_messages(summary: str, format_messages, model: str) -> List[dict]:
+    '''
+    The summary as a user message and an acknowledgement from the assistant, formatted for the
+    chat's provider. Placed before the kept turns, it keeps the roles alternating.
+    '''
+    if not summary:
+        return []
+    return (
+        format_messages([{"text": SUMMARY_HEADER + summary}], model=model)
+        + format_messages([{"text": SUMMARY_ACKNOWLEDGEMENT}], role="assistant", model=model)
+    )
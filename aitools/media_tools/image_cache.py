@@ -0,0 +1,237 @@
+"""
+Cache of base64-encoded image payloads.
+
+Every message formatter base64-encodes its images, so sending the same images
+across many prompts re-reads and re-encodes them each time. The cache keeps
+encoded payloads in memory, keyed by the file's content hash, and bounds them
+by total size with least-recently-used eviction. A second index maps each
+file's path, modification time and size to its content hash, so repeat calls
+for an unchanged file never touch the disk. Identical files at different paths
+share one entry.
+
+Payloads can also be written to a directory, which lets separate processes (or
+later runs) skip the encoding step. Disk entries are named after the content
+hash and are bounded by size too.
+
+Usage:
+    from aitools.media_tools.image_cache import configure_image_cache, image_cache_stats
+
+    configure_image_cache(max_bytes=512 * 1024**2, disk_dir="~/.cache/aitools/images")
+    ...
+    print(image_cache_stats())
+"""
+
+import base64
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+from typing import Callable, Optional
+
+DEFAULT_MAX_BYTES = 256 * 1024**2
+DEFAULT_DISK_MAX_BYTES = 2 * 1024**3
+
+
+def _encode_base64(data: bytes) -> str:
+    return base64.b64encode(data).decode('utf-8')
+
+
+class ImageCache:
+    '''
+    A bounded in-memory (and optionally on-disk) cache of encoded image payloads.
+
+    Args:
+    - max_bytes (int): Total size of payloads kept in memory before the least recently used are evicted.
+    - disk_dir (str): Optional directory to also store payloads in. Off when None.
+    - disk_max_bytes (int): Total size of payloads kept in disk_dir before the least recently used are deleted.
+    '''
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = os.path.expanduser(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # (content digest, variant) -> payload, in least- to most-recently used order
+        self._payloads = OrderedDict()
+        # (path, mtime_ns, size) -> content digest
+        self._digests = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._disk_hits = 0
+
+    def get(self, path: str, encode: Callable[[bytes], str] = _encode_base64, variant: str = "") -> str:
+        '''
+        Return the encoded payload for an image file, encoding and caching it on a miss.
+
+        Args:
+        - path (str): The image file.
+        - encode (Callable): Turns the file's bytes into the payload. Defaults to base64.
+        - variant (str): Names the encoding, so one file can be cached under several encodings.
+            Must change whenever `encode` would produce a different payload.
+        '''
+        stat = os.stat(path)
+        file_key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            digest = self._digests.get(file_key)
+            if digest is not None and (digest, variant) in self._payloads:
+                self._payloads.move_to_end((digest, variant))
+                self._hits += 1
+                return self._payloads[(digest, variant)]
+
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        key = (digest, variant)
+
+        with self._lock:
+            self._digests[file_key] = digest
+            if key in self._payloads:
+                # Same content already cached under another path.
+                self._payloads.move_to_end(key)
+                self._hits += 1
+                return self._payloads[key]
+
+        payload = self._read_disk(key)
+        if payload is None:
+            payload = encode(data)
+            self._write_disk(key, payload)
+            with self._lock:
+                self._misses += 1
+        else:
+            with self._lock:
+                self._disk_hits += 1
+
+        with self._lock:
+            if key not in self._payloads:
+                self._payloads[key] = payload
+                self._bytes += len(payload)
+                self._evict()
+
+        return payload
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._payloads:
+            (digest, _), payload = self._payloads.popitem(last=False)
+            self._bytes -= len(payload)
+            if not any(d == digest for d, _ in self._payloads):
+                self._digests = {k: d for k, d in self._digests.items() if d != digest}
+
+    def _disk_path(self, key) -> str:
+        digest, variant = key
+        name = f"{digest}-{variant}.b64" if variant else f"{digest}.b64"
+        return os.path.join(self.disk_dir, name)
+
+    def _read_disk(self, key) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return None
+        # Record the use so disk eviction is least-recently-used rather than oldest-first.
+        os.utime(path)
+        return payload
+
+    def _write_disk(self, key, payload: str):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".b64"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        '''Remove every payload from memory and from the disk directory, if any.'''
+        with self._lock:
+            self._payloads.clear()
+            self._digests.clear()
+            self._bytes = 0
+        if self.disk_dir:
+            for entry in os.scandir(self.disk_dir):
+                if entry.name.endswith(".b64"):
+                    os.remove(entry.path)
+
+    def stats(self) -> dict:
+        '''Hit and miss counts (disk hits separately) and the in-memory entry count and size.'''
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "entries": len(self._payloads),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache = ImageCache()
+
+
+def configure_image_cache(
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    disk_dir: Optional[str] = None,
+    disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+    enabled: bool = True,
+) -> Optional[ImageCache]:
+    '''
+    Replace the image cache used by encode_image(). The in-memory cache is on by default.
+
+    Args:
+    - max_bytes (int): Total size of payloads kept in memory.
+    - disk_dir (str): Optional directory to also store payloads in, e.g. "~/.cache/aitools/images".
+    - disk_max_bytes (int): Total size of payloads kept in disk_dir.
+    - enabled (bool): Set to False to encode every image afresh.
+
+    Returns:
+    - ImageCache: The new cache, or None if disabled.
+    '''
+    global _cache
+    _cache = ImageCache(max_bytes, disk_dir, disk_max_bytes) if enabled else None
+    return _cache
+
+
+def get_image_cache() -> Optional[ImageCache]:
+    '''Return the active image cache, or None if it has been disabled.'''
+    return _cache
+
+
+def image_cache_stats() -> dict:
+    '''Return the active image cache's statistics (empty if disabled).'''
+    return _cache.stats() if _cache is not None else {}
+
+
+def clear_image_cache():
+    '''Empty the active image cache.'''
+    if _cache is not None:
+        _cache.clear()
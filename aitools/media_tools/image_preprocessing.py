@@ -0,0 +1,284 @@
+"""
+Downscaling and recompression of images before they are sent to a vision model.
+
+Providers scale large images down before the model sees them, so uploading a
+12-megapixel phone photo costs upload time without improving the answer. Each
+provider's `image_profile` in the model registry records the largest size its
+models use and how they bill image tokens. `prepare_image` resizes images to
+fit that profile, re-encodes resized images as JPEG (or WebP) at a configurable
+quality, and returns the correct media type.
+
+Images that already fit are sent unchanged. Resizing requires Pillow
+(`pip install aitools[images]`); without it, images are sent as they are.
+Prepared payloads are stored in the image cache (see image_cache.py), so each
+image is only processed once per profile.
+"""
+
+import base64
+from io import BytesIO
+import math
+import os
+import threading
+
+from aitools.media_tools.image_cache import get_image_cache
+from aitools.media_tools.utils import encode_image
+from aitools.third_party_apis.models import ALL_LLMS
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
+_settings = {
+    "enabled": True,
+    "format": "jpeg",
+    "quality": 85,
+    "max_long_side": None,
+}
+
+_stats_lock = threading.Lock()
+_stats = {
+    "images": 0,
+    "resized": 0,
+    "bytes_before": 0,
+    "bytes_after": 0,
+    "tokens_before": 0,
+    "tokens_after": 0,
+}
+_warned_no_pillow = False
+
+
+def configure_image_preprocessing(
+    enabled: bool = None,
+    format: str = None,
+    quality: int = None,
+    max_long_side: int = None,
+):
+    '''
+    Change how images are prepared for vision models.
+
+    Args:
+    - enabled (bool): Set to False to always send images as they are.
+    - format (str): "jpeg" or "webp"; the format resized images are re-encoded to.
+        Images with transparency are re-encoded as PNG unless WebP is chosen.
+    - quality (int): Encoder quality for JPEG and WebP, from 1 to 100.
+    - max_long_side (int): Optionally scale images further than the model's profile requires,
+        trading detail for fewer image tokens.
+    '''
+    if format is not None:
+        assert format in ["jpeg", "webp"], f"Images can be re-encoded as jpeg or webp, not {format}."
+    if quality is not None:
+        assert 1 <= quality <= 100, f"Quality must be between 1 and 100, but you requested {quality}."
+
+    for name, value in [("enabled", enabled), ("format", format), ("quality", quality), ("max_long_side", max_long_side)]:
+        if value is not None:
+            _settings[name] = value
+
+
+def image_preprocessing_stats() -> dict:
+    '''
+    Totals for the images prepared so far: how many were processed and resized, and
+    their size in bytes and estimated tokens before and after. Images served from the
+    image cache are not counted again.
+    '''
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _fit_size(width: int, height: int, profile: dict):
+    '''The size an image is scaled down to under an image profile.'''
+    scale = 1.0
+    if profile.get("max_long_side"):
+        scale = min(scale, profile["max_long_side"] / max(width, height))
+    if profile.get("max_short_side"):
+        scale = min(scale, profile["max_short_side"] / min(width, height))
+    if profile.get("max_pixels"):
+        scale = min(scale, math.sqrt(profile["max_pixels"] / (width * height)))
+    if scale >= 1:
+        return width, height
+    # Round down so the result never exceeds a limit; the epsilon absorbs float error on exact fits.
+    return max(1, int(width * scale + 1e-6)), max(1, int(height * scale + 1e-6))
+
+
+def _openai_tiles(width, height):
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _anthropic_pixels(width, height):
+    return math.ceil(width * height / 750)
+
+
+def _gemini_tiles(width, height):
+    if width <= 384 and height <= 384:
+        return 258
+    return 258 * math.ceil(width / 768) * math.ceil(height / 768)
+
+
+def _mistral_patches(width, height):
+    # One token per 16px patch, plus a break token at the end of each row.
+    return math.ceil(width / 16) * math.ceil(height / 16) + math.ceil(height / 16)
+
+
+IMAGE_TOKEN_FORMULAS = {
+    "openai_tiles": _openai_tiles,
+    "anthropic_pixels": _anthropic_pixels,
+    "gemini_tiles": _gemini_tiles,
+    "mistral_patches": _mistral_patches,
+}
+
+
+def _profile_tokens(width: int, height: int, profile: dict) -> int:
+    return IMAGE_TOKEN_FORMULAS[profile["tokens"]](*_fit_size(width, height, profile))
+
+
+def estimate_image_tokens(width: int, height: int, model: str) -> int:
+    '''
+    Estimate the input tokens a model bills for an image of the given size, after the
+    provider's own downscaling. Returns 0 for models without an image profile.
+    '''
+    profile = ALL_LLMS[model].get("image_profile")
+    if not profile:
+        return 0
+    return _profile_tokens(width, height, profile)
+
+
+def estimate_image_file_tokens(image_path: str, model: str) -> int:
+    '''
+    Estimate the input tokens an image file will cost when sent to a model, after
+    preprocessing. Only the image header is read. Without Pillow, or if the file can't
+    be read, a 4000x3000 photo is assumed.
+    '''
+    profile = _effective_profile(model)
+    if not profile:
+        return 0
+    try:
+        from PIL import Image
+
+        with Image.open(image_path) as image:
+            width, height = image.size
+    except (ImportError, OSError):
+        width, height = 4000, 3000
+    # The effective profile already includes the provider's limits, so the size is fitted once.
+    return _profile_tokens(width, height, profile)
+
+
+def _effective_profile(model: str):
+    profile = ALL_LLMS.get(model, {}).get("image_profile")
+    if profile is None:
+        return None
+    if _settings["max_long_side"]:
+        profile = {**profile, "max_long_side": min(profile.get("max_long_side") or math.inf, _settings["max_long_side"])}
+    return profile
+
+
+def _pillow_available() -> bool:
+    global _warned_no_pillow
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        if not _warned_no_pillow:
+            print("Pillow is not installed, so images are sent at full size. Install it with `pip install aitools[images]`.")
+            _warned_no_pillow = True
+        return False
+    return True
+
+
+def _record(bytes_before: int, bytes_after: int, tokens_before: int, tokens_after: int, resized: bool):
+    with _stats_lock:
+        _stats["images"] += 1
+        _stats["resized"] += int(resized)
+        _stats["bytes_before"] += bytes_before
+        _stats["bytes_after"] += bytes_after
+        _stats["tokens_before"] += tokens_before
+        _stats["tokens_after"] += tokens_after
+
+
+def _data_url(media_type: str, data: bytes) -> str:
+    return f"data:{media_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def _resize_image(data: bytes, media_type: str, profile: dict, model: str, name: str) -> str:
+    '''Scale an image to fit a profile and return it as a data URL. Images that already fit are returned unchanged.'''
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(data))
+    width, height = image.size
+    # Phone photos are often stored sideways with an EXIF rotation, which re-encoding would drop.
+    transposed = ImageOps.exif_transpose(image) if image.getexif().get(0x0112, 1) != 1 else image
+    target = _fit_size(*transposed.size, profile)
+
+    # What the provider would bill for the image uploaded as it is, after its own downscaling.
+    tokens_before = estimate_image_tokens(*transposed.size, model)
+    if target == transposed.size or getattr(image, "is_animated", False):
+        _record(len(data), len(data), tokens_before, tokens_before, resized=False)
+        return _data_url(media_type, data)
+
+    resized = transposed.resize(target, Image.LANCZOS)
+    has_alpha = resized.mode in ("RGBA", "LA") or (resized.mode == "P" and "transparency" in resized.info)
+    output_format = _settings["format"]
+    if has_alpha and output_format == "jpeg":
+        output_format = "png"
+
+    if output_format == "jpeg":
+        resized = resized.convert("RGB")
+        save_kwargs = {"quality": _settings["quality"], "optimize": True}
+    elif output_format == "webp":
+        save_kwargs = {"quality": _settings["quality"], "method": 4}
+    else:
+        save_kwargs = {"optimize": True}
+
+    buffer = BytesIO()
+    resized.save(buffer, format=output_format.upper(), **save_kwargs)
+    output = buffer.getvalue()
+    tokens_after = estimate_image_tokens(*target, model)
+
+    _record(len(data), len(output), tokens_before, tokens_after, resized=True)
+
+    # Fitting the provider's own profile only saves bytes; tokens drop only when max_long_side scales further.
+    tokens_saved = f", ~{tokens_before - tokens_after} fewer image tokens" if tokens_before > tokens_after else ""
+    print(
+        f"Resized {name} from {width}x{height} to {target[0]}x{target[1]} "
+        f"({len(data) / 1024:.0f} KB -> {len(output) / 1024:.0f} KB{tokens_saved})."
+    )
+    return _data_url(MEDIA_TYPES[output_format], output)
+
+
+def prepare_image(image_path: str, model: str = None):
+    '''
+    Prepare an image file for a vision model.
+
+    Args:
+    - image_path (str): A PNG, JPEG, GIF or WEBP file.
+    - model (str): The model the image is for. Without one, the image is sent unchanged.
+
+    Returns:
+    - tuple: The media type (e.g. "image/jpeg") and the base64-encoded image data.
+    '''
+    _, dot_ext = os.path.splitext(image_path)
+    ext = dot_ext.strip('.').lower()
+    assert ext in MEDIA_TYPES, f"Image must be a PNG, JPEG, GIF, or WEBP file, but you provided a {ext} file."
+    media_type = MEDIA_TYPES[ext]
+
+    profile = _effective_profile(model) if model else None
+    if profile is None or not _settings["enabled"] or not _pillow_available():
+        return media_type, encode_image(image_path)
+
+    def resize(data):
+        return _resize_image(data, media_type, profile, model, os.path.basename(image_path))
+
+    # Models sharing a profile share cached payloads.
+    variant = "-".join(str(profile.get(k)) for k in ["max_long_side", "max_short_side", "max_pixels"])
+    variant += f"-{_settings['format']}-{_settings['quality']}"
+
+    cache = get_image_cache()
+    if cache is not None:
+        data_url = cache.get(image_path, encode=resize, variant=variant)
+    else:
+        with open(image_path, "rb") as f:
+            data_url = resize(f.read())
+
+    header, data = data_url.split(",", 1)
+    return header[len("data:"):-len(";base64")], data
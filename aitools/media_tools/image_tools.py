@@ -1,7 +1,26 @@
-from typing import get_args, Literal
+import base64
+import importlib
+import os
+import time
+from typing import Dict, Iterable, Iterator, Tuple, Union, get_args, Literal
 
+from aitools.media_tools.usage_ledger import record_usage
 from aitools.third_party_apis.models import ImageGeneratorsList, ImageSizeList, ALL_IMAGE_GENERATORS
 
+# Adapter module and function for each image provider, imported on first use.
+IMAGE_PROVIDER_ADAPTERS = {
+    "openai": ("aitools.third_party_apis.openai_tools", "generate_image_via_openai"),
+    "recraft": ("aitools.third_party_apis.recraft_tools", "generate_image_via_recraft"),
+    "google": ("aitools.third_party_apis.google_image_tools", "generate_image_via_google"),
+}
+# Image requests in flight at once per provider in `generate_images`. Generations take seconds
+# to tens of seconds and image rate limits are low, so this is well below the LLM default.
+DEFAULT_IMAGE_CONCURRENCY = 4
+# Images saved at once by `save_images`.
+DEFAULT_SAVE_CONCURRENCY = 8
+# Bytes written per step when saving. Base64 is decoded in slices of a matching size.
+SAVE_CHUNK_SIZE = 256 * 1024
+
     
 def generate_image(
         prompt,
@@ -24,12 +43,10 @@ def generate_image(
 
     model_info = ALL_IMAGE_GENERATORS[model]
 
-    if model_info['provider'] == "openai":
-        from aitools.third_party_apis.openai_tools import generate_image_via_openai as _generate_image
-    elif model_info['provider'] == "recraft":
-        from aitools.third_party_apis.recraft_tools import generate_image_via_recraft as _generate_image
-    elif model_info['provider'] == "google":
-        from aitools.third_party_apis.google_image_tools import generate_image_via_google as _generate_image
+    if model_info['provider'] not in IMAGE_PROVIDER_ADAPTERS:
+        raise ValueError(f"Provider '{model_info['provider']}' is not yet supported. Add image generation function for this provider.")
+    module_name, function_name = IMAGE_PROVIDER_ADAPTERS[model_info['provider']]
+    _generate_image = getattr(importlib.import_module(module_name), function_name)
 
     kwargs = {}
     if reference_images:
@@ -40,6 +57,7 @@ def generate_image(
             )
         kwargs['reference_images'] = reference_images
 
+    started = time.perf_counter()
     response = _generate_image(
         model=model,
         prompt=prompt,
@@ -49,5 +67,196 @@ def generate_image(
         num_variations=num_variations,
         **kwargs,
     )
+    record_usage("image", model, model_info['provider'], images=num_variations, latency=time.perf_counter() - started)
+
+    return response
+
+
+def _split_variations(model: str, num_variations: int) -> list:
+    # Models that make one image per call (or cap n) get their variations as separate requests.
+    per_request = ALL_IMAGE_GENERATORS[model].get('max_images_per_request') or num_variations
+    return [min(per_request, num_variations - start) for start in range(0, num_variations, per_request)]
+
+
+def generate_images(
+    requests: Iterable[dict],
+    concurrency: Union[int, Dict[str, int]] = DEFAULT_IMAGE_CONCURRENCY,
+    ordered: bool = False,
+    return_exceptions: bool = False,
+) -> Iterator[Tuple[int, object]]:
+    """
+    Generate images for many prompts concurrently, with a cap on in-flight requests per provider.
+
+    Variations are split into as many requests as the model needs (dall-e-3 and the Gemini
+    models make one image per request) and those requests run concurrently too, so five
+    images take about as long as one.
+
+    Args:
+    - requests (Iterable[dict]): Request specs. Each spec takes the same keyword arguments as
+        `generate_image` (prompt, model, size, style, substyle, num_variations, reference_images);
+        only `prompt` is required.
+    - concurrency (int | dict): Maximum in-flight requests per provider. Pass a dict such as
+        {"openai": 8, "google": 2} to set limits per provider; unlisted providers use
+        DEFAULT_IMAGE_CONCURRENCY.
+    - ordered (bool): Yield results in input order. If False, yield them as they complete.
+    - return_exceptions (bool): Yield a failed request's exception in place of its response
+        instead of raising it and abandoning the remaining requests.
+
+    Yields:
+    - tuple: (index of the request spec, response). Responses have the provider's shape, with
+        every variation of the spec in `response.data`.
+    """
+
+    import threading
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    specs = [{"model": "dall-e-3", "num_variations": 1, **spec} for spec in requests]
+    for spec in specs:
+        if spec["model"] not in ALL_IMAGE_GENERATORS:
+            raise ValueError(f"Unknown image model '{spec['model']}'.")
+
+    def _limit(provider):
+        if isinstance(concurrency, dict):
+            return concurrency.get(provider, DEFAULT_IMAGE_CONCURRENCY)
+        return concurrency
+
+    providers = {ALL_IMAGE_GENERATORS[spec["model"]]['provider'] for spec in specs}
+    semaphores = {provider: threading.BoundedSemaphore(_limit(provider)) for provider in providers}
+
+    def _run(spec, num_variations):
+        with semaphores[ALL_IMAGE_GENERATORS[spec["model"]]['provider']]:
+            return generate_image(**{**spec, "num_variations": num_variations})
+
+    chunks = [(index, count) for index, spec in enumerate(specs) for count in _split_variations(spec["model"], spec["num_variations"])]
+    if not chunks:
+        return
+    print(f"Generating {sum(spec['num_variations'] for spec in specs)} images for {len(specs)} prompts...\n")
+
+    executor = ThreadPoolExecutor(max_workers=min(len(chunks), sum(_limit(p) for p in providers)))
+    pending = {executor.submit(_run, specs[index], count): index for index, count in chunks}
+    remaining = {}
+    for index, _ in chunks:
+        remaining[index] = remaining.get(index, 0) + 1
+    results, errors, done = {}, {}, {}
+    next_index = 0
+
+    try:
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = pending.pop(future)
+                remaining[index] -= 1
+                try:
+                    response = future.result()
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    errors.setdefault(index, e)
+                else:
+                    if index in results:
+                        results[index].data.extend(response.data)
+                    else:
+                        results[index] = response
+                if remaining[index] == 0:
+                    done[index] = errors.get(index, results.get(index))
+            if ordered:
+                while next_index in done:
+                    yield next_index, done.pop(next_index)
+                    next_index += 1
+            else:
+                for index in list(done):
+                    yield index, done.pop(index)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _write_b64(b64_json: str, file) -> int:
+    # Decode a slice at a time so the full decoded image is never held next to the base64 string.
+    step = SAVE_CHUNK_SIZE // 3 * 4
+    written = 0
+    for start in range(0, len(b64_json), step):
+        written += file.write(base64.b64decode(b64_json[start:start + step]))
+    return written
+
+
+def _write_url(url: str, file) -> int:
+    from aitools.third_party_apis.http_clients import get_requests_session, requests_timeout
+
+    written = 0
+    with get_requests_session().get(url, stream=True, timeout=requests_timeout()) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=SAVE_CHUNK_SIZE):
+            written += file.write(chunk)
+    return written
+
+
+def _save_image(image, path: str) -> dict:
+    started = time.perf_counter()
+    b64_json = getattr(image, 'b64_json', None)
+    partial = path + ".part"
+    try:
+        with open(partial, "wb") as file:
+            # Prefer the inline payload; a URL costs a second round trip.
+            if b64_json:
+                source, size = "b64", _write_b64(b64_json, file)
+            elif getattr(image, 'url', None):
+                source, size = "url", _write_url(image.url, file)
+            else:
+                raise ValueError("The image has neither b64_json nor a url.")
+        os.replace(partial, path)
+    except BaseException:
+        for leftover in (partial, path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    return {"path": path, "bytes": size, "seconds": time.perf_counter() - started, "source": source}
+
+
+def save_images(
+    response,
+    output_file: str,
+    max_workers: int = DEFAULT_SAVE_CONCURRENCY,
+) -> list:
+    """
+    Save every image in a `generate_image` response, whichever provider it came from.
+
+    Base64 payloads (Gemini, gpt-image-1) are decoded straight to disk; URLs (dall-e, Recraft)
+    are downloaded over the shared pooled session. Images are saved concurrently and streamed
+    in chunks, so no image is held in memory whole.
+
+    Args:
+    - response: The response from `generate_image`, or a list of them.
+    - output_file (str): Path for the images. Existing files aren't overwritten; each image gets
+        the next free name, as with `increment_file_name`.
+    - max_workers (int): Images saved at once.
+
+    Returns:
+    - list: One dict per image, in response order: path, bytes, seconds (time to save it) and
+        source ("b64" or "url").
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    from aitools.media_tools.utils import increment_file_name
+
+    responses = response if isinstance(response, (list, tuple)) else [response]
+    images = [image for r in responses for image in r.data]
+    if not images:
+        return []
+
+    # Claim every name up front so concurrent saves never pick the same one.
+    paths = []
+    for _ in images:
+        path = increment_file_name(output_file)
+        open(path, "xb").close()
+        paths.append(path)
 
-    return response
\ No newline at end of file
+    try:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(images))) as executor:
+            futures = [executor.submit(_save_image, image, path) for image, path in zip(images, paths)]
+            return [future.result() for future in futures]
+    finally:
+        # Names claimed for images that failed or never ran are released.
+        for path in paths:
+            if os.path.exists(path) and not os.path.getsize(path):
+                os.remove(path)
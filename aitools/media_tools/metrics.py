@@ -0,0 +1,253 @@
+"""
+Latency and throughput histograms for LLM, image generation and transcription calls.
+
+Every call recorded in the usage ledger (see usage_ledger.py) is also observed
+here, labelled by kind ("llm", "image" or "transcription"), provider and model:
+- request_latency_seconds: wall time of the provider call, including retries.
+- time_to_first_token_seconds: streamed LLM calls only.
+- output_tokens_per_second: output tokens over the generation time (after the first token when streamed).
+- queue_wait_seconds: time spent waiting for a concurrency slot in prompt_llm_many.
+- rate_limit_wait_seconds: time spent waiting on the client-side rate limiter.
+- retry_wait_seconds: time spent backing off between retries.
+
+Response cache hits never reach a provider, so they are counted in
+response_cache_hits_total rather than skewing the latency histograms.
+
+The registry lives in-process. Scrape it from a long-running worker with
+`start_metrics_server`, or dump it with `render_metrics`.
+
+Usage:
+    from aitools.media_tools.metrics import start_metrics_server
+
+    start_metrics_server(9464)  # GET http://localhost:9464/metrics
+"""
+
+from bisect import bisect_left
+import threading
+from typing import Dict, Tuple
+
+METRIC_PREFIX = "aitools_"
+LABEL_NAMES = ("kind", "provider", "model")
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Histogram name -> (help text, bucket upper bounds)
+HISTOGRAMS = {
+    "request_latency_seconds": ("Wall time of provider calls, including retries.", LATENCY_BUCKETS),
+    "time_to_first_token_seconds": ("Time until the first streamed token arrived.", (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)),
+    "output_tokens_per_second": ("Output tokens generated per second.", (5, 10, 25, 50, 100, 200, 400, 800)),
+    "queue_wait_seconds": ("Time spent waiting for a concurrency slot.", WAIT_BUCKETS),
+    "rate_limit_wait_seconds": ("Time spent waiting on the client-side rate limiter.", WAIT_BUCKETS),
+    "retry_wait_seconds": ("Time spent backing off between retries.", WAIT_BUCKETS),
+}
+CACHE_HITS_METRIC = "response_cache_hits_total"
+
+_settings = {
+    "enabled": True,
+}
+
+
+class Histogram:
+    '''A cumulative histogram with fixed bucket upper bounds. Not thread-safe on its own; the registry locks.'''
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Dict[str, int]:
+        '''Counts per "le" bound, cumulative as in the Prometheus exposition format.'''
+        result, total = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result[_format_bound(bound)] = total
+        return result
+
+
+class MetricsRegistry:
+    '''Thread-safe histograms and counters keyed by metric name and (kind, provider, model) labels.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, name: str, value: float, labels: Tuple[str, str, str]):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if labels not in series:
+                series[labels] = Histogram(HISTOGRAMS[name][1])
+            series[labels].observe(value)
+
+    def increment(self, name: str, labels: Tuple[str, str, str], amount: float = 1):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def snapshot(self) -> dict:
+        '''
+        Returns:
+        - dict: Metric name -> list of series, each a dict of labels, count, sum and
+            cumulative bucket counts (histograms) or value (counters).
+        '''
+        with self._lock:
+            snapshot = {}
+            for name, series in self._histograms.items():
+                snapshot[name] = [
+                    {"labels": dict(zip(LABEL_NAMES, labels)), "count": h.count, "sum": h.sum, "buckets": h.cumulative()}
+                    for labels, h in series.items()
+                ]
+            for name, series in self._counters.items():
+                snapshot[name] = [
+                    {"labels": dict(zip(LABEL_NAMES, labels)), "value": value} for labels, value in series.items()
+                ]
+            return snapshot
+
+    def render(self) -> str:
+        '''The registry in the Prometheus text exposition format.'''
+        lines = []
+        snapshot = self.snapshot()
+        for name, (help_text, _) in HISTOGRAMS.items():
+            if name not in snapshot:
+                continue
+            metric = METRIC_PREFIX + name
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for series in snapshot[name]:
+                labels = _format_labels(series["labels"])
+                for bound, count in series["buckets"].items():
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{metric}_sum{{{labels}}} {series['sum']!r}")
+                lines.append(f"{metric}_count{{{labels}}} {series['count']}")
+        if CACHE_HITS_METRIC in snapshot:
+            metric = METRIC_PREFIX + CACHE_HITS_METRIC
+            lines += [f"# HELP {metric} Calls answered from the response cache.", f"# TYPE {metric} counter"]
+            for series in snapshot[CACHE_HITS_METRIC]:
+                lines.append(f"{metric}{{{_format_labels(series['labels'])}}} {series['value']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+
+
+def _format_bound(bound: float) -> str:
+    if bound == float("inf"):
+        return "+Inf"
+    return repr(float(bound))
+
+
+def _format_labels(labels: dict) -> str:
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+_registry = MetricsRegistry()
+
+
+def configure_metrics(enabled: bool = True):
+    '''
+    Args:
+    - enabled (bool): Observe calls. Disabling stops new observations; existing ones are kept.
+    '''
+    _settings["enabled"] = enabled
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+def observe(name: str, value: float, kind: str, provider: str, model: str):
+    '''
+    Add one observation to a histogram.
+
+    Args:
+    - name (str): A key of HISTOGRAMS, e.g. "rate_limit_wait_seconds".
+    - value (float): The observed value.
+    - kind (str): "llm", "image" or "transcription".
+    - provider (str): The model's provider.
+    - model (str): The model called.
+    '''
+    if _settings["enabled"]:
+        _registry.observe(name, value, (kind, provider, model))
+
+
+def observe_call(record: dict):
+    '''Observe a usage ledger record (see usage_ledger.record_usage).'''
+    if not _settings["enabled"]:
+        return
+    labels = (record["kind"], record["provider"], record["model"])
+    if record.get("response_cache_hit"):
+        _registry.increment(CACHE_HITS_METRIC, labels)
+        return
+
+    latency = record.get("latency")
+    ttft = record.get("time_to_first_token")
+    if latency is not None:
+        _registry.observe("request_latency_seconds", latency, labels)
+    if ttft is not None:
+        _registry.observe("time_to_first_token_seconds", ttft, labels)
+    for name in ["queue_wait_seconds", "retry_wait_seconds"]:
+        if record.get(name) is not None:
+            _registry.observe(name, record[name], labels)
+
+    # Streamed calls are measured from the first token, so the rate reflects generation speed rather than queueing.
+    generation_time = latency - ttft if latency is not None and ttft is not None else latency
+    if record.get("output_tokens") and generation_time:
+        _registry.observe("output_tokens_per_second", record["output_tokens"] / generation_time, labels)
+
+
+def metrics_snapshot() -> dict:
+    '''The current histograms and counters as plain dicts. See MetricsRegistry.snapshot.'''
+    return _registry.snapshot()
+
+
+def render_metrics() -> str:
+    '''The current metrics in the Prometheus text exposition format.'''
+    return _registry.render()
+
+
+def reset_metrics():
+    _registry.reset()
+
+
+def start_metrics_server(port: int = 9464, host: str = "127.0.0.1"):
+    '''
+    Serve the metrics over HTTP from a daemon thread, for Prometheus to scrape.
+
+    Args:
+    - port (int): The port to listen on. 0 picks a free port.
+    - host (str): The interface to bind. Use "0.0.0.0" to accept remote scrapes.
+
+    Returns:
+    - ThreadingHTTPServer: The running server. Its server_address has the bound port;
+        call shutdown() to stop it.
+    '''
+    # Imported here rather than at module level to keep `import text_tools` fast.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render_metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would flood stderr.
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="aitools-metrics-server", daemon=True).start()
+    print(f"Serving metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,303 @@
+"""Opt-in on-disk cache for LLM responses and transcriptions.
+
+Responses are stored in SQLite, keyed on a hash of everything that determines
+the output (model, normalized messages, system prompt, max_tokens, temperature
+and JSON mode). SQLite's locking makes the cache safe to share between
+processes. Entries are evicted least-recently-used once the cache exceeds its
+size budget, and expire after a TTL.
+
+Enable it once per process with `enable_response_cache()`; `prompt_llm` and
+friends then consult it automatically unless called with `bypass_cache=True`.
+`enable_transcription_cache()` does the same for `transcribe`, keyed on the
+audio's content hash, the model and the language.
+"""
+
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Union
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "aitools", "responses.sqlite")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+TRANSCRIPTION_TABLE = "transcriptions"
+
+
+class ResponseCache:
+    '''
+    A size-bounded, TTL-limited key/value store of JSON-serializable dicts backed by SQLite.
+
+    Args:
+    - path (str): The SQLite database file. Parent directories are created if needed.
+    - max_bytes (int): Evict least-recently-used entries once stored values exceed this size.
+    - ttl (float): Seconds after which an entry expires. None to never expire.
+    - table (str): Table name, so several caches can share one database file.
+    '''
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        table: str = "responses",
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per operation keeps the cache usable from any thread or process.
+        import sqlite3
+
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Union[dict, None]:
+        '''Return the cached value for a key, or None if it is missing or expired.'''
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl is not None and row[1] < now - self.ttl:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                row = None
+            if row:
+                conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+
+        self._count(hit=row is not None)
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: dict):
+        '''Store a value, then evict expired and least-recently-used entries to stay within budget.'''
+        data = json.dumps(value)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now),
+            )
+            if self.ttl is not None:
+                conn.execute(f"DELETE FROM {self.table} WHERE created < ?", (now - self.ttl,))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict = []
+        for key, size in conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", evict)
+
+    def clear(self):
+        '''Remove every entry and reset the hit/miss counters.'''
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        '''Return hit/miss counters for this process plus the entry count and stored bytes.'''
+        with self._connect() as conn:
+            entries, size = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _normalize_messages(messages: List[Union[str,dict]]) -> list:
+    '''
+    Reduce messages to the fields that affect the response: bare strings become text
+    messages, images are identified by content hash rather than path, and per-message
+    cache markers are dropped.
+    '''
+    normalized = []
+    for message in messages:
+        if isinstance(message, str):
+            message = {"text": message}
+        if 'text' in message:
+            normalized.append({"text": message['text']})
+        elif 'code' in message:
+            normalized.append({"code": message['code']})
+        elif 'image' in message:
+            normalized.append({"image_sha256": _file_digest(message['image'])})
+    return normalized
+
+
+def make_prompt_key(
+    model: str,
+    messages: List[Union[str,dict]],
+    system_prompt: Union[str,List[Union[str,dict]]],
+    max_tokens: int,
+    temperature: float = None,
+    json_output: bool = False,
+) -> str:
+    '''Hash the parts of a prompt that determine its response into a cache key.'''
+    if isinstance(system_prompt, str):
+        system_prompt = [system_prompt]
+    payload = {
+        "model": model,
+        "messages": _normalize_messages(messages),
+        "system_prompt": _normalize_messages(system_prompt),
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "json_output": json_output,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def make_transcription_key(audio_digest: str, model: str, language: str = None, options: dict = None) -> str:
+    '''
+    Hash the parts of a transcription request that determine its result into a cache key.
+    `options` holds any processing that changes the result, such as silence trimming.
+    '''
+    payload = {
+        "audio_sha256": audio_digest,
+        "model": model,
+        "language": language,
+        "response_format": "verbose_json",
+        **(options or {}),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+_response_cache = None
+_transcription_cache = None
+
+
+def enable_response_cache(
+    path: str = DEFAULT_CACHE_PATH,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    ttl: float = DEFAULT_TTL_SECONDS,
+) -> ResponseCache:
+    '''Turn on response caching for prompt_llm and friends in this process.'''
+    global _response_cache
+    _response_cache = ResponseCache(path=path, max_bytes=max_bytes, ttl=ttl)
+    return _response_cache
+
+
+def disable_response_cache():
+    '''Turn off response caching. Stored entries are kept on disk.'''
+    global _response_cache
+    _response_cache = None
+
+
+def get_response_cache() -> Union[ResponseCache, None]:
+    '''Return the active response cache, or None if caching is disabled.'''
+    return _response_cache
+
+
+def lookup_response(request: dict, bypass_cache: bool = False):
+    '''
+    Look up a provider request (as built by prompt_llm) in the active cache.
+
+    Args:
+    - request (dict): The request, with model, messages, system_prompt, max_tokens, temperature and json_mode.
+    - bypass_cache (bool): Skip the lookup but still return the key, so the fresh response replaces any cached one.
+
+    Returns:
+    - tuple: The cache key (None if caching is off) and the cached response (None on a miss
+        or bypass). Hits have their token counts zeroed, with the original counts under
+        "saved_usage", so log_token_usage reports what the hit saved.
+    '''
+    cache = get_response_cache()
+    if cache is None:
+        return None, None
+
+    key = make_prompt_key(
+        request['model'],
+        request['messages'],
+        request['system_prompt'],
+        request['max_tokens'],
+        request['temperature'],
+        request['json_mode'],
+    )
+    if bypass_cache:
+        return key, None
+    cached = cache.get(key)
+    if cached is None:
+        return key, None
+
+    saved_usage = {k: v for k, v in cached.items() if 'token' in k}
+    response = {**cached, **{k: 0 for k in saved_usage}}
+    response["response_cache_hit"] = True
+    response["saved_usage"] = saved_usage
+    return key, response
+
+
+def store_response(key: Union[str, None], response: dict):
+    '''Store a fresh provider response under a key returned by lookup_response().'''
+    cache = get_response_cache()
+    if cache is not None and key is not None:
+        # Keep only the response itself; per-call details like retry counters don't carry over to a hit.
+        cache.put(key, {k: v for k, v in response.items() if k == 'text' or 'token' in k})
+
+
+def enable_transcription_cache(
+    path: str = DEFAULT_CACHE_PATH,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    ttl: float = None,
+) -> ResponseCache:
+    '''
+    Turn on transcription caching for transcribe in this process. Transcriptions share the
+    response cache's database file by default, in their own table. A transcript doesn't go
+    stale, so entries never expire unless a ttl is given.
+    '''
+    global _transcription_cache
+    _transcription_cache = ResponseCache(path=path, max_bytes=max_bytes, ttl=ttl, table=TRANSCRIPTION_TABLE)
+    return _transcription_cache
+
+
+def disable_transcription_cache():
+    '''Turn off transcription caching. Stored entries are kept on disk.'''
+    global _transcription_cache
+    _transcription_cache = None
+
+
+def get_transcription_cache() -> Union[ResponseCache, None]:
+    '''Return the active transcription cache, or None if caching is disabled.'''
+    return _transcription_cache
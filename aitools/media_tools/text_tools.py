@@ -1,20 +1,76 @@
-from typing import List, Union
-
-from tabulate import tabulate
+import importlib
+import time
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Tuple, Union
 
+from aitools.media_tools.chat_context import ChatContextPolicy, summary_messages
+from aitools.media_tools.response_cache import lookup_response, store_response
+from aitools.media_tools.usage_ledger import is_quiet, record_usage
 from aitools.media_tools.utils import log_time
 from aitools.third_party_apis.models import ALL_LLMS, LLMsList
+from aitools.third_party_apis.token_counting import fit_context_window
 
 DEFAULT_LLM = "gpt-4o-mini"
 DEFAULT_LLM_INFO = ALL_LLMS[DEFAULT_LLM]
 
-def log_token_usage(
+# Default number of in-flight requests per provider for prompt_llm_many
+DEFAULT_PROVIDER_CONCURRENCY = 8
+
+# Adapter module and function names for each LLM provider. A provider's module
+# (and its SDK) is only imported the first time one of its models is used.
+LLM_PROVIDER_ADAPTERS = {
+    "openai": {
+        "module": "aitools.third_party_apis.openai_tools",
+        "prompt": "prompt_openai",
+        "aprompt": "aprompt_openai",
+        "iter_stream": "iter_openai_stream",
+        "aiter_stream": "aiter_openai_stream",
+        "stream": "stream_openai",
+        "format": "format_openai_messages",
+    },
+    "anthropic": {
+        "module": "aitools.third_party_apis.anthropic_tools",
+        "prompt": "prompt_claude",
+        "aprompt": "aprompt_claude",
+        "iter_stream": "iter_claude_stream",
+        "aiter_stream": "aiter_claude_stream",
+        "stream": "stream_claude",
+        "format": "format_claude_messages",
+    },
+    "google": {
+        "module": "aitools.third_party_apis.google_tools",
+        "prompt": "prompt_gemini",
+        "aprompt": "aprompt_gemini",
+        "iter_stream": "iter_gemini_stream",
+        "aiter_stream": "aiter_gemini_stream",
+    },
+    "deepseek": {
+        "module": "aitools.third_party_apis.deepseek_tools",
+        "prompt": "prompt_deepseek",
+        "aprompt": "aprompt_deepseek",
+        "iter_stream": "iter_deepseek_stream",
+        "aiter_stream": "aiter_deepseek_stream",
+    },
+    "mistral": {
+        "module": "aitools.third_party_apis.mistral_tools",
+        "prompt": "prompt_mistral",
+        "aprompt": "aprompt_mistral",
+        "iter_stream": "iter_mistral_stream",
+        "aiter_stream": "aiter_mistral_stream",
+    },
+}
+
+def _usage_cost(
     usage: dict,
     model:LLMsList = DEFAULT_LLM,
+    batch: bool = False,
 ):
-    '''
-    Log the token usage and cost of a response from an LLM.
-    '''
+    """
+    Compute the cost of a usage dict. Set batch to apply the model's batch API discount.
+
+    Returns:
+    - tuple: The cost in dollars, and whether the cache write and cache read prices were
+        estimated at the input rate because the registry has no price for them.
+    """
 
     tok_in = usage['input_tokens']
     tok_out = usage['output_tokens']
@@ -40,6 +96,63 @@ def log_token_usage(
         + tok_cache_write * (cache_write_cost_per_M / 1000000 if tok_cache_write else 0) \
         + tok_cache_read * (cache_read_cost_per_M / 1000000 if tok_cache_read else 0)
 
+    # Explicit Gemini caches also bill storage for their lifetime.
+    if usage.get('cache_storage_token_hours'):
+        cost += usage['cache_storage_token_hours'] * ALL_LLMS[model]['cache_storage_cost_per_M_per_hour'] / 1000000
+
+    if batch:
+        cost *= 1 - ALL_LLMS[model].get('batch_discount', 0)
+
+    return cost, cache_write_estimated, cache_read_estimated
+
+
+def _record_llm_usage(
+    usage: dict,
+    model:LLMsList = DEFAULT_LLM,
+    batch: bool = False,
+):
+    """Record a single response's usage and cost in the usage ledger."""
+    cost, _, _ = _usage_cost(usage, model, batch=batch)
+    fields = {key: value for key, value in usage.items() if 'token' in key and isinstance(value, (int, float))}
+    for key in ['latency', 'time_to_first_token', 'queue_wait_seconds', 'retries', 'retry_wait_seconds']:
+        if usage.get(key) is not None:
+            fields[key] = usage[key]
+    if usage.get('response_cache_hit'):
+        fields['response_cache_hit'] = True
+        fields['saved_cost'] = _usage_cost(usage['saved_usage'], model)[0]
+
+    record_usage("llm", model, ALL_LLMS[model]['provider'], cost=cost, batch=batch, **fields)
+
+
+def log_token_usage(
+    usage: dict,
+    model:LLMsList = DEFAULT_LLM,
+    batch: bool = False,
+    record: bool = True,
+):
+    '''
+    Log the token usage and cost of a response from an LLM.
+    Set batch for responses from a batch API, which are billed at the model's batch discount.
+
+    The response is recorded in the usage ledger (see usage_ledger.py) unless record is
+    False, which callers use for totals whose calls were already recorded one by one.
+    The console table is skipped in quiet mode.
+    '''
+    if record:
+        _record_llm_usage(usage, model, batch=batch)
+    if is_quiet():
+        return
+
+    # Imported here rather than at module level to keep `import text_tools` fast.
+    from tabulate import tabulate
+
+    tok_in = usage['input_tokens']
+    tok_out = usage['output_tokens']
+    tok_cache_write = usage['cache_write_tokens'] if 'cache_write_tokens' in usage else 0
+    tok_cache_read = usage['cache_read_tokens'] if 'cache_read_tokens' in usage else 0
+
+    cost, cache_write_estimated, cache_read_estimated = _usage_cost(usage, model, batch=batch)
+
     cache_write_label = "Cache Write Tokens"
     if tok_cache_write and cache_write_estimated:
         cache_write_label += " (est. @ input rate)"
@@ -52,13 +165,94 @@ def log_token_usage(
         [cache_write_label, tok_cache_write],
         [cache_read_label, tok_cache_read],
         ["Response Tokens", tok_out],
-        ["Cost", f"${cost:.5f}"],
+        ["Batch Cost" if batch else "Cost", f"${cost:.5f}"],
     ]
 
+    if usage.get('cache_storage_token_hours'):
+        data.insert(3, ["Cache Storage (token-hours)", f"{usage['cache_storage_token_hours']:.0f}"])
+
+    if usage.get('retries'):
+        data.append(["Retries", f"{usage['retries']} ({usage.get('retry_wait_seconds', 0):.1f}s backoff)"])
+
+    if usage.get('saved_usage'):
+        saved_cost, _, _ = _usage_cost(usage['saved_usage'], model)
+        data.append(["Saved by Response Cache", f"${saved_cost:.5f}"])
+
     print(tabulate(data, colalign=("left", "right")))
 
     return
 
+
+def _get_adapter_function(provider: str, function: str):
+    """Import a provider's adapter module and return one of its functions, or None if it has none."""
+
+    adapter = LLM_PROVIDER_ADAPTERS.get(provider, {})
+    if function not in adapter:
+        return None
+
+    return getattr(importlib.import_module(adapter["module"]), adapter[function])
+
+
+def _get_prompt_function(provider: str, function: str = "prompt"):
+    """Import and return a provider's prompt, aprompt, iter_stream or aiter_stream function."""
+
+    _prompt_model = _get_adapter_function(provider, function)
+    if _prompt_model is None:
+        raise ValueError(f"Provider '{provider}' is not yet supported. Add basic prompting function for this provider.")
+
+    return _prompt_model
+
+
+def _prepare_llm_call(
+    messages: List[Union[str,dict]],
+    model:LLMsList,
+    system_prompt:Union[str,List[Union[str,dict]]],
+    max_tokens,
+    temperature,
+    json_output,
+    cache_system_prompt: bool,
+    function: str = "prompt",
+    truncate_input: bool = False,
+):
+    """
+    Validate a prompt_llm/aprompt_llm/stream_llm request and resolve the provider function to call.
+    Prompts longer than the model's input limit are rejected (or truncated) here, before any request is sent.
+
+    Returns:
+    - tuple: The provider prompt function and the kwargs to call it with.
+    """
+
+    model_info = ALL_LLMS[model]
+
+    assert max_tokens <= model_info['output_limit'], f"max_tokens must be less than or equal to {model_info['output_limit']} for {model}, but you requested up to {max_tokens} tokens."
+    if temperature is not None:
+        assert 0 <= temperature <= model_info['max_temp'], f"Permissible temperature values range from 0 to {model_info['max_temp']} for {model}, but you requested a temp of {temperature}."
+
+    provider = model_info['provider']
+    _prompt_model = _get_prompt_function(provider, function)
+
+    if not isinstance(messages, list):
+        raise TypeError("Messages must be a list of dictionary objects.")
+    messages = fit_context_window(messages, model, system_prompt, truncate=truncate_input)
+
+    extra_kwargs = {}
+    if provider in ("anthropic", "google"):
+        extra_kwargs["cache_system_prompt"] = cache_system_prompt
+
+    request = dict(
+        messages=messages,
+        model=model,
+        system_prompt=system_prompt,
+        # Cap the default at 8192: huge non-streaming requests trip SDK timeout guards
+        max_tokens=max_tokens if max_tokens else min(model_info['output_limit'], 8192),
+        temperature=temperature,
+        json_mode=json_output,
+        **extra_kwargs,
+    )
+
+    return _prompt_model, request
+
+
 @log_time
 def prompt_llm(
     messages: List[Union[str,dict]],
@@ -68,6 +262,8 @@ def prompt_llm(
     temperature=None,
     json_output=False,
     cache_system_prompt: bool = False,
+    bypass_cache: bool = False,
+    truncate_input: bool = False,
 ) -> str:
     """
     Get a response from an LLM.
@@ -82,59 +278,311 @@ def prompt_llm(
     - max_tokens (int): The maximum number of tokens to generate. If not specified, the model's output limit (capped at 8192) will be used.
     - temperature (float): The temperature to use for token sampling. Omitted from the
         request when None; some newer models reject the parameter.
-    - cache_system_prompt (bool): Forwarded to Anthropic to mark the system prompt for caching.
-        Silently ignored by other providers, which cache automatically.
+    - cache_system_prompt (bool): Forwarded to Anthropic to mark the system prompt for caching, and to
+        Gemini to put it in an explicit context cache. Silently ignored by other providers, which cache automatically.
+    - bypass_cache (bool): Skip the response cache (see `enable_response_cache`) for this call.
+        The fresh response still replaces any cached one.
+    - truncate_input (bool): If the prompt is longer than the model's input limit, shorten its
+        longest text messages to fit instead of raising a ValueError. Either way, oversized
+        prompts are caught before anything is sent. See `token_counting.estimate_input_tokens`
+        to check a prompt's size yourself.
 
     Returns:
     - str: The response from the LLM.
     """
 
-    model_info = ALL_LLMS[model]
-
-    assert max_tokens <= model_info['output_limit'], f"max_tokens must be less than or equal to {model_info['output_limit']} for {model}, but you requested up to {max_tokens} tokens."
-    if temperature is not None:
-        assert 0 <= temperature <= model_info['max_temp'], f"Permissible temperature values range from 0 to {model_info['max_temp']} for {model}, but you requested a temp of {temperature}."
+    _prompt_model, request = _prepare_llm_call(
+        messages, model, system_prompt, max_tokens, temperature, json_output, cache_system_prompt,
+        truncate_input=truncate_input,
+    )
 
-    provider = ALL_LLMS[model]['provider']
-
-    if provider == "openai":
-        from aitools.third_party_apis.openai_tools import prompt_openai as _prompt_model
-    elif provider == "anthropic":
-        from aitools.third_party_apis.anthropic_tools import prompt_claude as _prompt_model
-    elif provider == "google":
-        from aitools.third_party_apis.google_tools import prompt_gemini as _prompt_model
-    elif provider == "deepseek":
-        from aitools.third_party_apis.deepseek_tools import prompt_deepseek as _prompt_model
-    elif provider == "mistral":
-        from aitools.third_party_apis.mistral_tools import prompt_mistral as _prompt_model
+    started = time.perf_counter()
+    cache_key, response = lookup_response(request, bypass_cache)
+    if response is None:
+        print(f'Calling LLM "{model}"...\n')
+        response = _prompt_model(**request)
+        store_response(cache_key, response)
     else:
-        raise ValueError(f"Provider '{provider}' is not yet supported. Add basic prompting function for this provider.")
+        print(f'Using cached response from LLM "{model}".\n')
+    response["latency"] = time.perf_counter() - started
 
-    if not isinstance(messages, list):
-        raise TypeError("Messages must be a list of dictionary objects.")
+    log_token_usage(response, model)
 
-    print(f'Calling LLM "{model}"...\n')
+    return response["text"]
 
-    extra_kwargs = {}
-    if provider == "anthropic":
-        extra_kwargs["cache_system_prompt"] = cache_system_prompt
 
-    response = _prompt_model(
-        messages=messages,
-        model=model,
-        system_prompt=system_prompt,
-        # Cap the default at 8192: huge non-streaming requests trip SDK timeout guards
-        max_tokens=max_tokens if max_tokens else min(model_info['output_limit'], 8192),
-        temperature=temperature,
-        json_mode=json_output,
-        **extra_kwargs,
+@log_time
+async def aprompt_llm(
+    messages: List[Union[str,dict]],
+    model:LLMsList = DEFAULT_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=0,
+    temperature=None,
+    json_output=False,
+    cache_system_prompt: bool = False,
+    bypass_cache: bool = False,
+    truncate_input: bool = False,
+) -> str:
+    """
+    Async version of `prompt_llm`. Takes the same arguments and returns the same response,
+    but awaits the provider's async client so many calls can share one event loop.
+    """
+
+    _aprompt_model, request = _prepare_llm_call(
+        messages, model, system_prompt, max_tokens, temperature, json_output, cache_system_prompt,
+        function="aprompt", truncate_input=truncate_input,
     )
 
+    started = time.perf_counter()
+    cache_key, response = lookup_response(request, bypass_cache)
+    if response is None:
+        print(f'Calling LLM "{model}"...\n')
+        response = await _aprompt_model(**request)
+        store_response(cache_key, response)
+    else:
+        print(f'Using cached response from LLM "{model}".\n')
+    response["latency"] = time.perf_counter() - started
+
     log_token_usage(response, model)
 
     return response["text"]
 
 
+def _finish_stream(response: dict, model: LLMsList, cache_key, started: float, first_token_at: float) -> dict:
+    """Store a finished stream's response in the cache, log its usage and add its timings."""
+    if cache_key is not None and not response.get("response_cache_hit"):
+        store_response(cache_key, response)
+
+    finished = time.perf_counter()
+    response["time_to_first_token"] = (first_token_at or finished) - started
+    response["latency"] = finished - started
+    log_token_usage(response, model)
+    return response
+
+
+def stream_llm(
+    messages: List[Union[str,dict]],
+    model:LLMsList = DEFAULT_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=0,
+    temperature=None,
+    json_output=False,
+    cache_system_prompt: bool = False,
+    bypass_cache: bool = False,
+    truncate_input: bool = False,
+) -> Iterator[Union[str, dict]]:
+    """
+    Stream a response from an LLM.
+
+    Takes the same arguments as `prompt_llm`. Yields each text delta (str) as soon as the
+    provider sends it, then a final dict with the full "text", the token usage, and the
+    "time_to_first_token" and total "latency" in seconds. A response cache hit is yielded
+    as a single delta.
+
+    Example:
+        for event in stream_llm(["Tell me a story."]):
+            if isinstance(event, str):
+                send_to_client(event)
+            else:
+                usage = event
+    """
+
+    _stream_model, request = _prepare_llm_call(
+        messages, model, system_prompt, max_tokens, temperature, json_output, cache_system_prompt,
+        function="iter_stream", truncate_input=truncate_input,
+    )
+
+    started = time.perf_counter()
+    first_token_at = None
+
+    cache_key, response = lookup_response(request, bypass_cache)
+    if response is not None:
+        print(f'Using cached response from LLM "{model}".\n')
+        first_token_at = time.perf_counter()
+        yield response["text"]
+        yield _finish_stream(response, model, cache_key, started, first_token_at)
+        return
+
+    print(f'Calling LLM "{model}"...\n')
+    for event in _stream_model(**request):
+        if isinstance(event, str):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            yield event
+        else:
+            yield _finish_stream(event, model, cache_key, started, first_token_at)
+
+
+async def astream_llm(
+    messages: List[Union[str,dict]],
+    model:LLMsList = DEFAULT_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=0,
+    temperature=None,
+    json_output=False,
+    cache_system_prompt: bool = False,
+    bypass_cache: bool = False,
+    truncate_input: bool = False,
+) -> AsyncIterator[Union[str, dict]]:
+    """
+    Async version of `stream_llm`, built on the providers' async clients.
+    """
+
+    _astream_model, request = _prepare_llm_call(
+        messages, model, system_prompt, max_tokens, temperature, json_output, cache_system_prompt,
+        function="aiter_stream", truncate_input=truncate_input,
+    )
+
+    started = time.perf_counter()
+    first_token_at = None
+
+    cache_key, response = lookup_response(request, bypass_cache)
+    if response is not None:
+        print(f'Using cached response from LLM "{model}".\n')
+        first_token_at = time.perf_counter()
+        yield response["text"]
+        yield _finish_stream(response, model, cache_key, started, first_token_at)
+        return
+
+    print(f'Calling LLM "{model}"...\n')
+    async for event in _astream_model(**request):
+        if isinstance(event, str):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            yield event
+        else:
+            yield _finish_stream(event, model, cache_key, started, first_token_at)
+
+
+def _add_usage(total: dict, response: dict):
+    """Accumulate the token counts and retry counters of a response into a running usage total."""
+    for key in response:
+        if 'token' in key or key in ['retries', 'retry_wait_seconds']:
+            total[key] = total.get(key, 0) + response[key]
+        elif key == 'saved_usage':
+            _add_usage(total.setdefault('saved_usage', {}), response[key])
+
+
+async def aprompt_llm_many(
+    prompts: Iterable[dict],
+    concurrency: Union[int, Dict[str, int]] = DEFAULT_PROVIDER_CONCURRENCY,
+    ordered: bool = True,
+    return_exceptions: bool = False,
+) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Run many prompts concurrently, with a cap on in-flight requests per provider.
+
+    Args:
+    - prompts (Iterable[dict]): Prompt specs. Each spec takes the same keyword arguments as
+        `prompt_llm` (messages, model, system_prompt, max_tokens, temperature, json_output,
+        cache_system_prompt, bypass_cache, truncate_input); only `messages` is required.
+    - concurrency (int | dict): Maximum in-flight requests per provider. Pass a dict such as
+        {"openai": 32, "anthropic": 8} to set limits per provider; unlisted providers use
+        DEFAULT_PROVIDER_CONCURRENCY.
+    - ordered (bool): Yield results in input order. If False, yield them as they complete.
+    - return_exceptions (bool): Yield a failed call's exception in place of its text instead
+        of raising it and abandoning the remaining calls.
+
+    Yields:
+    - tuple: (index of the prompt spec, response text).
+
+    Token usage is accumulated per model and logged once after the last result.
+    """
+
+    import asyncio
+
+    semaphores = {}
+    usage_by_model = {}
+
+    def _semaphore(provider):
+        if provider not in semaphores:
+            if isinstance(concurrency, dict):
+                limit = concurrency.get(provider, DEFAULT_PROVIDER_CONCURRENCY)
+            else:
+                limit = concurrency
+            semaphores[provider] = asyncio.Semaphore(limit)
+        return semaphores[provider]
+
+    async def _run(index, spec):
+        spec = {"model": DEFAULT_LLM, **spec}
+        try:
+            _aprompt_model, request = _prepare_llm_call(
+                spec["messages"],
+                spec["model"],
+                spec.get("system_prompt", "You are a helpful assistant."),
+                spec.get("max_tokens", 0),
+                spec.get("temperature"),
+                spec.get("json_output", False),
+                spec.get("cache_system_prompt", False),
+                function="aprompt",
+                truncate_input=spec.get("truncate_input", False),
+            )
+            cache_key, response = lookup_response(request, spec.get("bypass_cache", False))
+            if response is None:
+                queued = time.perf_counter()
+                async with _semaphore(ALL_LLMS[spec["model"]]['provider']):
+                    started = time.perf_counter()
+                    response = await _aprompt_model(**request)
+                    response["latency"] = time.perf_counter() - started
+                    response["queue_wait_seconds"] = started - queued
+                store_response(cache_key, response)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return index, e
+        _record_llm_usage(response, spec["model"])
+        _add_usage(usage_by_model.setdefault(spec["model"], {}), response)
+        return index, response["text"]
+
+    tasks = [asyncio.ensure_future(_run(i, spec)) for i, spec in enumerate(prompts)]
+    print(f"Calling LLMs for {len(tasks)} prompts...\n")
+
+    try:
+        for task in (tasks if ordered else asyncio.as_completed(tasks)):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    for model, usage in usage_by_model.items():
+        if not is_quiet():
+            print(f'Total usage for "{model}":')
+        log_token_usage(usage, model, record=False)
+
+
+def prompt_llm_many(
+    prompts: Iterable[dict],
+    concurrency: Union[int, Dict[str, int]] = DEFAULT_PROVIDER_CONCURRENCY,
+    ordered: bool = True,
+    return_exceptions: bool = False,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Synchronous wrapper around `aprompt_llm_many` for callers without an event loop.
+    Takes the same arguments and yields the same (index, text) tuples.
+
+    Call `aprompt_llm_many` directly from code that is already running an event loop.
+    """
+
+    import asyncio
+
+    loop = asyncio.new_event_loop()
+    results = aprompt_llm_many(
+        prompts,
+        concurrency=concurrency,
+        ordered=ordered,
+        return_exceptions=return_exceptions,
+    )
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.close()
+
+
 def available_models() -> dict:
     """Return the LLM catalog filtered to models whose provider API key is set."""
     import os
@@ -161,6 +609,7 @@ def chat_with_llm(
     max_tokens=0,
     temperature=None,
     cache=True,
+    context_policy: ChatContextPolicy = None,
 ):
     """
     Conversational interface with an LLM.
@@ -168,6 +617,8 @@ def chat_with_llm(
     Specify prefill_response to provide the first words of the assistant's responses.
     Max tokens will be set to the model's output limit if not specified.
     Set cache to True to cache messages throughout the conversation. Generally a good idea for long conversations.
+    context_policy bounds the history that is resent each turn (see chat_context.py). By default,
+    older turns are summarized once the history reaches 75% of the model's input limit.
     """
 
     model_info = ALL_LLMS[model]
@@ -176,17 +627,9 @@ def chat_with_llm(
     if temperature is not None:
         assert 0 <= temperature <= model_info['max_temp'], f"Permissible temperature values range from 0 to {model_info['max_temp']} for {model}, but you requested a temp of {temperature}."
     
-    if model_info['provider'] == "openai":
-        from aitools.third_party_apis.openai_tools import (
-            stream_openai as _stream_llm,
-            format_openai_messages as _format_messages
-        )
-    elif model_info['provider'] == "anthropic":
-        from aitools.third_party_apis.anthropic_tools import (
-            stream_claude as _stream_llm,
-            format_claude_messages as _format_messages
-        )
-    else:
+    _stream_llm = _get_adapter_function(model_info['provider'], "stream")
+    _format_messages = _get_adapter_function(model_info['provider'], "format")
+    if _stream_llm is None or _format_messages is None:
         raise ValueError(f"Provider '{model_info['provider']}' is not yet supported. Add chat function for this provider.")
     
     if cache and model_info['provider'] != "anthropic":
@@ -214,12 +657,28 @@ def chat_with_llm(
 
     if isinstance(system_prompt, str):
         system_prompt = [system_prompt]
-    formatted_system_prompt = _format_messages(system_prompt, role="system", cache_messages=cache)
-    formatted_messages = _format_messages(messages, cache_messages=cache)
-    
+    formatted_system_prompt = _format_messages(system_prompt, role="system", model=model)
+    formatted_messages = _format_messages(messages, model=model)
+    if cache:
+        from aitools.third_party_apis.anthropic_cache_planner import plan_cache_breakpoints
+    cache_plan = None
+    expected_cache = {"cache_read_tokens": 0, "cache_write_tokens": 0}
+
+    if context_policy is None:
+        context_policy = ChatContextPolicy()
+    summary = ""
+    formatted_summary = []
+
     usage = {}
     while True:
         try:
+            compacted_messages, compacted_summary = context_policy.compact(formatted_messages, model, summary)
+            if compacted_messages is not formatted_messages:
+                formatted_messages = compacted_messages
+                if compacted_summary != summary:
+                    summary = compacted_summary
+                    formatted_summary = summary_messages(summary, _format_messages, model)
+
             print("Assistant: ", end='', flush=True)
             if prefill_response:
                 formatted_messages.append({
@@ -232,8 +691,15 @@ def chat_with_llm(
                     ]
                 })
 
+            request_messages = formatted_summary + formatted_messages
+            if cache:
+                # Re-placed every turn, so the breakpoints follow the conversation as it grows and compacts.
+                cache_plan = plan_cache_breakpoints(formatted_system_prompt, request_messages, model, previous=cache_plan)
+                for key in expected_cache:
+                    expected_cache[key] += cache_plan[key]
+
             response = _stream_llm(
-                formatted_messages=formatted_messages,
+                formatted_messages=request_messages,
                 model=model,
                 formatted_system_prompt=formatted_system_prompt,
                 max_tokens=max_tokens if max_tokens else model_info['output_limit'],
@@ -243,20 +709,13 @@ def chat_with_llm(
             print('\n')
 
             # Update usage
-            for key in response:
-                if 'token' in key:
-                    usage[key] = usage.get(key, 0) + response[key]
-                    
+            _record_llm_usage(response, model)
+            _add_usage(usage, response)
+
             if prefill_response:
-                if cache and len(formatted_messages) >= 4:
-                    # remove previous cache control - only use for the two most recent user messages
-                    del formatted_messages[-4]['content'][-1]['cache_control']
                 formatted_messages[-1]['content'][-1]['text'] += response['text']
             
             else:
-                if cache and len(formatted_messages) >= 3:
-                    # remove previous cache control - only use for the two most recent user messages
-                    del formatted_messages[-3]['content'][-1]['cache_control']
                 formatted_messages.append({
                     "role": "assistant",
                     "content": [
@@ -268,17 +727,7 @@ def chat_with_llm(
                 })
 
             # Add user response
-            message_content = {
-                "type": "text",
-                "text": input("User: "),
-            }
-            if cache:
-                message_content["cache_control"] = {"type": "ephemeral"}
-
-            formatted_messages.append({
-                "role": "user",
-                "content": [message_content]
-            })
+            formatted_messages += _format_messages([{"text": input("User: ")}], model=model)
 
             print()
 
@@ -287,7 +736,12 @@ def chat_with_llm(
             break
 
     print()
-    log_token_usage(usage, model)
+    if cache and not is_quiet():
+        print(
+            f"Cache plan: about {expected_cache['cache_read_tokens']} tokens expected from cache reads "
+            f"and {expected_cache['cache_write_tokens']} from cache writes.\n"
+        )
+    log_token_usage(usage, model, record=False)
 
     return
 
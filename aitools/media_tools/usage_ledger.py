@@ -0,0 +1,291 @@
+"""
+A machine-readable ledger of every LLM, image generation and transcription call.
+
+`log_token_usage`, `log_transcription_cost` and `generate_image` record each call here: model,
+provider, token counts, cost, latency, retries, response cache hits and the
+caller tag set with `usage_tag`. Records are kept in two places:
+- An in-process aggregator with per-model totals (see `usage_totals`).
+- Optionally, one or more sinks. Sinks are written by a background thread, so
+  recording never blocks on disk I/O. If the sinks fall WRITER_QUEUE_SIZE
+  records behind, further records are dropped from the sinks (not the totals).
+Each record also feeds the latency and throughput histograms in metrics.py.
+
+Console tables can be switched off with `configure_usage_ledger(quiet=True)`,
+for tight loops and services where the ledger is the record.
+
+Usage:
+    from aitools.media_tools.usage_ledger import JsonlSink, configure_usage_ledger, usage_tag
+
+    configure_usage_ledger(sinks=[JsonlSink("~/.cache/aitools/usage.jsonl")], quiet=True)
+    with usage_tag("nightly-summaries"):
+        prompt_llm(...)
+"""
+
+import atexit
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
+
+from aitools.media_tools.metrics import observe_call
+
+# Numeric fields summed into the per-model totals.
+TOTAL_FIELDS = [
+    "input_tokens",
+    "output_tokens",
+    "cache_write_tokens",
+    "cache_read_tokens",
+    "cost",
+    "latency",
+    "retries",
+    "duration_seconds",
+    "images",
+]
+WRITER_BATCH_SIZE = 500
+WRITER_QUEUE_SIZE = 10000
+
+_caller_tag: ContextVar[Optional[str]] = ContextVar("aitools_usage_tag", default=None)
+_collector: ContextVar[Optional[list]] = ContextVar("aitools_usage_collector", default=None)
+_quiet_block: ContextVar[bool] = ContextVar("aitools_usage_quiet", default=False)
+
+
+class JsonlSink:
+    '''Append records to a JSON Lines file, one object per line.'''
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+    def write(self, records: List[dict]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+
+    def close(self):
+        pass
+
+
+class SqliteSink:
+    '''
+    Append records to a SQLite table. The common fields get their own columns for
+    querying; the full record is kept as JSON in the "record" column.
+    '''
+
+    COLUMNS = ["timestamp", "kind", "model", "provider", "tag", "cost", "latency"]
+
+    def __init__(self, path: str, table: str = "usage"):
+        self.path = os.path.expanduser(path)
+        self.table = table
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = None
+
+    def write(self, records: List[dict]):
+        if self._conn is None:
+            import sqlite3
+
+            # Only the writer thread writes; close() runs after a flush, from whichever thread closes the ledger.
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "timestamp REAL, kind TEXT, model TEXT, provider TEXT, tag TEXT, cost REAL, latency REAL, record TEXT)"
+            )
+        rows = [[record.get(c) for c in self.COLUMNS] + [json.dumps(record)] for record in records]
+        with self._conn:
+            self._conn.executemany(f"INSERT INTO {self.table} VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class UsageLedger:
+    '''
+    Thread-safe per-model totals, plus a background writer that drains records to sinks.
+
+    Args:
+    - sinks (list): Objects with write(records) and close() methods, e.g. JsonlSink or SqliteSink.
+    - quiet (bool): Suppress the console usage tables.
+
+    `dropped` counts records the sinks missed because they fell WRITER_QUEUE_SIZE records behind.
+    '''
+
+    def __init__(self, sinks: List = None, quiet: bool = False):
+        self.sinks = list(sinks or [])
+        self.quiet = quiet
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self._writer = None
+        self.dropped = 0
+
+    def record(self, record: dict):
+        '''Add a record to the totals and queue it for the sinks.'''
+        with self._lock:
+            totals = self._totals.setdefault(record["model"], {"calls": 0, "response_cache_hits": 0})
+            totals["calls"] += 1
+            totals["response_cache_hits"] += int(bool(record.get("response_cache_hit")))
+            for field in TOTAL_FIELDS:
+                if record.get(field):
+                    totals[field] = totals.get(field, 0) + record[field]
+
+        if self.sinks:
+            self._ensure_writer()
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                # A stalled sink must not stall the calls being recorded.
+                with self._lock:
+                    self.dropped += 1
+                    first_drop = self.dropped == 1
+                if first_drop:
+                    print(f"Usage ledger sinks are {WRITER_QUEUE_SIZE} records behind; dropping records until they catch up.")
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._drain, name="usage-ledger-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _drain(self):
+        while True:
+            records = [self._queue.get()]
+            while len(records) < WRITER_BATCH_SIZE:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for sink in self.sinks:
+                try:
+                    sink.write(records)
+                except Exception as e:
+                    # A failing sink must not take down the caller or the other sinks.
+                    print(f"Usage ledger sink {type(sink).__name__} failed: {e}")
+            for _ in records:
+                self._queue.task_done()
+
+    def flush(self):
+        '''Block until every queued record has been written to the sinks.'''
+        if self._writer is not None:
+            self._queue.join()
+
+    def totals(self) -> dict:
+        '''Per-model totals: calls, response cache hits, token counts, cost, latency and retries.'''
+        with self._lock:
+            return {model: dict(totals) for model, totals in self._totals.items()}
+
+    def reset_totals(self):
+        with self._lock:
+            self._totals = {}
+
+    def close(self):
+        '''Flush queued records and close the sinks.'''
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+
+_ledger = UsageLedger()
+
+
+def configure_usage_ledger(sinks: List = None, quiet: bool = False) -> UsageLedger:
+    '''
+    Replace the active ledger. The previous ledger is flushed and its sinks closed.
+
+    Args:
+    - sinks (list): Where to write records, e.g. [JsonlSink("usage.jsonl"), SqliteSink("usage.sqlite")].
+        With no sinks, records only feed the in-process totals.
+    - quiet (bool): Suppress the console usage tables printed after each call.
+
+    Returns:
+    - UsageLedger: The new ledger.
+    '''
+    global _ledger
+    _ledger.close()
+    _ledger = UsageLedger(sinks, quiet)
+    return _ledger
+
+
+def get_usage_ledger() -> UsageLedger:
+    return _ledger
+
+
+def is_quiet() -> bool:
+    '''Whether console usage tables are suppressed, by the ledger or by an enclosing collect_usage block.'''
+    return _ledger.quiet or _quiet_block.get()
+
+
+def usage_totals() -> dict:
+    '''Per-model totals recorded by the active ledger since it was configured.'''
+    return _ledger.totals()
+
+
+def flush_usage_ledger():
+    '''Block until every recorded call has been written to the sinks.'''
+    _ledger.flush()
+
+
+@contextmanager
+def usage_tag(tag: str):
+    '''
+    Tag every call made inside the block, e.g. with a job or customer name.
+    The tag is a context variable, so asyncio tasks started inside the block inherit it.
+    '''
+    token = _caller_tag.set(tag)
+    try:
+        yield
+    finally:
+        _caller_tag.reset(token)
+
+
+def record_usage(kind: str, model: str, provider: str, **fields):
+    '''
+    Record one call in the active ledger.
+
+    Args:
+    - kind (str): "llm", "image" or "transcription".
+    - model (str): The model called.
+    - provider (str): The model's provider.
+    - fields: Token counts, cost, latency and other details of the call.
+    '''
+    record = {
+        "timestamp": time.time(),
+        "kind": kind,
+        "model": model,
+        "provider": provider,
+        "tag": _caller_tag.get(),
+        **fields,
+    }
+    _ledger.record(record)
+    observe_call(record)
+    collector = _collector.get()
+    if collector is not None:
+        collector.append(record)
+
+
+@contextmanager
+def collect_usage(quiet: bool = True):
+    '''
+    Collect the records of every call made inside the block, e.g. to print one combined cost
+    report for a multi-stage job. Calls are still recorded in the ledger as usual.
+    Like usage_tag, this is a context variable: asyncio tasks inherit it, but threads only see
+    it when their work is run in a copy of the caller's context (contextvars.copy_context().run).
+
+    Args:
+    - quiet (bool): Suppress the per-call console tables inside the block.
+
+    Yields:
+    - list: The records, appended as calls complete.
+    '''
+    records = []
+    collector_token = _collector.set(records)
+    quiet_token = _quiet_block.set(quiet or _quiet_block.get())
+    try:
+        yield records
+    finally:
+        _quiet_block.reset(quiet_token)
+        _collector.reset(collector_token)
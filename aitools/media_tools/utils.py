@@ -1,5 +1,6 @@
 import base64
 from functools import wraps
+import inspect
 import os
 import string
 import time
@@ -8,7 +9,20 @@ import time
 def log_time(func):
     '''
     Print the time it takes for an LLM call to process.
+    Works on both regular functions and coroutine functions.
     '''
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+
+            start = time.time()
+            result = await func(*args, **kwargs)
+            end = time.time()
+
+            print(f'Response took {end - start:.2f} seconds.')
+            return result
+        return async_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
 
@@ -45,7 +59,14 @@ def filenamify(s: str) -> str:
 def encode_image(image_path):
     '''
     Encode an image as base64.
+    Payloads are cached (see image_cache.py), so unchanged files are only encoded once.
     '''
+    from aitools.media_tools.image_cache import get_image_cache
+
+    cache = get_image_cache()
+    if cache is not None:
+        return cache.get(image_path)
+
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
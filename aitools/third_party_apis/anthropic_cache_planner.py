@@ -0,0 +1,147 @@
+"""
+Automatic placement of Anthropic prompt-cache breakpoints.
+
+Anthropic caches a prompt prefix up to each block marked with `cache_control`.
+A request may carry at most four markers, and prefixes shorter than the model's
+`cache_min_tokens` are silently not cached. `plan_cache_breakpoints` takes a
+formatted request and places the markers where they pay off, in this order:
+1. The conversation tail: the last user message, so the next turn can read it.
+2. The previous user message. The next request looks for earlier writes at most
+   20 blocks back from each marker, so keeping the previous tail marked keeps
+   the last write readable even when a turn adds many blocks.
+3. The end of the tools and system prompt, the most stable prefix.
+4. Large documents (single blocks over the minimum), largest first.
+
+Pass the previous plan back in with `previous=` on each turn. The plan then
+reports which part of the prompt should be read from the cache and which
+written to it.
+
+Usage:
+    plan = plan_cache_breakpoints(system, messages, model)
+    ...
+    plan = plan_cache_breakpoints(system, messages, model, previous=plan)
+    print(plan["cache_read_tokens"], plan["cache_write_tokens"])
+"""
+
+import hashlib
+import json
+from typing import List
+
+from aitools.third_party_apis.models import ALL_LLMS
+from aitools.third_party_apis.rate_limits import TOKENS_PER_IMAGE
+from aitools.third_party_apis.token_counting import estimate_text_tokens
+
+DEFAULT_MAX_BREAKPOINTS = 4
+DEFAULT_CACHE_MIN_TOKENS = 1024
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _block_tokens(block: dict, model: str) -> int:
+    if block.get("type") == "image":
+        return TOKENS_PER_IMAGE
+    if "text" in block:
+        return estimate_text_tokens(block["text"], model)
+    # Tool definitions and other structured blocks.
+    return estimate_text_tokens(json.dumps(block), model)
+
+
+def _block_digest(block: dict) -> bytes:
+    block = {key: value for key, value in block.items() if key != "cache_control"}
+    return json.dumps(block, sort_keys=True).encode("utf-8")
+
+
+def _content_blocks(message: dict) -> list:
+    if isinstance(message["content"], str):
+        # Breakpoints need a block to attach to.
+        message["content"] = [{"type": "text", "text": message["content"]}]
+    return message["content"]
+
+
+def plan_cache_breakpoints(
+    system: List[dict],
+    messages: List[dict],
+    model: str,
+    tools: List[dict] = None,
+    previous: dict = None,
+) -> dict:
+    '''
+    Place cache_control breakpoints on a formatted Anthropic request, in place.
+    Any existing markers are removed first; the planner owns placement.
+
+    Args:
+    - system (List[dict]): The formatted system prompt blocks.
+    - messages (List[dict]): The formatted messages.
+    - model (str): The Claude model, for its cache_min_tokens and breakpoint limit.
+    - tools (List[dict]): Tool definitions, if any. They precede the system prompt in the cache prefix.
+    - previous (dict): The plan returned for the previous request of the same conversation.
+
+    Returns:
+    - dict: The plan:
+        - breakpoints (list): (reason, prefix tokens) for each marker placed, in prompt order.
+        - total_tokens (int): Estimated tokens in the whole prompt.
+        - cache_read_tokens (int): Tokens expected to be read from the cache.
+        - cache_write_tokens (int): Tokens expected to be written to the cache.
+        - prefixes (dict): Digests of the cached prefixes, for the next call's `previous`.
+    '''
+    model_info = ALL_LLMS[model]
+    min_tokens = model_info.get("cache_min_tokens", DEFAULT_CACHE_MIN_TOKENS)
+    max_breakpoints = model_info.get("max_cache_breakpoints", DEFAULT_MAX_BREAKPOINTS)
+
+    # Every block in prefix order, with its message index (None for tools and system).
+    blocks = [(block, None) for block in (tools or [])] + [(block, None) for block in system]
+    for index, message in enumerate(messages):
+        blocks += [(block, index) for block in _content_blocks(message)]
+
+    digest = hashlib.sha256()
+    prefix_tokens, prefix_digests = [], []
+    tokens = 0
+    for block, _ in blocks:
+        block.pop("cache_control", None)
+        tokens += _block_tokens(block, model)
+        digest.update(_block_digest(block))
+        prefix_tokens.append(tokens)
+        prefix_digests.append(digest.hexdigest())
+
+    message_ends = {index: position for position, (_, index) in enumerate(blocks) if index is not None}
+    user_ends = [message_ends[i] for i, message in enumerate(messages) if message["role"] == "user" and i in message_ends]
+
+    candidates = []
+    if user_ends:
+        candidates.append((user_ends[-1], "conversation tail"))
+    if len(user_ends) > 1:
+        candidates.append((user_ends[-2], "previous turn"))
+    system_end = len(tools or []) + len(system) - 1
+    if system_end >= 0:
+        candidates.append((system_end, "system prompt"))
+    block_tokens = [tokens - (prefix_tokens[p - 1] if p else 0) for p, tokens in enumerate(prefix_tokens)]
+    documents = [p for p, (_, index) in enumerate(blocks) if index is not None and block_tokens[p] >= min_tokens]
+    candidates += [(p, "document") for p in sorted(documents, key=lambda p: block_tokens[p], reverse=True)]
+
+    chosen = {}
+    for position, reason in candidates:
+        if len(chosen) == max_breakpoints:
+            break
+        if prefix_tokens[position] >= min_tokens and position not in chosen:
+            chosen[position] = reason
+
+    for position in chosen:
+        blocks[position][0]["cache_control"] = dict(CACHE_CONTROL)
+
+    # The longest prefix cached by the previous request that this request repeats is read;
+    # from there up to the last breakpoint is written.
+    cached = (previous or {}).get("prefixes", {})
+    repeated = {d for d in prefix_digests if d in cached}
+    read = max((cached[d] for d in repeated), default=0)
+    written = max((prefix_tokens[p] for p in chosen), default=0)
+
+    return {
+        "breakpoints": [(chosen[p], prefix_tokens[p]) for p in sorted(chosen)],
+        "total_tokens": tokens,
+        "cache_read_tokens": read,
+        "cache_write_tokens": max(written - read, 0),
+        # Prefixes this prompt no longer repeats can never be read again, so they are dropped.
+        "prefixes": {
+            **{d: t for d, t in cached.items() if d in repeated},
+            **{prefix_digests[p]: prefix_tokens[p] for p in chosen},
+        },
+    }
@@ -1,31 +1,46 @@
 import os
-from typing import List, Literal, Union
+from typing import TYPE_CHECKING, List, Literal, Union
 
-import anthropic
-
-from aitools.media_tools.utils import encode_image
+from aitools.media_tools.image_preprocessing import prepare_image
+from aitools.third_party_apis.http_clients import build_http_client, get_async_client, get_client
 from aitools.third_party_apis.models import ALL_LLMS, AnthropicLLMs
+from aitools.third_party_apis.rate_limits import arate_limited, rate_limited, reconcile_rate_limit
+from aitools.third_party_apis.retries import awith_retries, with_retries
+
+if TYPE_CHECKING:
+    import anthropic
 
 ANTHROPIC_API_KEY=os.environ.get('ANTHROPIC_API_KEY')
 DEFAULT_ANTHROPIC_LLM = "claude-haiku-4-5"
 
 DEFAULT_ANTHROPIC_LLM_INFO = ALL_LLMS[DEFAULT_ANTHROPIC_LLM]
 
-_client = None
+def _build_client(async_client: bool = False):
+    import anthropic
+
+    if not ANTHROPIC_API_KEY:
+        raise ValueError("ANTHROPIC_API_KEY must be set as an environment variable.")
+    if async_client:
+        return anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY, max_retries=0,
+                                        http_client=build_http_client(anthropic.DefaultAsyncHttpxClient))
+    return anthropic.Anthropic(api_key=ANTHROPIC_API_KEY, max_retries=0,
+                               http_client=build_http_client(anthropic.DefaultHttpxClient))
+
+
+def _get_client() -> "anthropic.Anthropic":
+    return get_client("anthropic", _build_client)
 
-def _get_client() -> anthropic.Anthropic:
-    global _client
-    if _client is None:
-        if not ANTHROPIC_API_KEY:
-            raise ValueError("ANTHROPIC_API_KEY must be set as an environment variable.")
-        _client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-    return _client
+
+def _get_async_client() -> "anthropic.AsyncAnthropic":
+    # Async clients are bound to the event loop that created them; the factory keeps one per loop.
+    return get_async_client("anthropic", lambda: _build_client(async_client=True))
 
 
 def format_claude_messages(
     messages: List[Union[str,dict]] = [],
     role:Literal["system","user","assistant"] = "user",
     cache_messages=False,
+    model:str = None,
 ):
     '''
     Format messages for submission to a Claude model.
@@ -38,6 +53,7 @@ def format_claude_messages(
         If "cache" is also included in a message, a cache_control will be added after the message.
     - role (str): The role (system, user, assistant) of the message sender.
     - cache_messages (bool): Whether to cache the conversation. Will add cache_control after the last message.
+    - model (str): The model the messages are for. Images are downscaled to fit its image profile.
     '''
 
     content = []
@@ -55,17 +71,12 @@ def format_claude_messages(
                 "text": f"```\n{message['code']}\n```"
             })
         elif 'image' in message:
-            _, dot_ext = os.path.splitext(message['image'])
-            ext = dot_ext.strip('.').lower()
-            assert ext in ["png", "jpg", "jpeg", "gif", "webp"], f"Image must be a PNG, JPEG, GIF, or WEBP file, but you provided a {ext} file."
-            if ext == "jpg":
-                ext = "jpeg"
-            base64_image = encode_image(message['image'])
+            media_type, base64_image = prepare_image(message['image'], model)
             content.append({
                 "type": "image",
                 "source": {
                     "type": "base64",
-                    "media_type": f"image/{ext}",
+                    "media_type": media_type,
                     "data": base64_image,
                 }
             })
@@ -91,6 +102,46 @@ def format_claude_messages(
     return formatted_messages
 
 
+def _build_claude_request(
+    messages: List[Union[str,dict]],
+    model:AnthropicLLMs,
+    system_prompt:Union[str,List[Union[str,dict]]],
+    max_tokens,
+    temperature,
+    cache_system_prompt: bool,
+) -> dict:
+    """Build the messages.create kwargs shared by the sync and async prompt functions."""
+
+    if isinstance(system_prompt, str):
+        system_prompt = [system_prompt]
+    formatted_system_prompt = format_claude_messages(system_prompt, role="system", cache_messages=cache_system_prompt, model=model)
+    formatted_messages = format_claude_messages(messages, model=model)
+
+    request_kwargs = {}
+    if temperature is not None and ALL_LLMS[model].get("supports_temperature", True):
+        request_kwargs["temperature"] = temperature
+
+    return dict(
+        model=model,
+        system=formatted_system_prompt,
+        messages=formatted_messages,
+        max_tokens=max_tokens,
+        **request_kwargs,
+    )
+
+
+def _parse_claude_response(message) -> dict:
+    return {
+        # newer models may emit thinking blocks before the text block
+        "text": "".join(b.text for b in message.content if b.type == "text"),
+        "input_tokens": message.usage.input_tokens,
+        "output_tokens": message.usage.output_tokens,
+        # Anthropic already excludes cached tokens from input_tokens.
+        "cache_write_tokens": getattr(message.usage, "cache_creation_input_tokens", 0) or 0,
+        "cache_read_tokens": getattr(message.usage, "cache_read_input_tokens", 0) or 0,
+    }
+
+
 def prompt_claude(
     messages: List[Union[str,dict]],
     model:AnthropicLLMs = DEFAULT_ANTHROPIC_LLM,
@@ -119,34 +170,227 @@ def prompt_claude(
     Returns:
     - str: The response from the LLM.
     """
-    if isinstance(system_prompt, str):
-        system_prompt = [system_prompt]
-    formatted_system_prompt = format_claude_messages(system_prompt, role="system", cache_messages=cache_system_prompt)
-    formatted_messages = format_claude_messages(messages)
+    request = _build_claude_request(messages, model, system_prompt, max_tokens, temperature, cache_system_prompt)
+    (message, charged), retry_stats = with_retries(
+        rate_limited(lambda: _get_client().messages.create(**request), model, messages, system_prompt, max_tokens),
+        "anthropic",
+    )
+    response = _parse_claude_response(message)
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
 
-    request_kwargs = {}
-    if temperature is not None and ALL_LLMS[model].get("supports_temperature", True):
-        request_kwargs["temperature"] = temperature
+    return response
 
-    message = _get_client().messages.create(
-        model=model,
-        system=formatted_system_prompt,
-        messages=formatted_messages,
-        max_tokens=max_tokens,
-        **request_kwargs,
+
+async def aprompt_claude(
+    messages: List[Union[str,dict]],
+    model:AnthropicLLMs = DEFAULT_ANTHROPIC_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=8192,
+    temperature=None,
+    json_mode=False,
+    cache_system_prompt: bool = False,
+):
+    """
+    Async version of `prompt_claude`, built on the SDK's AsyncAnthropic client.
+    """
+    request = _build_claude_request(messages, model, system_prompt, max_tokens, temperature, cache_system_prompt)
+    (message, charged), retry_stats = await awith_retries(
+        arate_limited(lambda: _get_async_client().messages.create(**request), model, messages, system_prompt, max_tokens),
+        "anthropic",
     )
+    response = _parse_claude_response(message)
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
+
+    return response
+
+
+def _claude_stream_events(events):
+    """
+    Turn raw Messages API stream events into text deltas followed by a final
+    response dict with the same shape as `prompt_claude`'s.
+    """
+    collected = []
+    response = {"input_tokens": 0, "output_tokens": 0, "cache_write_tokens": 0, "cache_read_tokens": 0}
+    for event in events:
+        delta = _handle_claude_stream_event(event, response)
+        if delta:
+            collected.append(delta)
+            yield delta
+    yield {"text": "".join(collected), **response}
+
+
+async def _aclaude_stream_events(events):
+    """Async version of `_claude_stream_events`."""
+    collected = []
+    response = {"input_tokens": 0, "output_tokens": 0, "cache_write_tokens": 0, "cache_read_tokens": 0}
+    async for event in events:
+        delta = _handle_claude_stream_event(event, response)
+        if delta:
+            collected.append(delta)
+            yield delta
+    yield {"text": "".join(collected), **response}
+
+
+def _handle_claude_stream_event(event, response: dict):
+    """Record any usage carried by a stream event in `response`, and return its text delta, if any."""
+    if event.type == "message_start":
+        usage = event.message.usage
+        response["input_tokens"] = usage.input_tokens
+        response["output_tokens"] = usage.output_tokens
+        response["cache_write_tokens"] = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        response["cache_read_tokens"] = getattr(usage, "cache_read_input_tokens", 0) or 0
+    elif event.type == "message_delta":
+        # output_tokens in message_delta is cumulative, not an increment.
+        response["output_tokens"] = event.usage.output_tokens
+    elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+        return event.delta.text
+    return None
+
+
+def iter_claude_stream(
+    messages: List[Union[str,dict]],
+    model:AnthropicLLMs = DEFAULT_ANTHROPIC_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=8192,
+    temperature=None,
+    json_mode=False,
+    cache_system_prompt: bool = False,
+):
+    """
+    Stream a response from a Claude LLM.
+
+    Takes the same arguments as `prompt_claude`. Yields each text delta (str) as it
+    arrives, then a final dict with the full text and token usage.
+    """
+    request = _build_claude_request(messages, model, system_prompt, max_tokens, temperature, cache_system_prompt)
+    (events, charged), retry_stats = with_retries(
+        rate_limited(lambda: _get_client().messages.create(**request, stream=True), model, messages, system_prompt, max_tokens),
+        "anthropic",
+    )
+    for event in _claude_stream_events(events):
+        if isinstance(event, dict):
+            reconcile_rate_limit(model, charged, event)
+            event.update(retry_stats)
+        yield event
+
+
+async def aiter_claude_stream(
+    messages: List[Union[str,dict]],
+    model:AnthropicLLMs = DEFAULT_ANTHROPIC_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=8192,
+    temperature=None,
+    json_mode=False,
+    cache_system_prompt: bool = False,
+):
+    """
+    Async version of `iter_claude_stream`.
+    """
+    request = _build_claude_request(messages, model, system_prompt, max_tokens, temperature, cache_system_prompt)
+    (events, charged), retry_stats = await awith_retries(
+        arate_limited(lambda: _get_async_client().messages.create(**request, stream=True), model, messages, system_prompt, max_tokens),
+        "anthropic",
+    )
+    async for event in _aclaude_stream_events(events):
+        if isinstance(event, dict):
+            reconcile_rate_limit(model, charged, event)
+            event.update(retry_stats)
+        yield event
+
+
+def count_claude_tokens(
+    messages: List[Union[str,dict]],
+    model:AnthropicLLMs = DEFAULT_ANTHROPIC_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+) -> int:
+    """
+    Count a prompt's input tokens with Anthropic's count-tokens endpoint, which is free
+    and doesn't run the model.
+    """
+    request = _build_claude_request(messages, model, system_prompt, max_tokens=1, temperature=None, cache_system_prompt=False)
+    del request["max_tokens"]
+    result, _ = with_retries(lambda: _get_client().messages.count_tokens(**request), "anthropic")
+
+    return result.input_tokens
+
+
+def submit_claude_batch(
+    requests: List[dict],
+):
+    """
+    Submit requests to the Anthropic Message Batches API.
+
+    Args:
+    - requests (List[dict]): Requests to submit. Each has a "custom_id" plus the keyword
+        arguments of `prompt_claude` (messages, model, system_prompt, max_tokens,
+        temperature, cache_system_prompt). json_mode is accepted and ignored.
+
+    Returns:
+    - str: The Anthropic batch ID.
+    """
+
+    batch_requests = []
+    for request in requests:
+        request = dict(request)
+        custom_id = request.pop("custom_id")
+        request.pop("json_mode", None)
+        request.setdefault("cache_system_prompt", False)
+        batch_requests.append({
+            "custom_id": custom_id,
+            "params": _build_claude_request(**request),
+        })
+
+    batch = _get_client().messages.batches.create(requests=batch_requests)
+
+    return batch.id
+
+
+def poll_claude_batch(
+    batch_id: str,
+) -> dict:
+    """
+    Check the progress of an Anthropic message batch.
+
+    Returns:
+    - dict: "ended" (bool), the provider's "status", and request "counts".
+    """
+
+    batch = _get_client().messages.batches.retrieve(batch_id)
 
     return {
-        # newer models may emit thinking blocks before the text block
-        "text": "".join(b.text for b in message.content if b.type == "text"),
-        "input_tokens": message.usage.input_tokens,
-        "output_tokens": message.usage.output_tokens,
-        # Anthropic already excludes cached tokens from input_tokens.
-        "cache_write_tokens": getattr(message.usage, "cache_creation_input_tokens", 0) or 0,
-        "cache_read_tokens": getattr(message.usage, "cache_read_input_tokens", 0) or 0,
+        "ended": batch.processing_status == "ended",
+        "status": batch.processing_status,
+        "counts": {
+            "processing": batch.request_counts.processing,
+            "succeeded": batch.request_counts.succeeded,
+            "errored": batch.request_counts.errored,
+            "canceled": batch.request_counts.canceled,
+            "expired": batch.request_counts.expired,
+        },
     }
 
 
+def collect_claude_batch(
+    batch_id: str,
+):
+    """
+    Stream the results of a finished Anthropic message batch.
+
+    Yields:
+    - tuple: (custom_id, response) where response has the same shape as `prompt_claude`'s,
+        or {"error": str} for requests that errored, expired or were canceled.
+    """
+
+    for result in _get_client().messages.batches.results(batch_id):
+        if result.result.type == "succeeded":
+            yield result.custom_id, _parse_claude_response(result.result.message)
+        else:
+            error = getattr(result.result, "error", None) or result.result.type
+            yield result.custom_id, {"error": str(error)}
+
+
 def stream_claude(
     formatted_messages: List[dict],
     model:AnthropicLLMs = DEFAULT_ANTHROPIC_LLM,
@@ -160,32 +404,33 @@ def stream_claude(
     Prints the response as it is generated.
     """
 
-    if caching:
-        client_stream = _get_client().beta.prompt_caching.messages.stream
-    else:
-        client_stream = _get_client().messages.stream
-
     request_kwargs = {}
     if temperature is not None and ALL_LLMS[model].get("supports_temperature", True):
         request_kwargs["temperature"] = temperature
 
-    with client_stream(
-        model=model,
-        system=formatted_system_prompt,
-        messages=formatted_messages,
-        max_tokens=max_tokens,
-        **request_kwargs,
-    ) as stream:
-        for text_chunk in stream.text_stream:
-            print(text_chunk, end="", flush=True)
-
-    response = {
-        'text': "".join(b.text for b in stream.current_message_snapshot.content if b.type == "text"),
-        'input_tokens': stream.current_message_snapshot.usage.input_tokens,
-        'output_tokens': stream.current_message_snapshot.usage.output_tokens,
-    }
-    if caching:
-        response['cache_write_tokens'] = stream.current_message_snapshot.usage.cache_creation_input_tokens
-        response['cache_read_tokens'] = stream.current_message_snapshot.usage.cache_read_input_tokens
+    # Prompt caching is controlled by the cache_control markers in the formatted
+    # messages, so `caching` needs no special client.
+    def _create():
+        return _get_client().messages.create(
+            model=model,
+            system=formatted_system_prompt,
+            messages=formatted_messages,
+            max_tokens=max_tokens,
+            stream=True,
+            **request_kwargs,
+        )
+
+    (events, charged), retry_stats = with_retries(
+        rate_limited(_create, model, formatted_messages, formatted_system_prompt, max_tokens, formatted=True),
+        "anthropic",
+    )
+
+    for event in _claude_stream_events(events):
+        if isinstance(event, str):
+            print(event, end="", flush=True)
+        else:
+            response = event
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
 
-    return response
\ No newline at end of file
+    return response
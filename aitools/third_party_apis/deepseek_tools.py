@@ -1,10 +1,14 @@
 import os
-from typing import List, Union
-
-from openai import OpenAI
+from typing import TYPE_CHECKING, List, Union
 
+from aitools.third_party_apis.http_clients import build_http_client, get_async_client, get_client
 from aitools.third_party_apis.models import ALL_LLMS, DeepseekLLMs
-from aitools.third_party_apis.openai_tools import format_openai_messages
+from aitools.third_party_apis.openai_tools import _aopenai_stream_events, _openai_stream_events, format_openai_messages
+from aitools.third_party_apis.rate_limits import arate_limited, rate_limited, reconcile_rate_limit
+from aitools.third_party_apis.retries import awith_retries, with_retries
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 
 DEEPSEEK_API_KEY=os.environ.get('DEEPSEEK_API_KEY')
 DEEPSEEK_BASE_URL = "https://api.deepseek.com"
@@ -12,15 +16,78 @@ DEFAULT_DEEPSEEK_LLM = "deepseek-v4-flash"
 
 DEFAULT_DEEPSEEK_LLM_INFO = ALL_LLMS[DEFAULT_DEEPSEEK_LLM]
 
-_client = None
+def _build_client(async_client: bool = False):
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+    if not DEEPSEEK_API_KEY:
+        raise ValueError("DEEPSEEK_API_KEY must be set as an environment variable.")
+    if async_client:
+        return AsyncOpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL, max_retries=0,
+                           http_client=build_http_client(DefaultAsyncHttpxClient))
+    return OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL, max_retries=0,
+                  http_client=build_http_client(DefaultHttpxClient))
+
+
+def _get_client() -> "OpenAI":
+    return get_client("deepseek", _build_client)
+
+
+def _get_async_client() -> "AsyncOpenAI":
+    # Async clients are bound to the event loop that created them; the factory keeps one per loop.
+    return get_async_client("deepseek", lambda: _build_client(async_client=True))
+
+
+def _build_deepseek_request(
+    messages: List[Union[str,dict]],
+    model:DeepseekLLMs,
+    system_prompt:Union[str,List[Union[str,dict]]],
+    max_tokens,
+    temperature,
+    json_mode,
+) -> dict:
+    """Build the chat.completions.create kwargs shared by the sync and async prompt functions."""
+
+    formatted_system_prompt = format_openai_messages(system_prompt, role="system", model=model)
+    formatted_messages = format_openai_messages(messages, model=model)
+    system_and_messages = formatted_system_prompt + formatted_messages
+
+    request_kwargs = {}
+    if temperature is not None:
+        request_kwargs["temperature"] = temperature
+    if json_mode:
+        request_kwargs["response_format"] = {"type": "json_object"}
+
+    return dict(
+        model=model,
+        messages=system_and_messages,
+        max_tokens=max_tokens,
+        **request_kwargs,
+    )
+
+
+def _parse_deepseek_usage(usage) -> dict:
+    cache_hit_tokens = getattr(usage, "prompt_cache_hit_tokens", None)
+    cache_miss_tokens = getattr(usage, "prompt_cache_miss_tokens", None)
 
-def _get_client() -> OpenAI:
-    global _client
-    if _client is None:
-        if not DEEPSEEK_API_KEY:
-            raise ValueError("DEEPSEEK_API_KEY must be set as an environment variable.")
-        _client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
-    return _client
+    if cache_hit_tokens is not None and cache_miss_tokens is not None:
+        # Only bill cache misses at the full input rate.
+        return {
+            "input_tokens": cache_miss_tokens,
+            "cache_read_tokens": cache_hit_tokens,
+            "output_tokens": usage.completion_tokens,
+        }
+
+    return {
+        "input_tokens": usage.prompt_tokens,
+        "output_tokens": usage.completion_tokens,
+    }
+
+
+def _parse_deepseek_response(chat_response) -> dict:
+    return {
+        "text": chat_response.choices[0].message.content,
+        **_parse_deepseek_usage(chat_response.usage),
+    }
 
 
 def prompt_deepseek(
@@ -48,38 +115,88 @@ def prompt_deepseek(
     - dict: The response text and token usage.
     """
 
-    formatted_system_prompt = format_openai_messages(system_prompt, role="system")
-    formatted_messages = format_openai_messages(messages)
-    system_and_messages = formatted_system_prompt + formatted_messages
+    request = _build_deepseek_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chat_response, charged), retry_stats = with_retries(
+        rate_limited(lambda: _get_client().chat.completions.create(**request), model, messages, system_prompt, max_tokens),
+        "deepseek",
+    )
+    response = _parse_deepseek_response(chat_response)
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
 
-    request_kwargs = {}
-    if temperature is not None:
-        request_kwargs["temperature"] = temperature
-    if json_mode:
-        request_kwargs["response_format"] = {"type": "json_object"}
+    return response
 
-    chat_response = _get_client().chat.completions.create(
-        model=model,
-        messages=system_and_messages,
-        max_tokens=max_tokens,
-        **request_kwargs,
+
+async def aprompt_deepseek(
+    messages: List[Union[str,dict]],
+    model:DeepseekLLMs = DEFAULT_DEEPSEEK_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=8192,
+    temperature=None,
+    json_mode=False,
+):
+    """
+    Async version of `prompt_deepseek`, built on the SDK's AsyncOpenAI client.
+    """
+
+    request = _build_deepseek_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chat_response, charged), retry_stats = await awith_retries(
+        arate_limited(lambda: _get_async_client().chat.completions.create(**request), model, messages, system_prompt, max_tokens),
+        "deepseek",
     )
+    response = _parse_deepseek_response(chat_response)
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
 
-    usage = chat_response.usage
-    cache_hit_tokens = getattr(usage, "prompt_cache_hit_tokens", None)
-    cache_miss_tokens = getattr(usage, "prompt_cache_miss_tokens", None)
+    return response
 
-    if cache_hit_tokens is not None and cache_miss_tokens is not None:
-        # Only bill cache misses at the full input rate.
-        return {
-            "text": chat_response.choices[0].message.content,
-            "input_tokens": cache_miss_tokens,
-            "cache_read_tokens": cache_hit_tokens,
-            "output_tokens": chat_response.usage.completion_tokens,
-        }
 
-    return {
-        "text": chat_response.choices[0].message.content,
-        "input_tokens": chat_response.usage.prompt_tokens,
-        "output_tokens": chat_response.usage.completion_tokens,
-    }
+def iter_deepseek_stream(
+    messages: List[Union[str,dict]],
+    model:DeepseekLLMs = DEFAULT_DEEPSEEK_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=8192,
+    temperature=None,
+    json_mode=False,
+):
+    """
+    Stream a response from a DeepSeek LLM.
+
+    Takes the same arguments as `prompt_deepseek`. Yields each text delta (str) as it
+    arrives, then a final dict with the full text and token usage.
+    """
+
+    request = _build_deepseek_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chunks, charged), retry_stats = with_retries(
+        rate_limited(lambda: _get_client().chat.completions.create(**request, stream=True, stream_options={"include_usage": True}), model, messages, system_prompt, max_tokens),
+        "deepseek",
+    )
+    for event in _openai_stream_events(chunks, _parse_deepseek_usage):
+        if isinstance(event, dict):
+            reconcile_rate_limit(model, charged, event)
+            event.update(retry_stats)
+        yield event
+
+
+async def aiter_deepseek_stream(
+    messages: List[Union[str,dict]],
+    model:DeepseekLLMs = DEFAULT_DEEPSEEK_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=8192,
+    temperature=None,
+    json_mode=False,
+):
+    """
+    Async version of `iter_deepseek_stream`.
+    """
+
+    request = _build_deepseek_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chunks, charged), retry_stats = await awith_retries(
+        arate_limited(lambda: _get_async_client().chat.completions.create(**request, stream=True, stream_options={"include_usage": True}), model, messages, system_prompt, max_tokens),
+        "deepseek",
+    )
+    async for event in _aopenai_stream_events(chunks, _parse_deepseek_usage):
+        if isinstance(event, dict):
+            reconcile_rate_limit(model, charged, event)
+            event.update(retry_stats)
+        yield event
@@ -8,17 +8,20 @@ The response is wrapped so it matches the OpenAI/Recraft shape the rest of this
 package expects: `response.data` is a list of objects carrying `b64_json`.
 """
 
-import base64
 import mimetypes
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
 
+from aitools.media_tools.utils import encode_image
+from aitools.third_party_apis.http_clients import build_http_client, get_client
 from aitools.third_party_apis.models import (
     GOOGLE_IMAGE_GENERATORS,
     GoogleImageGenerators,
     GoogleImageSizes,
 )
+from aitools.third_party_apis.retries import with_retries
 
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
 
@@ -66,8 +69,28 @@ def _image_content(path) -> dict:
     """Build an Interactions API image content part from a file on disk."""
     path = Path(path)
     mime_type = mimetypes.guess_type(path.name)[0] or "image/png"
-    data = base64.b64encode(path.read_bytes()).decode("ascii")
-    return {"type": "image", "data": data, "mime_type": mime_type}
+    return {"type": "image", "data": encode_image(path), "mime_type": mime_type}
+
+
+def _build_client():
+    if not GOOGLE_API_KEY:
+        raise Exception("GOOGLE_API_KEY must be set as an environment variable.")
+
+    try:
+        from google import genai
+        from google.genai import types
+    except ImportError:
+        raise ImportError(
+            "The google-genai package is required for Gemini image generation. "
+            "Install it with `pip install google-genai`."
+        )
+
+    return genai.Client(api_key=GOOGLE_API_KEY, http_options=types.HttpOptions(httpx_client=build_http_client()))
+
+
+def _get_client():
+    '''The shared google-genai client, built on first use.'''
+    return get_client("google-genai", _build_client)
 
 
 def generate_image_via_google(
@@ -91,16 +114,7 @@ def generate_image_via_google(
     model alongside the prompt (e.g. a real object that should appear
     consistently rather than be re-described from scratch each time).
     """
-    if not GOOGLE_API_KEY:
-        raise Exception("GOOGLE_API_KEY must be set as an environment variable.")
-
-    try:
-        from google import genai
-    except ImportError:
-        raise ImportError(
-            "The google-genai package is required for Gemini image generation. "
-            "Install it with `pip install google-genai`."
-        )
+    client = _get_client()
 
     model_info = GOOGLE_IMAGE_GENERATORS[model]
     resolution = resolution or model_info["default_resolution"]
@@ -118,13 +132,8 @@ def generate_image_via_google(
     else:
         model_input = prompt
 
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-
-    images = []
-    # The Interactions API returns a single image per call, so variations are
-    # separate requests.
-    for _ in range(num_variations):
-        interaction = client.interactions.create(
+    def _generate():
+        interaction, _ = with_retries(lambda: client.interactions.create(
             model=model,
             input=model_input,
             response_format={
@@ -133,7 +142,13 @@ def generate_image_via_google(
                 "aspect_ratio": size_to_aspect_ratio(size),
                 "image_size": resolution,
             },
-        )
-        images.append(_Image(b64_json=interaction.output_image.data))
+        ), "google")
+        return _Image(b64_json=interaction.output_image.data)
 
-    return _Response(data=images)
+    # The Interactions API returns a single image per call, so variations are
+    # separate requests, made concurrently over the shared client.
+    if num_variations == 1:
+        return _Response(data=[_generate()])
+    with ThreadPoolExecutor(max_workers=num_variations) as executor:
+        futures = [executor.submit(_generate) for _ in range(num_variations)]
+        return _Response(data=[future.result() for future in futures])
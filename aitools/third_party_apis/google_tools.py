@@ -1,26 +1,63 @@
+import asyncio
+import atexit
+from collections import OrderedDict
+import hashlib
+import json
 import os
-from typing import List, Literal, Union
+import threading
+import time
+from typing import TYPE_CHECKING, List, Literal, Union
 
-import google.generativeai as genai
-
-from aitools.media_tools.utils import encode_image
+from aitools.media_tools.image_preprocessing import prepare_image
 from aitools.third_party_apis.models import ALL_LLMS, GoogleLLMs
+from aitools.third_party_apis.rate_limits import arate_limited, rate_limited, reconcile_rate_limit
+from aitools.third_party_apis.retries import awith_retries, with_retries
+from aitools.third_party_apis.token_counting import estimate_input_tokens
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
 
 GOOGLE_API_KEY=os.getenv('GOOGLE_API_KEY')
 DEFAULT_GOOGLE_LLM = "gemini-3.5-flash"
 
 DEFAULT_GOOGLE_LLM_INFO = ALL_LLMS[DEFAULT_GOOGLE_LLM]
 
+# GenerativeModel objects kept for reuse, keyed on (model, system instruction).
+MODEL_CACHE_SIZE = 32
+# Explicit caches this close to expiry are replaced rather than reused.
+CACHE_EXPIRY_MARGIN_SECONDS = 60
+
+_settings = {
+    "cache_ttl_seconds": None,  # None uses the model's cache_ttl_seconds from the registry
+    "delete_caches_on_exit": True,
+}
 
-genai.configure(api_key=GOOGLE_API_KEY)
+_genai = None
+_models = OrderedDict()
+_cached_contents = {}
+# One lock per cache key while its cache is being created, so only calls with the same prefix wait.
+# Async callers use asyncio locks, keyed on (event loop, cache key).
+_cache_locks = {}
+_async_cache_locks = {}
+_models_lock = threading.Lock()
 
+def _get_genai():
+    '''Import and configure the google-generativeai SDK on first use.'''
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+
+        genai.configure(api_key=GOOGLE_API_KEY)
+        _genai = genai
+    return _genai
 
 
 def format_gemini_messages(
     messages: List[Union[str,dict]] = [],
     role:Literal["system","user","assistant"] = "user",
     cache_messages=False,
-) -> genai.types.ContentType:
+    model:str = None,
+) -> "genai.types.ContentType":
     '''
     Format messages for submission to a Gemini model.
 
@@ -31,6 +68,7 @@ def format_gemini_messages(
         - image (str): The path to an image.
     - role (str): The role (system, user, assistant) of the message sender.
     - cache_messages (bool): Not used here but included for consistency with Anthropic format function.
+    - model (str): The model the messages are for. Images are downscaled to fit its image profile.
     '''
     
     content = []
@@ -38,21 +76,16 @@ def format_gemini_messages(
         if type(message) is str:
             message = {"text": message}
         if 'text' in message:
-            content.append(message)
+            content.append({"text": message['text']})
         elif 'code' in message:
             content.append({
                 "text": f"```\n{message['code']}\n```"
             })
         elif 'image' in message:
-            _, dot_ext = os.path.splitext(message['image'])
-            ext = dot_ext.strip('.').lower()
-            assert ext in ["png", "jpg", "jpeg", "gif", "webp"], f"Image must be a PNG, JPEG, GIF, or WEBP file, but you provided a {ext} file."
-            if ext == "jpg":
-                ext = "jpeg"
-            base64_image = encode_image(message['image'])
+            media_type, base64_image = prepare_image(message['image'], model)
             content.append({
                 "inlineData": {
-                    "mimeType": f"image/{ext}",
+                    "mimeType": media_type,
                     "data": base64_image,
                 }
             })
@@ -75,25 +108,202 @@ def format_gemini_messages(
     return formatted_messages
 
 
-def prompt_gemini(
-    messages: List[Union[str,dict]],
-    model:GoogleLLMs = DEFAULT_GOOGLE_LLM,
-    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
-    max_tokens=DEFAULT_GOOGLE_LLM_INFO['output_limit'],
-    temperature=None,
-    json_mode=False,
-):
+def configure_gemini_caching(cache_ttl_seconds: int = None, delete_caches_on_exit: bool = True):
+    '''
+    Configure explicit Gemini context caches (see `prompt_gemini`'s cache_system_prompt).
 
-    formatted_messages = format_gemini_messages(messages)
-    formatted_system_prompt = format_gemini_messages([system_prompt], role="system")
-    
-    CLIENT = genai.GenerativeModel(
+    Args:
+    - cache_ttl_seconds (int): How long new caches live. None uses the model's cache_ttl_seconds from the registry.
+        Storage is billed for the whole TTL, so keep it close to how long the prefix stays in use.
+    - delete_caches_on_exit (bool): Delete the caches this process created when it exits, to stop storage billing.
+    '''
+    _settings["cache_ttl_seconds"] = cache_ttl_seconds
+    _settings["delete_caches_on_exit"] = delete_caches_on_exit
+
+
+def _content_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _get_model(model: str, formatted_system_prompt) -> "genai.GenerativeModel":
+    '''Return a GenerativeModel for (model, system instruction), reusing one built earlier.'''
+    key = _content_key(model, formatted_system_prompt)
+    with _models_lock:
+        if key in _models:
+            _models.move_to_end(key)
+            return _models[key]
+
+    CLIENT = _get_genai().GenerativeModel(
         model_name=model,
         system_instruction=formatted_system_prompt,
     )
 
-    response = CLIENT.generate_content(
-        contents=formatted_messages,
+    with _models_lock:
+        _models[key] = CLIENT
+        while len(_models) > MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+    return CLIENT
+
+
+def _live_cached_model(key: str):
+    with _models_lock:
+        entry = _cached_contents.get(key)
+        if entry and entry["expires_at"] - CACHE_EXPIRY_MARGIN_SECONDS > time.time():
+            return entry["model"]
+    return None
+
+
+def _cache_create_kwargs(model: str, formatted_system_prompt, formatted_prefix: list) -> dict:
+    import datetime
+
+    ttl = _settings["cache_ttl_seconds"] or ALL_LLMS[model]["cache_ttl_seconds"]
+    return dict(
+        model=model,
+        system_instruction=formatted_system_prompt,
+        contents=formatted_prefix,
+        ttl=datetime.timedelta(seconds=ttl),
+    )
+
+
+def _store_cached_model(key: str, cached_content, ttl_seconds: float, created_at: float):
+    '''Publish a newly created cache and return its model and the usage to bill for it.'''
+    cached_model = _get_genai().GenerativeModel.from_cached_content(cached_content=cached_content)
+    with _models_lock:
+        if not _cached_contents and _settings["delete_caches_on_exit"]:
+            atexit.register(delete_gemini_caches)
+        _cached_contents[key] = {
+            "cached_content": cached_content,
+            "model": cached_model,
+            "expires_at": created_at + ttl_seconds,
+        }
+
+    tokens = cached_content.usage_metadata.total_token_count
+    print(f"Created a Gemini context cache of {tokens} tokens for {int(ttl_seconds) // 60} minutes.")
+    return cached_model, {
+        "cache_write_tokens": tokens,
+        "cache_storage_token_hours": tokens * ttl_seconds / 3600,
+    }
+
+
+def _release_cache_lock(locks: dict, lock_key, lock):
+    # Later callers find the published entry, so the lock is only needed while creating.
+    with _models_lock:
+        if locks.get(lock_key) is lock:
+            del locks[lock_key]
+
+
+def _get_cached_model(model: str, formatted_system_prompt, formatted_prefix: list):
+    '''
+    Return a GenerativeModel backed by an explicit cache of the system instruction and prefix,
+    creating the cache if there is no live one.
+
+    Returns:
+    - tuple: The model, and the usage to bill for creating the cache ({} when an existing cache was reused).
+    '''
+    key = _content_key(model, formatted_system_prompt, formatted_prefix)
+    if (cached_model := _live_cached_model(key)) is not None:
+        return cached_model, {}
+    with _models_lock:
+        key_lock = _cache_locks.setdefault(key, threading.Lock())
+
+    # Concurrent calls with the same prefix create one cache between them; _models_lock
+    # is never held across the request, so other Gemini calls don't wait for it.
+    try:
+        with key_lock:
+            if (cached_model := _live_cached_model(key)) is not None:
+                return cached_model, {}
+            genai = _get_genai()
+            kwargs = _cache_create_kwargs(model, formatted_system_prompt, formatted_prefix)
+            created_at = time.time()
+            cached_content, _ = with_retries(lambda: genai.caching.CachedContent.create(**kwargs), "google")
+            return _store_cached_model(key, cached_content, kwargs["ttl"].total_seconds(), created_at)
+    finally:
+        _release_cache_lock(_cache_locks, key, key_lock)
+
+
+async def _aget_cached_model(model: str, formatted_system_prompt, formatted_prefix: list):
+    '''
+    Async version of `_get_cached_model`. The SDK's create call is blocking, so it runs in
+    a worker thread and waiting callers yield to the event loop.
+    '''
+    key = _content_key(model, formatted_system_prompt, formatted_prefix)
+    if (cached_model := _live_cached_model(key)) is not None:
+        return cached_model, {}
+    lock_key = (asyncio.get_running_loop(), key)
+    with _models_lock:
+        key_lock = _async_cache_locks.setdefault(lock_key, asyncio.Lock())
+
+    try:
+        async with key_lock:
+            if (cached_model := _live_cached_model(key)) is not None:
+                return cached_model, {}
+            genai = _get_genai()
+            kwargs = _cache_create_kwargs(model, formatted_system_prompt, formatted_prefix)
+            created_at = time.time()
+            cached_content, _ = await awith_retries(
+                lambda: asyncio.to_thread(genai.caching.CachedContent.create, **kwargs), "google",
+            )
+            return _store_cached_model(key, cached_content, kwargs["ttl"].total_seconds(), created_at)
+    finally:
+        _release_cache_lock(_async_cache_locks, lock_key, key_lock)
+
+
+def delete_gemini_caches():
+    '''Delete the explicit context caches this process created, ending their storage billing.'''
+    with _models_lock:
+        entries = list(_cached_contents.values())
+        _cached_contents.clear()
+    for entry in entries:
+        if entry["expires_at"] > time.time():
+            try:
+                entry["cached_content"].delete()
+            except Exception as e:
+                print(f"Couldn't delete Gemini cache {entry['cached_content'].name}: {e}")
+
+
+def _split_cached_prefix(messages: List[Union[str,dict]]):
+    '''Split messages after the last one marked with "cache", the end of the prefix to cache.'''
+    marked = [i for i, message in enumerate(messages) if isinstance(message, dict) and message.get("cache")]
+    if not marked:
+        return [], messages
+    return messages[:marked[-1] + 1], messages[marked[-1] + 1:]
+
+
+def _prepare_gemini_request(
+    messages: List[Union[str,dict]],
+    model:GoogleLLMs,
+    system_prompt:Union[str,List[Union[str,dict]]],
+    max_tokens,
+    temperature,
+    json_mode,
+    cache_system_prompt: bool = False,
+):
+    """
+    Format the parts of a request shared by the sync and async prompt functions.
+
+    Returns:
+    - tuple: The formatted system instruction, the formatted prefix to cache explicitly (None
+        if nothing is cached), and the generate_content kwargs.
+    """
+
+    if isinstance(system_prompt, str):
+        system_prompt = [system_prompt]
+    formatted_system_prompt = format_gemini_messages(system_prompt, role="system", model=model)
+
+    prefix, messages = _split_cached_prefix(messages)
+    if (cache_system_prompt or prefix) and estimate_input_tokens(prefix, model, system_prompt) < ALL_LLMS[model]["cache_min_tokens"]:
+        # Gemini rejects explicit caches under the minimum; implicit caching still applies.
+        messages = prefix + messages
+        prefix = []
+        cache_system_prompt = False
+
+    formatted_prefix = None
+    if cache_system_prompt or prefix:
+        formatted_prefix = format_gemini_messages(prefix, model=model) if prefix else []
+
+    genai = _get_genai()
+    request = dict(
+        contents=format_gemini_messages(messages, model=model),
         generation_config=genai.types.GenerationConfig(
             max_output_tokens=max_tokens,
             temperature=temperature,
@@ -101,13 +311,231 @@ def prompt_gemini(
         )
     )
 
-    usage = response.usage_metadata
+    return formatted_system_prompt, formatted_prefix, request
+
+
+def _build_gemini_request(
+    messages: List[Union[str,dict]],
+    model:GoogleLLMs,
+    system_prompt:Union[str,List[Union[str,dict]]],
+    max_tokens,
+    temperature,
+    json_mode,
+    cache_system_prompt: bool = False,
+):
+    """
+    Build the model object and generate_content kwargs shared by the sync prompt functions.
+
+    Returns:
+    - tuple: The model, the request kwargs, and usage to bill for creating an explicit cache ({} if none was created).
+    """
+    formatted_system_prompt, formatted_prefix, request = _prepare_gemini_request(
+        messages, model, system_prompt, max_tokens, temperature, json_mode, cache_system_prompt,
+    )
+    if formatted_prefix is None:
+        return _get_model(model, formatted_system_prompt), request, {}
+    CLIENT, cache_usage = _get_cached_model(model, formatted_system_prompt, formatted_prefix)
+    return CLIENT, request, cache_usage
+
+
+async def _abuild_gemini_request(
+    messages: List[Union[str,dict]],
+    model:GoogleLLMs,
+    system_prompt:Union[str,List[Union[str,dict]]],
+    max_tokens,
+    temperature,
+    json_mode,
+    cache_system_prompt: bool = False,
+):
+    """Async version of `_build_gemini_request`, which creates explicit caches without blocking the event loop."""
+    formatted_system_prompt, formatted_prefix, request = _prepare_gemini_request(
+        messages, model, system_prompt, max_tokens, temperature, json_mode, cache_system_prompt,
+    )
+    if formatted_prefix is None:
+        return _get_model(model, formatted_system_prompt), request, {}
+    CLIENT, cache_usage = await _aget_cached_model(model, formatted_system_prompt, formatted_prefix)
+    return CLIENT, request, cache_usage
+
+
+def _parse_gemini_usage(usage) -> dict:
     cache_read_tokens = getattr(usage, "cached_content_token_count", 0) or 0
 
     return {
-        "text": response.text,
         # prompt_token_count includes cached tokens; exclude them from input_tokens.
         "input_tokens": usage.prompt_token_count - cache_read_tokens,
         "cache_read_tokens": cache_read_tokens,
         "output_tokens": usage.candidates_token_count,
     }
+
+
+def _parse_gemini_response(response) -> dict:
+    return {
+        "text": response.text,
+        **_parse_gemini_usage(response.usage_metadata),
+    }
+
+
+def _gemini_chunk_text(chunk) -> str:
+    # `chunk.text` raises when a chunk carries no text parts (e.g. the final usage-only chunk).
+    if not chunk.candidates:
+        return ""
+    return "".join(getattr(part, "text", "") for part in chunk.candidates[0].content.parts)
+
+
+def prompt_gemini(
+    messages: List[Union[str,dict]],
+    model:GoogleLLMs = DEFAULT_GOOGLE_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=DEFAULT_GOOGLE_LLM_INFO['output_limit'],
+    temperature=None,
+    json_mode=False,
+    cache_system_prompt: bool = False,
+):
+    """
+    Get a response from a Gemini LLM.
+
+    Model objects are reused across calls with the same model and system prompt.
+    Set cache_system_prompt, or add "cache": True to a message, to put the system prompt
+    (and the messages up to the last marked one) in an explicit context cache. The cache
+    is reused until it expires (see `configure_gemini_caching`); its creation and storage
+    are billed as cache_write_tokens and cache_storage_token_hours. Prefixes below the
+    model's cache_min_tokens are sent uncached.
+    """
+
+    CLIENT, request, cache_usage = _build_gemini_request(
+        messages, model, system_prompt, max_tokens, temperature, json_mode, cache_system_prompt,
+    )
+    (gemini_response, charged), retry_stats = with_retries(
+        rate_limited(lambda: CLIENT.generate_content(**request), model, messages, system_prompt, max_tokens),
+        "google",
+    )
+    response = _parse_gemini_response(gemini_response)
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
+    response.update(cache_usage)
+
+    return response
+
+
+async def aprompt_gemini(
+    messages: List[Union[str,dict]],
+    model:GoogleLLMs = DEFAULT_GOOGLE_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=DEFAULT_GOOGLE_LLM_INFO['output_limit'],
+    temperature=None,
+    json_mode=False,
+    cache_system_prompt: bool = False,
+):
+    """
+    Async version of `prompt_gemini`, built on `generate_content_async`.
+    """
+
+    CLIENT, request, cache_usage = await _abuild_gemini_request(
+        messages, model, system_prompt, max_tokens, temperature, json_mode, cache_system_prompt,
+    )
+    (gemini_response, charged), retry_stats = await awith_retries(
+        arate_limited(lambda: CLIENT.generate_content_async(**request), model, messages, system_prompt, max_tokens),
+        "google",
+    )
+    response = _parse_gemini_response(gemini_response)
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
+    response.update(cache_usage)
+
+    return response
+
+
+def count_gemini_tokens(
+    messages: List[Union[str,dict]],
+    model:GoogleLLMs = DEFAULT_GOOGLE_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+) -> int:
+    """
+    Count a prompt's input tokens, including the system instruction, with the Gemini
+    count-tokens endpoint.
+    """
+
+    # Counting must not create explicit caches, so "cache" marks are dropped.
+    messages = [{k: v for k, v in m.items() if k != "cache"} if isinstance(m, dict) else m for m in messages]
+    CLIENT, request, _ = _build_gemini_request(messages, model, system_prompt, max_tokens=1, temperature=None, json_mode=False)
+    result, _ = with_retries(lambda: CLIENT.count_tokens(request["contents"]), "google")
+
+    return result.total_tokens
+
+
+def iter_gemini_stream(
+    messages: List[Union[str,dict]],
+    model:GoogleLLMs = DEFAULT_GOOGLE_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=DEFAULT_GOOGLE_LLM_INFO['output_limit'],
+    temperature=None,
+    json_mode=False,
+    cache_system_prompt: bool = False,
+):
+    """
+    Stream a response from a Gemini LLM.
+
+    Takes the same arguments as `prompt_gemini`. Yields each text delta (str) as it
+    arrives, then a final dict with the full text and token usage.
+    """
+
+    CLIENT, request, cache_usage = _build_gemini_request(
+        messages, model, system_prompt, max_tokens, temperature, json_mode, cache_system_prompt,
+    )
+    (chunks, charged), retry_stats = with_retries(
+        rate_limited(lambda: CLIENT.generate_content(**request, stream=True), model, messages, system_prompt, max_tokens),
+        "google",
+    )
+
+    collected = []
+    usage = None
+    for chunk in chunks:
+        delta = _gemini_chunk_text(chunk)
+        if delta:
+            collected.append(delta)
+            yield delta
+        # Every chunk carries usage so far; the last one has the totals.
+        usage = chunk.usage_metadata or usage
+
+    response = {"text": "".join(collected), **(_parse_gemini_usage(usage) if usage else {})}
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
+    response.update(cache_usage)
+    yield response
+
+
+async def aiter_gemini_stream(
+    messages: List[Union[str,dict]],
+    model:GoogleLLMs = DEFAULT_GOOGLE_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=DEFAULT_GOOGLE_LLM_INFO['output_limit'],
+    temperature=None,
+    json_mode=False,
+    cache_system_prompt: bool = False,
+):
+    """
+    Async version of `iter_gemini_stream`.
+    """
+
+    CLIENT, request, cache_usage = await _abuild_gemini_request(
+        messages, model, system_prompt, max_tokens, temperature, json_mode, cache_system_prompt,
+    )
+    (chunks, charged), retry_stats = await awith_retries(
+        arate_limited(lambda: CLIENT.generate_content_async(**request, stream=True), model, messages, system_prompt, max_tokens),
+        "google",
+    )
+
+    collected = []
+    usage = None
+    async for chunk in chunks:
+        delta = _gemini_chunk_text(chunk)
+        if delta:
+            collected.append(delta)
+            yield delta
+        usage = chunk.usage_metadata or usage
+
+    response = {"text": "".join(collected), **(_parse_gemini_usage(usage) if usage else {})}
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
+    response.update(cache_usage)
+    yield response
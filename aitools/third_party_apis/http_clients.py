@@ -0,0 +1,180 @@
+"""
+Shared, pooled HTTP clients for the provider SDKs.
+
+Every provider module gets its SDK client from `get_client` (or
+`get_async_client`) instead of keeping an unlocked global. The factory:
+- Builds each client at most once per process. Creation is locked, and clients
+  are rebuilt after a fork, because connection pools can't be shared across processes.
+- Builds async clients once per event loop, since their pools are bound to the
+  loop that created them.
+- Backs the OpenAI-compatible (OpenAI, DeepSeek, Mistral, Recraft), Anthropic and
+  google-genai clients with one tuned httpx pool each: keep-alive, HTTP/2 when
+  the h2 package is installed, and configurable connection limits and timeouts.
+  Concurrent callers reuse warm TLS connections instead of paying a handshake each.
+- Hands out a pooled `requests.Session` for plain downloads (see `get_requests_session`).
+
+Usage:
+    from aitools.third_party_apis.http_clients import configure_http_clients
+
+    configure_http_clients(max_connections=200, read_timeout=120)
+"""
+
+import asyncio
+import importlib
+import os
+import threading
+import weakref
+
+_settings = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "connect_timeout": 10.0,
+    "read_timeout": 600.0,
+    "http2": True,
+}
+
+_lock = threading.Lock()
+_clients = {}
+_clients_pid = os.getpid()
+_async_clients = weakref.WeakKeyDictionary()
+_sessions = {}
+
+
+def configure_http_clients(
+    max_connections: int = None,
+    max_keepalive_connections: int = None,
+    keepalive_expiry: float = None,
+    connect_timeout: float = None,
+    read_timeout: float = None,
+    http2: bool = None,
+):
+    '''
+    Tune the connection pools. Clients built earlier are dropped, so the next call builds new ones.
+    Arguments left as None keep their current values.
+
+    Args:
+    - max_connections (int): Open connections per client, across all hosts.
+    - max_keepalive_connections (int): Idle connections kept open for reuse.
+    - keepalive_expiry (float): Seconds an idle connection is kept.
+    - connect_timeout (float): Seconds to wait for a connection, including the TLS handshake.
+    - read_timeout (float): Seconds to wait for response data. Long generations need a generous value.
+    - http2 (bool): Use HTTP/2 where the server supports it. Needs the h2 package (`pip install httpx[http2]`).
+    '''
+    updates = {
+        "max_connections": max_connections,
+        "max_keepalive_connections": max_keepalive_connections,
+        "keepalive_expiry": keepalive_expiry,
+        "connect_timeout": connect_timeout,
+        "read_timeout": read_timeout,
+        "http2": http2,
+    }
+    with _lock:
+        _settings.update({key: value for key, value in updates.items() if value is not None})
+        _clients.clear()
+        _async_clients.clear()
+        _sessions.clear()
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _httpx_module(client_class):
+    # SDKs pin their own httpx (some vendor it as httpx2); build pools from the same package.
+    for base in client_class.__mro__:
+        root = base.__module__.split(".")[0]
+        if root.startswith("httpx"):
+            return importlib.import_module(root)
+    return importlib.import_module("httpx")
+
+
+def _httpx_options(httpx) -> dict:
+    return dict(
+        limits=httpx.Limits(
+            max_connections=_settings["max_connections"],
+            max_keepalive_connections=_settings["max_keepalive_connections"],
+            keepalive_expiry=_settings["keepalive_expiry"],
+        ),
+        timeout=httpx.Timeout(_settings["read_timeout"], connect=_settings["connect_timeout"]),
+        http2=_settings["http2"] and http2_available(),
+    )
+
+
+def requests_timeout() -> tuple:
+    '''The configured (connect, read) timeouts, for requests calls.'''
+    return (_settings["connect_timeout"], _settings["read_timeout"])
+
+
+def build_http_client(client_class=None):
+    '''
+    A new pooled httpx client with the configured limits and timeouts. Pass it to an SDK as http_client.
+
+    Args:
+    - client_class (type): The SDK's DefaultHttpxClient (or DefaultAsyncHttpxClient), so the pool keeps
+        the SDK's defaults and comes from the httpx package it expects. Defaults to httpx.Client.
+    '''
+    if client_class is None:
+        import httpx
+
+        client_class = httpx.Client
+    return client_class(**_httpx_options(_httpx_module(client_class)))
+
+
+def _check_pid():
+    # A forked child inherits the parent's clients, but their pooled sockets are shared
+    # with the parent; start over with fresh ones. Called with the lock held.
+    global _clients_pid
+    if _clients_pid != os.getpid():
+        _clients.clear()
+        _sessions.clear()
+        _clients_pid = os.getpid()
+
+
+def get_client(name: str, build):
+    '''
+    Return the process's client called `name`, building it with `build()` on first use.
+
+    Args:
+    - name (str): A key for the client, e.g. "openai".
+    - build (callable): Builds the client. Called at most once per process (until reconfigured).
+    '''
+    with _lock:
+        _check_pid()
+        if name not in _clients:
+            _clients[name] = build()
+        return _clients[name]
+
+
+def get_async_client(name: str, build):
+    '''Like `get_client`, but keeps one client per event loop, since async pools are bound to their loop.'''
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        if name not in clients:
+            clients[name] = build()
+        return clients[name]
+
+
+def get_requests_session():
+    '''
+    A requests.Session with a pooled HTTPAdapter sized to max_connections, shared by the process.
+    Use it for plain downloads (e.g. generated images) so repeated fetches reuse connections.
+    requests has no session-wide timeout; pass timeout=requests_timeout() to each call.
+    '''
+    with _lock:
+        _check_pid()
+        if "session" not in _sessions:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=_settings["max_connections"])
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions["session"] = session
+        return _sessions["session"]
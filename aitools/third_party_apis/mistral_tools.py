@@ -1,10 +1,14 @@
 import os
-from typing import List, Union
-
-from openai import OpenAI
+from typing import TYPE_CHECKING, List, Union
 
+from aitools.third_party_apis.http_clients import build_http_client, get_async_client, get_client
 from aitools.third_party_apis.models import ALL_LLMS, MistralLLMs
-from aitools.third_party_apis.openai_tools import format_openai_messages
+from aitools.third_party_apis.openai_tools import _aopenai_stream_events, _openai_stream_events, format_openai_messages
+from aitools.third_party_apis.rate_limits import arate_limited, rate_limited, reconcile_rate_limit
+from aitools.third_party_apis.retries import awith_retries, with_retries
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 
 MISTRAL_API_KEY=os.environ.get('MISTRAL_API_KEY')
 MISTRAL_BASE_URL = "https://api.mistral.ai/v1"
@@ -12,15 +16,67 @@ DEFAULT_MISTRAL_LLM = "mistral-medium-latest"
 
 DEFAULT_MISTRAL_LLM_INFO = ALL_LLMS[DEFAULT_MISTRAL_LLM]
 
-_client = None
+def _build_client(async_client: bool = False):
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+    if not MISTRAL_API_KEY:
+        raise ValueError("MISTRAL_API_KEY must be set as an environment variable.")
+    if async_client:
+        return AsyncOpenAI(api_key=MISTRAL_API_KEY, base_url=MISTRAL_BASE_URL, max_retries=0,
+                           http_client=build_http_client(DefaultAsyncHttpxClient))
+    return OpenAI(api_key=MISTRAL_API_KEY, base_url=MISTRAL_BASE_URL, max_retries=0,
+                  http_client=build_http_client(DefaultHttpxClient))
+
+
+def _get_client() -> "OpenAI":
+    return get_client("mistral", _build_client)
+
+
+def _get_async_client() -> "AsyncOpenAI":
+    # Async clients are bound to the event loop that created them; the factory keeps one per loop.
+    return get_async_client("mistral", lambda: _build_client(async_client=True))
+
+
+def _build_mistral_request(
+    messages: List[Union[str,dict]],
+    model:MistralLLMs,
+    system_prompt:Union[str,List[Union[str,dict]]],
+    max_tokens,
+    temperature,
+    json_mode,
+) -> dict:
+    """Build the chat.completions.create kwargs shared by the sync and async prompt functions."""
+
+    formatted_system_prompt = format_openai_messages(system_prompt, role="system", model=model)
+    formatted_messages = format_openai_messages(messages, model=model)
+    system_and_messages = formatted_system_prompt + formatted_messages
+
+    request_kwargs = {}
+    if temperature is not None:
+        request_kwargs["temperature"] = temperature
+    if json_mode:
+        request_kwargs["response_format"] = {"type": "json_object"}
+
+    return dict(
+        model=model,
+        messages=system_and_messages,
+        max_tokens=max_tokens,
+        **request_kwargs,
+    )
+
 
-def _get_client() -> OpenAI:
-    global _client
-    if _client is None:
-        if not MISTRAL_API_KEY:
-            raise ValueError("MISTRAL_API_KEY must be set as an environment variable.")
-        _client = OpenAI(api_key=MISTRAL_API_KEY, base_url=MISTRAL_BASE_URL)
-    return _client
+def _parse_mistral_usage(usage) -> dict:
+    return {
+        "input_tokens": usage.prompt_tokens,
+        "output_tokens": usage.completion_tokens,
+    }
+
+
+def _parse_mistral_response(chat_response) -> dict:
+    return {
+        "text": chat_response.choices[0].message.content,
+        **_parse_mistral_usage(chat_response.usage),
+    }
 
 
 def prompt_mistral(
@@ -48,25 +104,89 @@ def prompt_mistral(
     - dict: The response text and token usage.
     """
 
-    formatted_system_prompt = format_openai_messages(system_prompt, role="system")
-    formatted_messages = format_openai_messages(messages)
-    system_and_messages = formatted_system_prompt + formatted_messages
+    request = _build_mistral_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chat_response, charged), retry_stats = with_retries(
+        rate_limited(lambda: _get_client().chat.completions.create(**request), model, messages, system_prompt, max_tokens),
+        "mistral",
+    )
+    response = _parse_mistral_response(chat_response)
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
 
-    request_kwargs = {}
-    if temperature is not None:
-        request_kwargs["temperature"] = temperature
-    if json_mode:
-        request_kwargs["response_format"] = {"type": "json_object"}
+    return response
 
-    chat_response = _get_client().chat.completions.create(
-        model=model,
-        messages=system_and_messages,
-        max_tokens=max_tokens,
-        **request_kwargs,
+
+async def aprompt_mistral(
+    messages: List[Union[str,dict]],
+    model:MistralLLMs = DEFAULT_MISTRAL_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=8192,
+    temperature=None,
+    json_mode=False,
+):
+    """
+    Async version of `prompt_mistral`, built on the SDK's AsyncOpenAI client.
+    """
+
+    request = _build_mistral_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chat_response, charged), retry_stats = await awith_retries(
+        arate_limited(lambda: _get_async_client().chat.completions.create(**request), model, messages, system_prompt, max_tokens),
+        "mistral",
     )
+    response = _parse_mistral_response(chat_response)
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
 
-    return {
-        "text": chat_response.choices[0].message.content,
-        "input_tokens": chat_response.usage.prompt_tokens,
-        "output_tokens": chat_response.usage.completion_tokens,
-    }
+    return response
+
+
+def iter_mistral_stream(
+    messages: List[Union[str,dict]],
+    model:MistralLLMs = DEFAULT_MISTRAL_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=8192,
+    temperature=None,
+    json_mode=False,
+):
+    """
+    Stream a response from a Mistral LLM.
+
+    Takes the same arguments as `prompt_mistral`. Yields each text delta (str) as it
+    arrives, then a final dict with the full text and token usage.
+    """
+
+    request = _build_mistral_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    # Mistral reports usage on the final chunk without being asked for it via stream_options.
+    (chunks, charged), retry_stats = with_retries(
+        rate_limited(lambda: _get_client().chat.completions.create(**request, stream=True), model, messages, system_prompt, max_tokens),
+        "mistral",
+    )
+    for event in _openai_stream_events(chunks, _parse_mistral_usage):
+        if isinstance(event, dict):
+            reconcile_rate_limit(model, charged, event)
+            event.update(retry_stats)
+        yield event
+
+
+async def aiter_mistral_stream(
+    messages: List[Union[str,dict]],
+    model:MistralLLMs = DEFAULT_MISTRAL_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=8192,
+    temperature=None,
+    json_mode=False,
+):
+    """
+    Async version of `iter_mistral_stream`.
+    """
+
+    request = _build_mistral_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chunks, charged), retry_stats = await awith_retries(
+        arate_limited(lambda: _get_async_client().chat.completions.create(**request, stream=True), model, messages, system_prompt, max_tokens),
+        "mistral",
+    )
+    async for event in _aopenai_stream_events(chunks, _parse_mistral_usage):
+        if isinstance(event, dict):
+            reconcile_rate_limit(model, charged, event)
+            event.update(retry_stats)
+        yield event
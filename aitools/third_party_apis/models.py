@@ -28,6 +28,12 @@ OpenaiImageSizes = Literal[
 
 OPENAI_LLM_INFO = {
     "max_temp": 2,
+    "batch_discount": 0.5,  # Batch API requests are billed at half price
+    "tokenizer": "o200k_base",  # tiktoken encoding, used for local token counts when installed
+    "chars_per_token": 4.0,
+    # High-detail images are scaled to fit 2048x2048, then to a short side of 768px,
+    # and billed 85 tokens plus 170 per 512px tile.
+    "image_profile": {"max_long_side": 2048, "max_short_side": 768, "tokens": "openai_tiles"},
 }
 OPENAI_LLMS = {
     # GPT-5.x models reject the temperature parameter and require
@@ -39,6 +45,8 @@ OPENAI_LLMS = {
         "cache_read_cost_per_M": 0.50,
         "output_cost_per_M": 30.00,
         "supports_temperature": False,
+        "rpm": 500,  # tier 1 defaults; raise to match your account tier
+        "tpm": 500000,
     },
     "gpt-5.4": {
         "input_limit": 400000,
@@ -47,6 +55,8 @@ OPENAI_LLMS = {
         "cache_read_cost_per_M": 0.25,
         "output_cost_per_M": 15.00,
         "supports_temperature": False,
+        "rpm": 500,
+        "tpm": 500000,
     },
     "gpt-5.4-mini": {
         "input_limit": 400000,
@@ -55,6 +65,8 @@ OPENAI_LLMS = {
         "cache_read_cost_per_M": 0.075,
         "output_cost_per_M": 4.50,
         "supports_temperature": False,
+        "rpm": 500,
+        "tpm": 500000,
     },
     "gpt-4o": {
         "input_limit": 128000,
@@ -62,6 +74,8 @@ OPENAI_LLMS = {
         "input_cost_per_M": 2.50,
         "cache_read_cost_per_M": 1.25,
         "output_cost_per_M": 10,
+        "rpm": 500,
+        "tpm": 30000,
     },
     "gpt-4o-mini": {
         "input_limit": 128000,
@@ -69,14 +83,18 @@ OPENAI_LLMS = {
         "input_cost_per_M": 0.15,
         "cache_read_cost_per_M": 0.075,
         "output_cost_per_M": 0.60,
+        "rpm": 500,
+        "tpm": 200000,
     },
 }
 OPENAI_IMAGE_GENERATORS = {
     "dall-e-2": {
         "sizes": ["256x256", "512x512", "1024x1024"],
+        "max_images_per_request": 10,
     },
     "dall-e-3": {
         "sizes": ["1024x1024", "1792x1024", "1024x1792"],
+        "max_images_per_request": 1,  # n must be 1
     },
     "gpt-image-1": {
         # OpenAI's current flagship image model (GPT-image family). Natively
@@ -84,11 +102,13 @@ OPENAI_IMAGE_GENERATORS = {
         # and always returns b64_json (no response_format/url option).
         "sizes": ["1024x1024", "1536x1024", "1024x1536"],
         "supports_reference_images": True,
+        "max_images_per_request": 10,
     },
 }
 OPENAI_SPEECH_REC = {
     "whisper-1": {
         "cost_per_min": 0.0006,
+        "max_upload_bytes": 25 * 1024 * 1024,
     },
 }
 
@@ -100,6 +120,11 @@ AnthropicLLMs = Literal[
 ]
 ANTHROPIC_LLM_INFO = {
     "max_temp": 1,
+    "batch_discount": 0.5,  # Message Batches are billed at half price
+    "chars_per_token": 3.5,  # Claude's tokenizer splits English prose finer than OpenAI's
+    # Images over 1568px on the long side or ~1.15 megapixels are scaled down; billed at (w*h)/750 tokens.
+    "image_profile": {"max_long_side": 1568, "max_pixels": 1_150_000, "tokens": "anthropic_pixels"},
+    "max_cache_breakpoints": 4,  # cache_control markers allowed per request
 }
 ANTHROPIC_LLMS = {
     # Opus 4.8 and Sonnet 5 reject non-default temperature/top_p/top_k.
@@ -109,8 +134,11 @@ ANTHROPIC_LLMS = {
         "input_cost_per_M": 5.00,
         "cache_write_cost_per_M": 6.25,
         "cache_read_cost_per_M": 0.50,
+        "cache_min_tokens": 4096,  # shorter prefixes are silently not cached
         "output_cost_per_M": 25.00,
         "supports_temperature": False,
+        "rpm": 50,  # tier 1 defaults
+        "tpm": 30000,
     },
     "claude-sonnet-5": {
         "input_limit": 1000000,
@@ -118,8 +146,11 @@ ANTHROPIC_LLMS = {
         "input_cost_per_M": 3.00,  # intro pricing 2.00 through 2026-08-31
         "cache_write_cost_per_M": 3.75,
         "cache_read_cost_per_M": 0.30,
+        "cache_min_tokens": 1024,
         "output_cost_per_M": 15.00,  # intro pricing 10.00 through 2026-08-31
         "supports_temperature": False,
+        "rpm": 50,
+        "tpm": 30000,
     },
     "claude-haiku-4-5": {
         "input_limit": 200000,
@@ -127,7 +158,10 @@ ANTHROPIC_LLMS = {
         "input_cost_per_M": 1.00,
         "cache_write_cost_per_M": 1.25,
         "cache_read_cost_per_M": 0.10,
+        "cache_min_tokens": 4096,
         "output_cost_per_M": 5.00,
+        "rpm": 50,
+        "tpm": 50000,
     },
 }
 
@@ -137,19 +171,36 @@ GoogleLLMs = Literal[
 ]
 GOOGLE_LLM_INFO = {
     "max_temp": 2,
+    "chars_per_token": 4.0,
+    # Billed 258 tokens per 768px tile (a single tile if both sides are 384px or less).
+    "image_profile": {"max_long_side": 3072, "tokens": "gemini_tiles"},
+    # Explicit context caches live this long unless deleted; storage is billed per token-hour.
+    "cache_ttl_seconds": 3600,
 }
 GOOGLE_LLMS = {
     "gemini-3.1-pro-preview": {
         "input_limit": 1048576,
         "output_limit": 65536,
         "input_cost_per_M": 2.00,  # up to 200k tokens, 4.00 after that
+        "cache_write_cost_per_M": 2.00,  # creating an explicit cache bills its tokens as input
+        "cache_read_cost_per_M": 0.20,
+        "cache_storage_cost_per_M_per_hour": 4.50,
+        "cache_min_tokens": 4096,  # smaller explicit caches are rejected
         "output_cost_per_M": 12.00,  # up to 200k tokens, 18.00 after that
+        "rpm": 25,  # tier 1 defaults
+        "tpm": 1000000,
     },
     "gemini-3.5-flash": {
         "input_limit": 1048576,
         "output_limit": 65536,
         "input_cost_per_M": 1.50,
+        "cache_write_cost_per_M": 1.50,
+        "cache_read_cost_per_M": 0.15,
+        "cache_storage_cost_per_M_per_hour": 1.00,
+        "cache_min_tokens": 1024,
         "output_cost_per_M": 9.00,
+        "rpm": 1000,
+        "tpm": 1000000,
     },
 }
 
@@ -159,9 +210,11 @@ DeepseekLLMs = Literal[
 ]
 DEEPSEEK_LLM_INFO = {
     "max_temp": 2,
+    "chars_per_token": 3.5,
 }
 DEEPSEEK_LLMS = {
     # deepseek-chat / deepseek-reasoner names are deprecated as of 2026-07-24
+    # DeepSeek publishes no fixed rpm/tpm quotas, so these models aren't rate limited locally.
     "deepseek-v4-pro": {
         "input_limit": 1000000,
         "output_limit": 384000,
@@ -184,6 +237,9 @@ MistralLLMs = Literal[
 ]
 MISTRAL_LLM_INFO = {
     "max_temp": 1,
+    "chars_per_token": 3.5,
+    # Vision encoder reads 16px patches; larger images are scaled to 1540px on the long side.
+    "image_profile": {"max_long_side": 1540, "tokens": "mistral_patches"},
 }
 MISTRAL_LLMS = {
     "mistral-large-latest": {  # currently Mistral Large 3
@@ -191,12 +247,16 @@ MISTRAL_LLMS = {
         "output_limit": 32000,
         "input_cost_per_M": 0.50,
         "output_cost_per_M": 1.50,
+        "rpm": 60,  # workspace defaults
+        "tpm": 500000,
     },
     "mistral-medium-latest": {  # currently Mistral Medium 3
         "input_limit": 128000,
         "output_limit": 32000,
         "input_cost_per_M": 0.40,
         "output_cost_per_M": 2.00,
+        "rpm": 60,
+        "tpm": 500000,
     },
 }
 
@@ -223,6 +283,7 @@ GOOGLE_IMAGE_GENERATORS = {
         "resolutions": ["512px", "1K", "2K", "4K"],
         "default_resolution": "2K",
         "supports_reference_images": True,
+        "max_images_per_request": 1,  # The Interactions API returns one image per call
     },
     # The Lite variant only supports 1K.
     "gemini-3.1-flash-lite-image": {
@@ -230,6 +291,7 @@ GOOGLE_IMAGE_GENERATORS = {
         "resolutions": ["1K"],
         "default_resolution": "1K",
         "supports_reference_images": True,
+        "max_images_per_request": 1,
     },
 }
 
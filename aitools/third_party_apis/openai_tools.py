@@ -1,10 +1,15 @@
+import json
 import os
-from typing import BinaryIO, List, Literal, Union
+from typing import TYPE_CHECKING, BinaryIO, List, Literal, Union
 
-from openai import OpenAI
-
-from aitools.media_tools.utils import encode_image
+from aitools.media_tools.image_preprocessing import prepare_image
+from aitools.third_party_apis.http_clients import build_http_client, get_async_client, get_client
 from aitools.third_party_apis.models import ALL_LLMS, OpenaiImageGenerators, OpenaiImageSizes, OpenaiLLMs, OpenaiSpeechRec, OPENAI_IMAGE_GENERATORS
+from aitools.third_party_apis.rate_limits import arate_limited, rate_limited, reconcile_rate_limit
+from aitools.third_party_apis.retries import awith_retries, with_retries
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 
 OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY')
 OPENAI_ORGANIZATION=os.environ.get('OPENAI_ORGANIZATION')
@@ -13,21 +18,33 @@ DEFAULT_OPENAI_SPEECH_REC = "whisper-1"
 
 DEFAULT_OPENAI_LLM_INFO = ALL_LLMS[DEFAULT_OPENAI_LLM]
 
-_client = None
+def _build_client(async_client: bool = False):
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+    if not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY must be set as an environment variable.")
+    if async_client:
+        return AsyncOpenAI(api_key=OPENAI_API_KEY, organization=OPENAI_ORGANIZATION or None, max_retries=0,
+                           http_client=build_http_client(DefaultAsyncHttpxClient))
+    return OpenAI(api_key=OPENAI_API_KEY, organization=OPENAI_ORGANIZATION or None, max_retries=0,
+                  http_client=build_http_client(DefaultHttpxClient))
+
+
+def _get_client() -> "OpenAI":
+    return get_client("openai", _build_client)
 
-def _get_client() -> OpenAI:
-    global _client
-    if _client is None:
-        if not OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY must be set as an environment variable.")
-        _client = OpenAI(api_key=OPENAI_API_KEY, organization=OPENAI_ORGANIZATION or None)
-    return _client
+
+def _get_async_client() -> "AsyncOpenAI":
+    # Async clients hold a connection pool bound to the event loop that created
+    # them, so the factory keeps one per loop.
+    return get_async_client("openai", lambda: _build_client(async_client=True))
 
 
 def format_openai_messages(
     messages: List[Union[str,dict]] = [],
     role:Literal["system","user","assistant"] = "user",
     cache_messages=False,
+    model:str = None,
 ):
     '''
     Format messages for submission to an OpenAI model.
@@ -39,6 +56,7 @@ def format_openai_messages(
         - image (str): The path to an image.
     - role (str): The role (system, user, assistant) of the message sender.
     - cache_messages (bool): Not used here but included for consistency with Anthropic format function.
+    - model (str): The model the messages are for. Images are downscaled to fit its image profile.
     '''
 
     content = []
@@ -57,11 +75,11 @@ def format_openai_messages(
                 "text": f"```html\n{message['code']}\n```"
             })
         elif 'image' in message:
-            base64_image = encode_image(message['image'])
+            media_type, base64_image = prepare_image(message['image'], model)
             content.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}"
+                    "url": f"data:{media_type};base64,{base64_image}"
                 }
             })
     
@@ -84,6 +102,88 @@ def format_openai_messages(
     return formatted_messages
 
 
+def _build_openai_request(
+    messages: List[Union[str,dict]],
+    model:OpenaiLLMs,
+    system_prompt:Union[str,List[Union[str,dict]]],
+    max_tokens,
+    temperature,
+    json_mode,
+) -> dict:
+    """Build the chat.completions.create kwargs shared by the sync and async prompt functions."""
+
+    formatted_system_prompt = format_openai_messages(system_prompt, role="system", model=model)
+    formatted_messages = format_openai_messages(messages, model=model)
+    system_and_messages = formatted_system_prompt + formatted_messages
+
+    request_kwargs = {}
+    if temperature is not None and ALL_LLMS[model].get("supports_temperature", True):
+        request_kwargs["temperature"] = temperature
+    if json_mode:
+        request_kwargs["response_format"] = {"type": "json_object"}
+
+    return dict(
+        model=model,
+        messages=system_and_messages,
+        max_completion_tokens=max_tokens,  # GPT-5.x models reject the old max_tokens param
+        **request_kwargs,
+    )
+
+
+def _parse_openai_usage(usage) -> dict:
+    cached_tokens = usage.prompt_tokens_details.cached_tokens if usage.prompt_tokens_details else 0
+    return {
+        "input_tokens": usage.prompt_tokens - (cached_tokens or 0),
+        "cache_read_tokens": cached_tokens or 0,
+        "output_tokens": usage.completion_tokens,
+    }
+
+
+def _parse_openai_response(chat_response) -> dict:
+    return {
+        "text": chat_response.choices[0].message.content,
+        **_parse_openai_usage(chat_response.usage),
+    }
+
+
+def _chunk_delta(chunk):
+    if chunk.choices:
+        return chunk.choices[0].delta.content
+    return None
+
+
+def _openai_stream_events(chunks, parse_usage=_parse_openai_usage):
+    """
+    Turn a stream of chat.completions chunks into text deltas followed by a final
+    response dict with the same shape as `prompt_openai`'s. Also used by the
+    OpenAI-compatible DeepSeek and Mistral adapters, with their own usage parsers.
+    """
+    collected = []
+    usage = None
+    for chunk in chunks:
+        delta = _chunk_delta(chunk)
+        if delta:
+            collected.append(delta)
+            yield delta
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+    yield {"text": "".join(collected), **(parse_usage(usage) if usage else {})}
+
+
+async def _aopenai_stream_events(chunks, parse_usage=_parse_openai_usage):
+    """Async version of `_openai_stream_events`."""
+    collected = []
+    usage = None
+    async for chunk in chunks:
+        delta = _chunk_delta(chunk)
+        if delta:
+            collected.append(delta)
+            yield delta
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+    yield {"text": "".join(collected), **(parse_usage(usage) if usage else {})}
+
+
 def prompt_openai(
     messages: List[Union[str,dict]],
     model:OpenaiLLMs = DEFAULT_OPENAI_LLM,
@@ -111,31 +211,186 @@ def prompt_openai(
     - str: The response from the LLM.
     """
 
-    formatted_system_prompt = format_openai_messages(system_prompt, role="system")
-    formatted_messages = format_openai_messages(messages)
-    system_and_messages = formatted_system_prompt + formatted_messages
+    request = _build_openai_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chat_response, charged), retry_stats = with_retries(
+        rate_limited(lambda: _get_client().chat.completions.create(**request), model, messages, system_prompt, max_tokens),
+        "openai",
+    )
+    response = _parse_openai_response(chat_response)
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
 
-    request_kwargs = {}
-    if temperature is not None and ALL_LLMS[model].get("supports_temperature", True):
-        request_kwargs["temperature"] = temperature
-    if json_mode:
-        request_kwargs["response_format"] = {"type": "json_object"}
+    return response
 
-    chat_response = _get_client().chat.completions.create(
-        model=model,
-        messages=system_and_messages,
-        max_completion_tokens=max_tokens,  # GPT-5.x models reject the old max_tokens param
-        **request_kwargs,
+
+async def aprompt_openai(
+    messages: List[Union[str,dict]],
+    model:OpenaiLLMs = DEFAULT_OPENAI_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=DEFAULT_OPENAI_LLM_INFO['output_limit'],
+    temperature=None,
+    json_mode=False,
+):
+    """
+    Async version of `prompt_openai`, built on the SDK's AsyncOpenAI client.
+    """
+
+    request = _build_openai_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chat_response, charged), retry_stats = await awith_retries(
+        arate_limited(lambda: _get_async_client().chat.completions.create(**request), model, messages, system_prompt, max_tokens),
+        "openai",
+    )
+    response = _parse_openai_response(chat_response)
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
+
+    return response
+
+
+def submit_openai_batch(
+    requests: List[dict],
+):
+    """
+    Submit chat requests to the OpenAI Batch API.
+
+    Args:
+    - requests (List[dict]): Requests to submit. Each has a "custom_id" plus the keyword
+        arguments of `prompt_openai` (messages, model, system_prompt, max_tokens,
+        temperature, json_mode).
+
+    Returns:
+    - str: The OpenAI batch ID.
+    """
+
+    lines = []
+    for request in requests:
+        request = dict(request)
+        custom_id = request.pop("custom_id")
+        lines.append(json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": _build_openai_request(**request),
+        }))
+
+    batch_file = _get_client().files.create(
+        file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch",
+    )
+    batch = _get_client().batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
     )
 
+    return batch.id
+
+
+def poll_openai_batch(
+    batch_id: str,
+) -> dict:
+    """
+    Check the progress of an OpenAI batch.
+
+    Returns:
+    - dict: "ended" (bool), the provider's "status", and request "counts".
+    """
+
+    batch = _get_client().batches.retrieve(batch_id)
+
     return {
-        "text": chat_response.choices[0].message.content,
-        "input_tokens": chat_response.usage.prompt_tokens - chat_response.usage.prompt_tokens_details.cached_tokens,
-        "cache_read_tokens": chat_response.usage.prompt_tokens_details.cached_tokens,
-        "output_tokens": chat_response.usage.completion_tokens,
+        "ended": batch.status in ["completed", "failed", "expired", "cancelled"],
+        "status": batch.status,
+        "counts": {
+            "completed": batch.request_counts.completed,
+            "failed": batch.request_counts.failed,
+            "total": batch.request_counts.total,
+        },
     }
 
 
+def collect_openai_batch(
+    batch_id: str,
+):
+    """
+    Stream the results of a finished OpenAI batch.
+
+    Yields:
+    - tuple: (custom_id, response) where response has the same shape as `prompt_openai`'s,
+        or {"error": str} for requests that failed.
+    """
+
+    from openai.types.chat import ChatCompletion
+
+    batch = _get_client().batches.retrieve(batch_id)
+
+    for file_id in [batch.output_file_id, batch.error_file_id]:
+        if not file_id:
+            continue
+        for line in _get_client().files.content(file_id).iter_lines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if result.get("error") or response.get("status_code") != 200:
+                error = result.get("error") or response.get("body", {}).get("error")
+                yield result["custom_id"], {"error": str(error)}
+            else:
+                chat_response = ChatCompletion.model_validate(response["body"])
+                yield result["custom_id"], _parse_openai_response(chat_response)
+
+
+def iter_openai_stream(
+    messages: List[Union[str,dict]],
+    model:OpenaiLLMs = DEFAULT_OPENAI_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=DEFAULT_OPENAI_LLM_INFO['output_limit'],
+    temperature=None,
+    json_mode=False,
+):
+    """
+    Stream a response from an OpenAI LLM.
+
+    Takes the same arguments as `prompt_openai`. Yields each text delta (str) as it
+    arrives, then a final dict with the full text and token usage.
+    """
+
+    request = _build_openai_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chunks, charged), retry_stats = with_retries(
+        rate_limited(lambda: _get_client().chat.completions.create(**request, stream=True, stream_options={"include_usage": True}), model, messages, system_prompt, max_tokens),
+        "openai",
+    )
+    for event in _openai_stream_events(chunks):
+        if isinstance(event, dict):
+            reconcile_rate_limit(model, charged, event)
+            event.update(retry_stats)
+        yield event
+
+
+async def aiter_openai_stream(
+    messages: List[Union[str,dict]],
+    model:OpenaiLLMs = DEFAULT_OPENAI_LLM,
+    system_prompt:Union[str,List[Union[str,dict]]]="You are a helpful assistant.",
+    max_tokens=DEFAULT_OPENAI_LLM_INFO['output_limit'],
+    temperature=None,
+    json_mode=False,
+):
+    """
+    Async version of `iter_openai_stream`.
+    """
+
+    request = _build_openai_request(messages, model, system_prompt, max_tokens, temperature, json_mode)
+    (chunks, charged), retry_stats = await awith_retries(
+        arate_limited(lambda: _get_async_client().chat.completions.create(**request, stream=True, stream_options={"include_usage": True}), model, messages, system_prompt, max_tokens),
+        "openai",
+    )
+    async for event in _aopenai_stream_events(chunks):
+        if isinstance(event, dict):
+            reconcile_rate_limit(model, charged, event)
+            event.update(retry_stats)
+        yield event
+
+
 def stream_openai(
     formatted_messages: List[dict],
     model:OpenaiLLMs = DEFAULT_OPENAI_LLM,
@@ -155,29 +410,29 @@ def stream_openai(
     if temperature is not None and ALL_LLMS[model].get("supports_temperature", True):
         request_kwargs["temperature"] = temperature
 
-    chat_response = _get_client().chat.completions.create(
-        model=model,
-        messages=formatted_system_prompt+formatted_messages,
-        stream=True,
-        stream_options={'include_usage': True},
-        max_tokens=max_tokens,
-        **request_kwargs,
+    def _create():
+        return _get_client().chat.completions.create(
+            model=model,
+            messages=formatted_system_prompt+formatted_messages,
+            stream=True,
+            stream_options={'include_usage': True},
+            max_tokens=max_tokens,
+            **request_kwargs,
+        )
+
+    (chat_response, charged), retry_stats = with_retries(
+        rate_limited(_create, model, formatted_messages, formatted_system_prompt, max_tokens, formatted=True),
+        "openai",
     )
 
-    collected_messages = []
-    for chunk in chat_response:
-        if chunk.choices:
-            chunk_message = chunk.choices[0].delta.content
-            if chunk_message is not None:
-                collected_messages.append(chunk_message)
-                print(chunk.choices[0].delta.content, end='')
-
-    response = {
-        'text': ''.join(collected_messages),
-        'input_tokens': chunk.usage.prompt_tokens,
-        'output_tokens': chunk.usage.completion_tokens,
-    }
-    
+    for event in _openai_stream_events(chat_response):
+        if isinstance(event, str):
+            print(event, end='')
+        else:
+            response = event
+    reconcile_rate_limit(model, charged, response)
+    response.update(retry_stats)
+
     return response
 
 
@@ -208,23 +463,31 @@ def generate_image_via_openai(
         try:
             for p in reference_images:
                 files.append(open(p, "rb"))
-            return _get_client().images.edit(
-                model=model,
-                image=files,
-                prompt=prompt,
-                n=num_variations,
-                size=size,
-            )
+
+            def _edit():
+                # Rewind in case a failed attempt already read the files.
+                for f in files:
+                    f.seek(0)
+                return _get_client().images.edit(
+                    model=model,
+                    image=files,
+                    prompt=prompt,
+                    n=num_variations,
+                    size=size,
+                )
+
+            response, _ = with_retries(_edit, "openai")
+            return response
         finally:
             for f in files:
                 f.close()
 
-    response = _get_client().images.generate(
+    response, _ = with_retries(lambda: _get_client().images.generate(
         model=model,
         prompt=prompt,
         n=num_variations,
         size=size,
-    )
+    ), "openai")
 
     return response
 
@@ -232,19 +495,29 @@ def generate_image_via_openai(
 def transcribe_via_openai(
     audio_file: BinaryIO,
     model:OpenaiSpeechRec = DEFAULT_OPENAI_SPEECH_REC,
+    language: str = None,
 ):
     """
     Transcribe an audio file using an OpenAI speech recognition model.
 
     Args:
-    - audio_file (BinaryIO): The MP3 audio file to transcribe.
+    - audio_file (BinaryIO): The audio file to transcribe.
     - model (str): The OpenAI speech recognition model to use.
+    - language (str): The audio's language as an ISO-639-1 code. Detected if not given.
     """
 
-    transcription_response = _get_client().audio.transcriptions.create(
-        model=model, 
-        file=audio_file,
-        response_format='verbose_json',
-    )
+    kwargs = {"language": language} if language else {}
+
+    def _transcribe():
+        # Rewind in case a failed attempt already read the file.
+        audio_file.seek(0)
+        return _get_client().audio.transcriptions.create(
+            model=model,
+            file=audio_file,
+            response_format='verbose_json',
+            **kwargs,
+        )
+
+    transcription_response, _ = with_retries(_transcribe, "openai")
 
     return transcription_response
\ No newline at end of file
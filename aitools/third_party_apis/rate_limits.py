@@ -0,0 +1,250 @@
+"""Client-side rate limiting driven by the rpm/tpm quotas in the model registry.
+
+Every provider adapter acquires from the model's limiter before each attempt
+at a request (see `rate_limited`). Tokens are charged up front (estimated input
+plus `max_tokens`) and reconciled against the usage the provider reports once
+the response arrives, or refunded if the attempt fails, so callers can run
+close to their quota without tripping 429s.
+
+Limiters are shared per model and are safe to use from multiple threads and
+from asyncio code at the same time.
+"""
+
+import asyncio
+import threading
+import time
+from typing import List, Union
+
+from aitools.media_tools.metrics import observe
+from aitools.third_party_apis.models import ALL_LLMS
+from aitools.third_party_apis.token_counting import estimate_input_tokens, estimate_text_tokens
+
+# Rough chars-per-token ratio and flat per-image charge used for estimates when no model is given.
+CHARS_PER_TOKEN = 4
+TOKENS_PER_IMAGE = 1000
+
+
+class TokenBucket:
+    '''
+    A bucket holding up to `capacity` units that refills continuously over a minute.
+    The level may go negative when a reconciliation charges more than was reserved.
+    '''
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.refill_per_second = per_minute / 60
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        '''Seconds until `amount` units are available. Assumes refill() was just called.'''
+        if self.level >= amount:
+            return 0
+        return (amount - self.level) / self.refill_per_second
+
+
+class RateLimiter:
+    '''
+    Request- and token-per-minute limiter for a single model.
+    Either limit may be None, in which case it isn't enforced.
+    '''
+
+    def __init__(self, rpm: int = None, tpm: int = None):
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+
+    def _try_reserve(self, tokens: int) -> float:
+        '''Reserve a request and `tokens` tokens if both are available; otherwise return the wait in seconds.'''
+        with self._lock:
+            now = time.monotonic()
+            wait = 0
+            if self._requests:
+                self._requests.refill(now)
+                wait = max(wait, self._requests.wait_time(1))
+            if self._tokens:
+                self._tokens.refill(now)
+                wait = max(wait, self._tokens.wait_time(tokens))
+            if wait:
+                return wait
+            if self._requests:
+                self._requests.level -= 1
+            if self._tokens:
+                self._tokens.level -= tokens
+            return 0
+
+    def _clamp(self, tokens: int) -> int:
+        # A request larger than the whole bucket could never be admitted, so charge at most a full bucket.
+        if self._tokens:
+            return min(tokens, self._tokens.capacity)
+        return tokens
+
+    def acquire(self, tokens: int = 0) -> int:
+        '''
+        Block until a request charging `tokens` can be sent.
+
+        Returns:
+        - int: The number of tokens actually charged, to pass to reconcile().
+        '''
+        tokens = self._clamp(tokens)
+        while wait := self._try_reserve(tokens):
+            time.sleep(wait)
+        return tokens
+
+    async def aacquire(self, tokens: int = 0) -> int:
+        '''Async version of acquire() that sleeps without blocking the event loop.'''
+        tokens = self._clamp(tokens)
+        while wait := self._try_reserve(tokens):
+            await asyncio.sleep(wait)
+        return tokens
+
+    def reconcile(self, charged: int, actual: int):
+        '''Refund (or further charge) the difference between the up-front charge and actual usage.'''
+        if not self._tokens:
+            return
+        with self._lock:
+            self._tokens.refill(time.monotonic())
+            self._tokens.level = min(self._tokens.capacity, self._tokens.level + charged - actual)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    '''Return the shared limiter for a model, creating it from the registry's rpm/tpm on first use.'''
+    with _limiters_lock:
+        if model not in _limiters:
+            model_info = ALL_LLMS[model]
+            _limiters[model] = RateLimiter(rpm=model_info.get('rpm'), tpm=model_info.get('tpm'))
+        return _limiters[model]
+
+
+def set_rate_limits(model: str, rpm: int = None, tpm: int = None):
+    '''Override a model's rpm/tpm, e.g. to match a higher account tier. None disables that limit.'''
+    with _limiters_lock:
+        _limiters[model] = RateLimiter(rpm=rpm, tpm=tpm)
+
+
+def estimate_request_tokens(
+    messages: List[Union[str,dict]],
+    system_prompt: Union[str,List[Union[str,dict]]] = "",
+    max_tokens: int = 0,
+    model: str = None,
+) -> int:
+    '''
+    Estimate the tokens a request will consume: its input tokens plus the full `max_tokens`
+    output allowance. With a model, input is estimated by token_counting.estimate_input_tokens;
+    without one, text is counted at CHARS_PER_TOKEN and images at a flat TOKENS_PER_IMAGE.
+    '''
+    if model is not None:
+        return estimate_input_tokens(messages, model, system_prompt) + max_tokens
+
+    if isinstance(system_prompt, str):
+        system_prompt = [system_prompt]
+
+    chars = 0
+    images = 0
+    for message in list(system_prompt) + list(messages):
+        if isinstance(message, str):
+            chars += len(message)
+        elif 'text' in message:
+            chars += len(message['text'])
+        elif 'code' in message:
+            chars += len(message['code'])
+        elif 'image' in message:
+            images += 1
+
+    return chars // CHARS_PER_TOKEN + images * TOKENS_PER_IMAGE + max_tokens
+
+
+def estimate_formatted_tokens(formatted_messages: List[dict], formatted_system_prompt: List[dict], max_tokens: int, model: str) -> int:
+    '''
+    Estimate the tokens of a request whose messages are already formatted for the provider, as
+    chat_with_llm sends them. Text parts are counted for the model and images at a flat
+    TOKENS_PER_IMAGE, plus the full `max_tokens` output allowance.
+    '''
+    tokens = max_tokens
+    parts = list(formatted_system_prompt) + list(formatted_messages)
+    while parts:
+        part = parts.pop()
+        if isinstance(part, str):
+            tokens += estimate_text_tokens(part, model)
+        elif part.get('type') in ('image', 'image_url'):
+            tokens += TOKENS_PER_IMAGE
+        elif 'text' in part:
+            tokens += estimate_text_tokens(part['text'], model)
+        elif 'content' in part:
+            parts.extend([part['content']] if isinstance(part['content'], str) else part['content'])
+    return tokens
+
+
+def _usage_tokens(response: dict) -> int:
+    return sum(value for key, value in response.items() if key.endswith('_tokens'))
+
+
+def _acquire(model, tokens: int) -> int:
+    # The time spent waiting is observed in the rate_limit_wait_seconds histogram (see metrics.py).
+    started = time.perf_counter()
+    charged = get_rate_limiter(model).acquire(tokens)
+    observe("rate_limit_wait_seconds", time.perf_counter() - started, "llm", ALL_LLMS[model]['provider'], model)
+    return charged
+
+
+async def _aacquire(model, tokens: int) -> int:
+    started = time.perf_counter()
+    charged = await get_rate_limiter(model).aacquire(tokens)
+    observe("rate_limit_wait_seconds", time.perf_counter() - started, "llm", ALL_LLMS[model]['provider'], model)
+    return charged
+
+
+def _request_estimate(model, messages, system_prompt, max_tokens, formatted: bool) -> int:
+    if formatted:
+        return estimate_formatted_tokens(messages, system_prompt, max_tokens, model)
+    return estimate_request_tokens(messages, system_prompt, max_tokens, model)
+
+
+def rate_limited(call, model, messages, system_prompt, max_tokens, formatted: bool = False):
+    '''
+    Wrap a provider call for with_retries() so that every attempt acquires its own capacity
+    from the model's limiter. A failed attempt is refunded, since the provider never ran it.
+    Set `formatted` when the messages and system prompt are already formatted for the provider.
+
+    Returns:
+    - callable: Makes the call and returns (result, tokens charged); pass the charge to reconcile_rate_limit().
+    '''
+    tokens = _request_estimate(model, messages, system_prompt, max_tokens, formatted)
+
+    def attempt():
+        charged = _acquire(model, tokens)
+        try:
+            return call(), charged
+        except BaseException:
+            get_rate_limiter(model).reconcile(charged, 0)
+            raise
+
+    return attempt
+
+
+def arate_limited(call, model, messages, system_prompt, max_tokens, formatted: bool = False):
+    '''Async version of rate_limited(), for awith_retries(). `call()` must return an awaitable.'''
+    tokens = _request_estimate(model, messages, system_prompt, max_tokens, formatted)
+
+    async def attempt():
+        charged = await _aacquire(model, tokens)
+        try:
+            return await call(), charged
+        except BaseException:
+            get_rate_limiter(model).reconcile(charged, 0)
+            raise
+
+    return attempt
+
+
+def reconcile_rate_limit(model, charged: int, response: dict):
+    '''Settle an up-front charge against the token usage reported in a response dict.'''
+    get_rate_limiter(model).reconcile(charged, _usage_tokens(response))
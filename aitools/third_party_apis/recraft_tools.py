@@ -1,21 +1,29 @@
 import os
-import requests
-
-from openai import OpenAI
+from typing import TYPE_CHECKING
 
+from aitools.third_party_apis.http_clients import build_http_client, get_client
 from aitools.third_party_apis.models import RecraftImageGenerators, RecraftImageSizes, RECRAFT_IMAGE_GENERATORS
+from aitools.third_party_apis.retries import with_retries
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 RECRAFT_API_KEY=os.environ.get('RECRAFT_API_KEY')
+RECRAFT_BASE_URL = "https://external.api.recraft.ai/v1"
+
+def _build_client() -> "OpenAI":
+    from openai import DefaultHttpxClient, OpenAI
+
+    if not RECRAFT_API_KEY:
+        raise ValueError("RECRAFT_API_KEY must be set as an environment variable.")
+    return OpenAI(base_url=RECRAFT_BASE_URL, api_key=RECRAFT_API_KEY, max_retries=0,
+                  http_client=build_http_client(DefaultHttpxClient))
 
-if not RECRAFT_API_KEY:
-    raise Exception("RECRAFT_API_KEY must be set as environment variable.")
 
-CLIENT = OpenAI(
-  base_url='https://external.api.recraft.ai/v1',
-  api_key=RECRAFT_API_KEY,
-)
+def _get_client() -> "OpenAI":
+    return get_client("recraft", _build_client)
 
-url = "https://external.api.recraft.ai/v1/images/generations"
+url = f"{RECRAFT_BASE_URL}/images/generations"
 headers = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {RECRAFT_API_KEY}"
@@ -48,7 +56,7 @@ def generate_image_via_recraft(
     # response = requests.post(url, headers=headers, json=payload)
 
 
-    response = CLIENT.images.generate(
+    response, _ = with_retries(lambda: _get_client().images.generate(
         prompt=prompt,
         n=num_variations,
         size=size,
@@ -56,6 +64,6 @@ def generate_image_via_recraft(
         # extra_body={
         #     'substyle': substyle
         # }
-    )
+    ), "recraft")
 
     return response
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""Retries with exponential backoff for provider API calls.
+
+Every adapter wraps its request in `with_retries` (or `awith_retries`), which
+retries rate-limit, overload, server and connection errors with full-jitter
+exponential backoff. Waits honour `Retry-After` when a response carries it, and
+on a 429 the providers' rate-limit reset headers. Client errors such as bad requests
+or authentication failures are raised immediately.
+
+The SDK clients are built with their own retries disabled so that a request is
+never retried by both layers.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+import re
+import time
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+# Never wait longer than this, even if a server asks us to.
+MAX_RETRY_AFTER = 300.0
+
+# HTTP status codes worth retrying, per provider. 529 is Anthropic's "overloaded".
+PROVIDER_RETRYABLE_STATUS_CODES = {
+    "openai": {408, 409, 429, 500, 502, 503, 504},
+    "anthropic": {408, 409, 429, 500, 502, 503, 504, 529},
+    "google": {408, 429, 500, 502, 503, 504},
+    "deepseek": {429, 500, 502, 503, 504},
+    "mistral": {429, 500, 502, 503, 504},
+    "recraft": {429, 500, 502, 503, 504},
+}
+
+# Exception class names (from any SDK or httpx) that indicate a transient network failure.
+RETRYABLE_ERROR_NAMES = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "ConnectError",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "RemoteProtocolError",
+}
+
+# Rate-limit reset headers. Only read on a 429, when the longest of them is how long to wait.
+RESET_HEADERS = [
+    "x-ratelimit-reset-requests",
+    "x-ratelimit-reset-tokens",
+    "anthropic-ratelimit-requests-reset",
+    "anthropic-ratelimit-tokens-reset",
+    "anthropic-ratelimit-input-tokens-reset",
+    "anthropic-ratelimit-output-tokens-reset",
+]
+
+_settings = {
+    "max_attempts": DEFAULT_MAX_ATTEMPTS,
+    "base_delay": DEFAULT_BASE_DELAY,
+    "max_delay": DEFAULT_MAX_DELAY,
+}
+
+
+def configure_retries(max_attempts: int = None, base_delay: float = None, max_delay: float = None):
+    '''
+    Change the retry settings used by every provider adapter.
+
+    Args:
+    - max_attempts (int): Total attempts per request, including the first. 1 disables retries.
+    - base_delay (float): Backoff ceiling in seconds for the first retry; doubles every retry.
+    - max_delay (float): Upper bound in seconds on the backoff ceiling.
+    '''
+    if max_attempts is not None and max_attempts < 1:
+        raise ValueError(f"max_attempts must be at least 1, but you requested {max_attempts}.")
+    for name, value in [("base_delay", base_delay), ("max_delay", max_delay)]:
+        if value is not None and value < 0:
+            raise ValueError(f"{name} can't be negative, but you requested {value}.")
+
+    for name, value in [("max_attempts", max_attempts), ("base_delay", base_delay), ("max_delay", max_delay)]:
+        if value is not None:
+            _settings[name] = value
+
+
+def _status_code(error: Exception):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        # google-api-core and google-genai errors carry the HTTP status as `code`.
+        code = getattr(error, "code", None)
+        if isinstance(code, int):
+            status = code
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def is_retryable(error: Exception, provider: str) -> bool:
+    '''Whether an error from a provider is transient and worth retrying.'''
+    status = _status_code(error)
+    if status is not None:
+        return int(status) in PROVIDER_RETRYABLE_STATUS_CODES.get(provider, set())
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def _parse_duration(value: str):
+    '''Parse "20ms", "1.5s" or "6m0s" style durations (used by OpenAI reset headers) into seconds.'''
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        return None
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * units[u] for n, u in parts)
+
+
+def _parse_timestamp(value: str):
+    '''Parse an RFC 3339 or HTTP-date timestamp into seconds from now.'''
+    try:
+        when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return (when - datetime.now(timezone.utc)).total_seconds()
+
+
+def _header_seconds(value: str):
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = _parse_duration(value)
+        if seconds is None:
+            seconds = _parse_timestamp(value)
+    return None if seconds is None else max(0.0, seconds)
+
+
+def retry_after(error: Exception):
+    '''
+    Seconds the server asked us to wait before retrying, or None if it didn't say.
+
+    Retry-After (and retry-after-ms) is honoured for any status. The rate-limit reset headers
+    are sent on every response, so they only say when to retry on a 429, and then the latest
+    reset wins: a token-limited request isn't served when the request budget refills.
+    '''
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    if headers.get("retry-after-ms"):
+        try:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        except ValueError:
+            pass
+
+    if headers.get("retry-after"):
+        seconds = _header_seconds(headers["retry-after"])
+        if seconds is not None:
+            return seconds
+
+    if _status_code(error) != 429:
+        return None
+    resets = [_header_seconds(headers[name]) for name in RESET_HEADERS if headers.get(name)]
+    resets = [seconds for seconds in resets if seconds is not None]
+    return max(resets) if resets else None
+
+
+def _backoff(error: Exception, attempt: int) -> float:
+    '''Full-jitter exponential backoff, unless the server told us how long to wait.'''
+    requested = retry_after(error)
+    if requested is not None:
+        return min(requested, MAX_RETRY_AFTER)
+    ceiling = min(_settings["max_delay"], _settings["base_delay"] * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def with_retries(call, provider: str):
+    '''
+    Call `call()` and retry transient failures.
+
+    Args:
+    - call (Callable): A zero-argument function making the request.
+    - provider (str): The provider, which decides which errors are retryable.
+
+    Returns:
+    - tuple: The call's result, and a dict with the number of "retries" and the total
+        "retry_wait_seconds" spent backing off.
+    '''
+    stats = {"retries": 0, "retry_wait_seconds": 0.0}
+    for attempt in range(_settings["max_attempts"]):
+        try:
+            return call(), stats
+        except Exception as e:
+            if attempt + 1 >= _settings["max_attempts"] or not is_retryable(e, provider):
+                raise
+            wait = _backoff(e, attempt)
+            print(f"{provider} request failed ({type(e).__name__}); retrying in {wait:.1f}s...")
+            time.sleep(wait)
+            stats["retries"] += 1
+            stats["retry_wait_seconds"] += wait
+
+
+async def awith_retries(call, provider: str):
+    '''Async version of with_retries(). `call()` must return an awaitable.'''
+    stats = {"retries": 0, "retry_wait_seconds": 0.0}
+    for attempt in range(_settings["max_attempts"]):
+        try:
+            return await call(), stats
+        except Exception as e:
+            if attempt + 1 >= _settings["max_attempts"] or not is_retryable(e, provider):
+                raise
+            wait = _backoff(e, attempt)
+            print(f"{provider} request failed ({type(e).__name__}); retrying in {wait:.1f}s...")
+            await asyncio.sleep(wait)
+            stats["retries"] += 1
+            stats["retry_wait_seconds"] += wait
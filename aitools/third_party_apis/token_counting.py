@@ -0,0 +1,220 @@
+"""
+Local input-token estimates, and pre-flight checks against a model's input limit.
+
+`estimate_input_tokens` counts a prompt's tokens before it is sent:
+- Text is counted with the model's tiktoken encoding when the registry names one
+  and tiktoken is installed. Otherwise it is estimated from the provider's
+  `chars_per_token` ratio.
+- Images are estimated from their dimensions with each provider's billing formula
+  (see image_preprocessing.py).
+- Anthropic and Gemini also offer count-tokens endpoints. Pass `use_endpoint=True`
+  for an exact count; results are cached, so repeated prompts cost one round trip.
+
+`fit_context_window` uses these estimates to reject, or truncate, prompts that
+exceed a model's `input_limit` before they travel the network.
+"""
+
+from collections import OrderedDict
+import importlib
+import threading
+from typing import List, Union
+
+from aitools.media_tools.image_preprocessing import estimate_image_file_tokens
+from aitools.third_party_apis.models import ALL_LLMS
+
+DEFAULT_CHARS_PER_TOKEN = 4.0
+# Role markers and message framing the providers add around the content.
+REQUEST_OVERHEAD_TOKENS = 10
+TRUNCATION_MARKER = "\n[...truncated to fit the context window]"
+# Remove this much more text than the estimate says is needed, so truncation rarely needs a second pass.
+TRUNCATION_MARGIN = 1.1
+
+# Provider functions that count tokens remotely, imported on first use.
+COUNT_TOKENS_FUNCTIONS = {
+    "anthropic": ("aitools.third_party_apis.anthropic_tools", "count_claude_tokens"),
+    "google": ("aitools.third_party_apis.google_tools", "count_gemini_tokens"),
+}
+ENDPOINT_CACHE_SIZE = 1024
+
+_encodings = {}
+_endpoint_counts = OrderedDict()
+_endpoint_lock = threading.Lock()
+
+
+def _get_encoding(name: str):
+    '''Load a tiktoken encoding once. Returns None if tiktoken or the encoding is unavailable.'''
+    if name not in _encodings:
+        try:
+            import tiktoken
+
+            _encodings[name] = tiktoken.get_encoding(name)
+        except Exception:
+            # Not installed, or the encoding file couldn't be downloaded; fall back to heuristics.
+            _encodings[name] = None
+    return _encodings[name]
+
+
+def estimate_text_tokens(text: str, model: str) -> int:
+    '''Estimate the tokens in a piece of text for a model.'''
+    model_info = ALL_LLMS[model]
+    encoding = _get_encoding(model_info["tokenizer"]) if model_info.get("tokenizer") else None
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return int(len(text) / model_info.get("chars_per_token", DEFAULT_CHARS_PER_TOKEN)) + 1
+
+
+def _as_list(system_prompt) -> list:
+    if not system_prompt:
+        return []
+    if isinstance(system_prompt, (str, dict)):
+        return [system_prompt]
+    return list(system_prompt)
+
+
+def _message_text(message):
+    if isinstance(message, str):
+        return message
+    if 'text' in message:
+        return message['text']
+    if 'code' in message:
+        # The formatters wrap code in a fenced block.
+        return f"```\n{message['code']}\n```"
+    return None
+
+
+def _local_estimate(messages, model, system_prompt) -> int:
+    tokens = REQUEST_OVERHEAD_TOKENS
+    for message in _as_list(system_prompt) + list(messages):
+        text = _message_text(message)
+        if text is not None:
+            tokens += estimate_text_tokens(text, model)
+        elif 'image' in message:
+            tokens += estimate_image_file_tokens(message['image'], model)
+    return tokens
+
+
+def _endpoint_count(messages, model, system_prompt):
+    '''Count tokens with the provider's endpoint, caching results. Returns None if the provider has none.'''
+    from aitools.media_tools.response_cache import make_prompt_key
+
+    location = COUNT_TOKENS_FUNCTIONS.get(ALL_LLMS[model]["provider"])
+    if location is None:
+        return None
+
+    key = make_prompt_key(model, messages, system_prompt, 0)
+    with _endpoint_lock:
+        if key in _endpoint_counts:
+            _endpoint_counts.move_to_end(key)
+            return _endpoint_counts[key]
+
+    module, function = location
+    count = getattr(importlib.import_module(module), function)(messages, model, system_prompt)
+
+    with _endpoint_lock:
+        _endpoint_counts[key] = count
+        while len(_endpoint_counts) > ENDPOINT_CACHE_SIZE:
+            _endpoint_counts.popitem(last=False)
+    return count
+
+
+def estimate_input_tokens(
+    messages: List[Union[str,dict]],
+    model: str,
+    system_prompt: Union[str,List[Union[str,dict]]] = "",
+    use_endpoint: bool = False,
+) -> int:
+    '''
+    Estimate the input tokens a prompt will use, without sending it.
+
+    Args:
+    - messages (List[dict]): Messages as passed to prompt_llm (text, code and image messages).
+    - model (str): The model the prompt is for.
+    - system_prompt (str): The system prompt.
+    - use_endpoint (bool): Ask the provider's count-tokens endpoint for an exact count
+        (Anthropic and Gemini only; other providers fall back to the local estimate).
+        Counts are cached per prompt.
+
+    Returns:
+    - int: The estimated number of input tokens.
+    '''
+    if use_endpoint:
+        count = _endpoint_count(messages, model, system_prompt)
+        if count is not None:
+            return count
+    return _local_estimate(messages, model, system_prompt)
+
+
+def _upper_bound(messages, model, system_prompt) -> int:
+    '''
+    A cheap upper bound on the estimate: byte-level tokenizers never produce more tokens
+    than UTF-8 bytes. Prompts under the input limit by this bound skip counting.
+    '''
+    tokens = REQUEST_OVERHEAD_TOKENS
+    for message in _as_list(system_prompt) + list(messages):
+        text = _message_text(message)
+        if text is not None:
+            tokens += len(text.encode('utf-8'))
+        elif 'image' in message:
+            tokens += estimate_image_file_tokens(message['image'], model)
+    return tokens
+
+
+def fit_context_window(
+    messages: List[Union[str,dict]],
+    model: str,
+    system_prompt: Union[str,List[Union[str,dict]]] = "",
+    truncate: bool = False,
+) -> List[Union[str,dict]]:
+    '''
+    Check that a prompt fits within a model's input limit.
+
+    Args:
+    - messages (List[dict]): Messages as passed to prompt_llm.
+    - model (str): The model the prompt is for.
+    - system_prompt (str): The system prompt. It is never truncated.
+    - truncate (bool): Instead of raising, shorten the longest text messages, keeping their
+        beginnings, until the prompt fits.
+
+    Returns:
+    - list: The messages, truncated if needed. The originals are not modified.
+
+    Raises:
+    - ValueError: If the prompt is too long and `truncate` is False, or can't be truncated enough.
+    '''
+    input_limit = ALL_LLMS[model]["input_limit"]
+    if _upper_bound(messages, model, system_prompt) <= input_limit:
+        return messages
+
+    estimate = estimate_input_tokens(messages, model, system_prompt)
+    if estimate <= input_limit:
+        return messages
+
+    if not truncate:
+        raise ValueError(
+            f"The prompt is about {estimate} tokens, but {model} accepts at most {input_limit} input tokens. "
+            "Shorten it, pick a model with a larger input limit, or pass truncate_input=True."
+        )
+
+    chars_per_token = ALL_LLMS[model].get("chars_per_token", DEFAULT_CHARS_PER_TOKEN)
+    messages = [{"text": m} if isinstance(m, str) else dict(m) for m in messages]
+    while estimate > input_limit:
+        text_messages = [m for m in messages if 'text' in m or 'code' in m]
+        if not text_messages:
+            raise ValueError(
+                f"The prompt's images and system prompt alone are about {estimate} tokens, "
+                f"more than {model}'s input limit of {input_limit}."
+            )
+
+        longest = max(text_messages, key=lambda m: len(m.get('text', m.get('code', ''))))
+        field = 'text' if 'text' in longest else 'code'
+        excess_chars = int((estimate - input_limit) * chars_per_token * TRUNCATION_MARGIN) + len(TRUNCATION_MARKER)
+        keep = len(longest[field]) - excess_chars
+        if keep > 0:
+            longest[field] = longest[field][:keep] + TRUNCATION_MARKER
+        else:
+            messages.remove(longest)
+
+        estimate = estimate_input_tokens(messages, model, system_prompt)
+
+    print(f"Truncated the prompt to about {estimate} tokens to fit {model}'s input limit of {input_limit}.")
+    return messages
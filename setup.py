@@ -18,6 +18,8 @@ setup(
         'anthropic': ['anthropic>=0.34.2'],
         'google': ['google-generativeai>=0.8.3', 'google-genai>=1.0.0'],
         'azure': ['azure-ai-formrecognizer>=3.3.3', 'azure-core>=1.31.0'],
+        'images': ['Pillow>=10.0.0'],
+        'http2': ['h2>=4.0.0'],
         'dev': ['pytest>=8.0.0'],
     },
     author='Brandon T Wilde',
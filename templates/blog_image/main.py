@@ -5,12 +5,10 @@ sys.path.append(str(next(p for p in Path(__file__).resolve().parents if p.name =
 #-----------------------------------------------------------#
 
 import json
-import requests
 from tabulate import tabulate
 
-from aitools.media_tools.image_tools import generate_image
+from aitools.media_tools.image_tools import generate_images, save_images
 from aitools.media_tools.text_tools import prompt_llm
-from aitools.media_tools.utils import increment_file_name
 
 
 args = {
@@ -78,26 +76,20 @@ for i, suggestion in enumerate(suggestions):
 print(tabulate(data, colalign=("left", "left")))
 
 # Have user select which images to generate
-selected_images = []
 selected = input("Enter the numbers of the images you would like to generate, then hit Enter: ")
-for i in selected:
-    image_response = generate_image(
-        prompt=suggestions[int(i)-1]["description"],
-        model='dall-e-3',
-        size="1024x1024",
-    )
-
+selected = [int(i) for i in selected if i.isdigit()]
+
+# Generate the selected images concurrently, saving each as soon as it's ready
+requests_to_generate = [
+    {"prompt": suggestions[i-1]["description"], "model": "dall-e-3", "size": "1024x1024"}
+    for i in selected
+]
+for index, image_response in generate_images(requests_to_generate):
+    i = selected[index]
     for image in image_response.data:
         if hasattr(image, 'revised_prompt'):
             print('Revised prompt:', image.revised_prompt)
         else:
             print('Original prompt used.')
 
-        # download image
-        image = requests.get(image.url)
-        output_file_name = increment_file_name(args["name"] + f"-image-{int(i)}.png")
-
-        with open(output_file_name, "wb") as file:
-            file.write(image.content)
-
-    
\ No newline at end of file
+    save_images(image_response, args["name"] + f"-image-{i}.png")
\ No newline at end of file
@@ -4,10 +4,7 @@ from pathlib import Path
 sys.path.append(str(next(p for p in Path(__file__).resolve().parents if p.name == 'ai-tools')))
 #-----------------------------------------------------------#
 
-import requests
-
-from aitools.media_tools.image_tools import generate_image
-from aitools.media_tools.utils import increment_file_name
+from aitools.media_tools.image_tools import generate_image, save_images
 
 
 def create_image(
@@ -31,12 +28,9 @@ def create_image(
         else:
             print('Original prompt used.')
 
-        # download image
-        image = requests.get(image.url)
-        output_file_name = increment_file_name(output_file)
-
-        with open(output_file_name, "wb") as file:
-            file.write(image.content)
+    # Save images
+    for saved in save_images(image_response, output_file):
+        print(f"Saved {saved['path']} ({saved['bytes'] / 1024:.0f} KB in {saved['seconds']:.1f}s)")
 
     return
 
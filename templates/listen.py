@@ -4,8 +4,8 @@ from pathlib import Path
 sys.path.append(str(next(p for p in Path(__file__).resolve().parents if p.name == 'ai-tools')))
 #-----------------------------------------------------------#
 
-from aitools.media_tools.audio_tools import transcribe
-from aitools.media_tools.text_tools import translate
+from aitools.media_tools.audio_tools import transcribe_and_translate
+from aitools.media_tools.response_cache import enable_transcription_cache
 from aitools.third_party_apis.models import LLMsList, SpeechRecList
 
 
@@ -16,20 +16,19 @@ def transcribe_and_translate_audio(
 ):
     '''
     Transcribe an audio file and translate the transcription to English.
+    Each part of the recording is translated as soon as it's transcribed.
     '''
 
-    transcription = transcribe(file_path, model=transcriber)
-    text = transcription.text
+    result = transcribe_and_translate(file_path, transcriber=transcriber, llm=llm, trim_silence=True)
+    text = result["transcription"].text
     print(f'\nTranscription:\n{text}\n')
+    print(f'\nTranslation:\n{result["translation"]}\n')
 
-    if 'english' not in transcription.language:
-        translation = translate(text, model=llm)
-        print(f'\nTranslation:\n{translation}\n')
-    else:
-        translation = text
+    return {'transcription': text, 'translation': result["translation"]}
 
-    return {'transcription': text, 'translation': translation}
 
+# Reruns on the same audio reuse the earlier transcription instead of paying for it again
+enable_transcription_cache()
 
 input_file = "data/audio/WhatsApp Ptt 2024-10-02 at 4.35.05 PM.ogg"
 transcribe_and_translate_audio(input_file, llm="gpt-4o-mini")
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""Tests for automatic Anthropic cache-breakpoint placement in anthropic_cache_planner.py."""
+import os
+import sys
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aitools.media_tools import text_tools  # noqa: E402
+from aitools.third_party_apis import anthropic_tools  # noqa: E402
+from aitools.third_party_apis.anthropic_cache_planner import plan_cache_breakpoints  # noqa: E402
+
+MODEL = "claude-sonnet-5"  # cache_min_tokens 1024
+LONG = "lorem ipsum " * 1000  # about 3400 tokens
+
+
+def text(value):
+    return {"type": "text", "text": value}
+
+
+def markers(system, messages):
+    blocks = system + [block for message in messages for block in message["content"]]
+    return [i for i, block in enumerate(blocks) if "cache_control" in block]
+
+
+def conversation(turns):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": [text(f"question {i}")]})
+        messages.append({"role": "assistant", "content": [text(f"answer {i}")]})
+    return messages + [{"role": "user", "content": [text("latest")]}]
+
+
+def test_short_prompts_get_no_breakpoints():
+    system = [text("You are a helpful assistant.")]
+    messages = conversation(1)
+
+    plan = plan_cache_breakpoints(system, messages, MODEL)
+
+    assert plan["breakpoints"] == []
+    assert markers(system, messages) == []
+
+
+def test_system_tail_and_previous_turn_are_marked():
+    system = [text(LONG)]
+    messages = conversation(2)
+
+    plan = plan_cache_breakpoints(system, messages, MODEL)
+
+    assert [reason for reason, _ in plan["breakpoints"]] == ["system prompt", "previous turn", "conversation tail"]
+    assert markers(system, messages) == [0, 3, 5]
+    assert plan["cache_read_tokens"] == 0
+    assert plan["cache_write_tokens"] == plan["total_tokens"]
+
+
+def test_never_more_than_four_breakpoints():
+    system = [text(LONG)]
+    messages = [{"role": "user", "content": [text(LONG), text(LONG + "b"), text(LONG + "c"), text("summarize these")]}]
+    messages += [{"role": "assistant", "content": [text("ok")]}, {"role": "user", "content": [text("more")]}]
+
+    plan = plan_cache_breakpoints(system, messages, MODEL)
+
+    assert len(plan["breakpoints"]) == 4
+    assert len(markers(system, messages)) == 4
+    assert "document" in [reason for reason, _ in plan["breakpoints"]]
+
+
+def test_next_turn_reads_the_previous_write_and_stale_markers_move():
+    system = [text(LONG)]
+    messages = conversation(2)
+    first = plan_cache_breakpoints(system, messages, MODEL)
+
+    messages += [{"role": "assistant", "content": [text("answer 2")]}, {"role": "user", "content": [text("next")]}]
+    second = plan_cache_breakpoints(system, messages, MODEL, previous=first)
+
+    assert second["cache_read_tokens"] == first["breakpoints"][-1][1]
+    assert second["cache_write_tokens"] == second["total_tokens"] - second["cache_read_tokens"]
+    # Only the two latest user messages keep markers, plus the system prompt.
+    assert markers(system, messages) == [0, 5, 7]
+
+
+def test_chat_places_breakpoints_each_turn(monkeypatch):
+    sent = []
+
+    def fake_stream(formatted_messages, formatted_system_prompt, **kwargs):
+        sent.append(markers(formatted_system_prompt, formatted_messages))
+        return {"text": "ok", "input_tokens": 10, "output_tokens": 1}
+
+    replies = iter(["second", "third"])
+
+    def fake_input(prompt=""):
+        try:
+            return next(replies)
+        except StopIteration:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(anthropic_tools, "stream_claude", fake_stream)
+    monkeypatch.setattr("builtins.input", fake_input)
+
+    text_tools.chat_with_llm([{"text": "first"}], model=MODEL, system_prompt=LONG, cache=True)
+
+    assert sent == [[0, 1], [0, 1, 3], [0, 3, 5]]
@@ -0,0 +1,138 @@
+"""Tests for the asyncio prompting API (aprompt_llm and async provider adapters)."""
+import asyncio
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aitools.media_tools import text_tools  # noqa: E402
+from aitools.third_party_apis import anthropic_tools, openai_tools  # noqa: E402
+
+
+class FakeOpenaiUsage:
+    class prompt_tokens_details:
+        cached_tokens = 40
+
+    prompt_tokens = 100
+    completion_tokens = 20
+
+
+class FakeOpenaiResponse:
+    class _Choice:
+        class message:
+            content = "async hello"
+
+    choices = [_Choice]
+    usage = FakeOpenaiUsage
+
+
+class FakeAsyncCompletions:
+    def __init__(self):
+        self.last_kwargs = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.last_kwargs = kwargs
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return FakeOpenaiResponse
+
+
+class FakeAsyncOpenai:
+    def __init__(self):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeAsyncCompletions()
+
+
+class FakeTextBlock:
+    type = "text"
+    text = "claude says hi"
+
+
+class FakeClaudeUsage:
+    input_tokens = 10
+    output_tokens = 5
+    cache_creation_input_tokens = 0
+    cache_read_input_tokens = 3
+
+
+class FakeClaudeMessage:
+    content = [FakeTextBlock]
+    usage = FakeClaudeUsage
+
+
+class FakeAsyncMessages:
+    def __init__(self):
+        self.last_kwargs = None
+
+    async def create(self, **kwargs):
+        self.last_kwargs = kwargs
+        return FakeClaudeMessage
+
+
+class FakeAsyncAnthropic:
+    def __init__(self):
+        self.messages = FakeAsyncMessages()
+
+
+def test_aprompt_openai_matches_sync_response_shape(monkeypatch):
+    fake_client = FakeAsyncOpenai()
+    monkeypatch.setattr(openai_tools, "_get_async_client", lambda: fake_client)
+
+    result = asyncio.run(openai_tools.aprompt_openai(messages=[{"text": "hi"}], json_mode=True))
+
+    assert result == {
+        "text": "async hello",
+        "input_tokens": 60,
+        "cache_read_tokens": 40,
+        "output_tokens": 20,
+        "retries": 0,
+        "retry_wait_seconds": 0.0,
+    }
+    assert fake_client.chat.completions.last_kwargs["response_format"] == {"type": "json_object"}
+
+
+def test_aprompt_claude_forwards_cache_system_prompt(monkeypatch):
+    fake_client = FakeAsyncAnthropic()
+    monkeypatch.setattr(anthropic_tools, "_get_async_client", lambda: fake_client)
+
+    result = asyncio.run(anthropic_tools.aprompt_claude(
+        messages=[{"text": "hi"}],
+        system_prompt=["Be terse."],
+        cache_system_prompt=True,
+    ))
+
+    assert result["text"] == "claude says hi"
+    assert result["cache_read_tokens"] == 3
+    system_blocks = fake_client.messages.last_kwargs["system"]
+    assert system_blocks[-1]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_aprompt_llm_runs_calls_concurrently(monkeypatch):
+    fake_client = FakeAsyncOpenai()
+    monkeypatch.setattr(openai_tools, "_get_async_client", lambda: fake_client)
+
+    async def run_many():
+        return await asyncio.gather(*[
+            text_tools.aprompt_llm(messages=[{"text": f"hi {i}"}], model="gpt-4o-mini")
+            for i in range(5)
+        ])
+
+    results = asyncio.run(run_many())
+
+    assert results == ["async hello"] * 5
+    assert fake_client.chat.completions.max_in_flight == 5
+
+
+def test_aprompt_llm_shares_prompt_llm_validation():
+    try:
+        asyncio.run(text_tools.aprompt_llm(messages=[{"text": "hi"}], model="gpt-4o-mini", max_tokens=10**9))
+    except AssertionError as e:
+        assert "max_tokens" in str(e)
+    else:
+        raise AssertionError("aprompt_llm should reject max_tokens above the output limit")
@@ -0,0 +1,89 @@
+"""Tests for cached speech-audio conversion in audio_preprocessing.py."""
+import os
+import shutil
+import subprocess
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import audio_preprocessing, audio_tools  # noqa: E402
+
+
+@pytest.fixture
+def ffmpeg(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_run(command, input=None, **kwargs):
+        calls.append((command, input))
+        return SimpleNamespace(stdout=b"OggS" + (input or b"from a path")[:10], stderr=b"")
+
+    monkeypatch.setattr(audio_preprocessing.subprocess, "run", fake_run)
+    monkeypatch.setattr(audio_preprocessing, "_settings", {**audio_preprocessing._settings, "cache_dir": str(tmp_path / "cache")})
+    monkeypatch.setattr(audio_preprocessing, "_digests", {})
+    return calls
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / "memo.m4a"
+    path.write_bytes(b"stereo audio" * 100)
+    return str(path)
+
+
+def test_conversion_is_mono_16k_opus_through_a_pipe(ffmpeg, recording):
+    path = audio_preprocessing.preprocess_audio(recording)
+
+    command, _ = ffmpeg[0]
+    assert command[command.index("-ac") + 1] == "1"
+    assert command[command.index("-ar") + 1] == "16000"
+    assert command[command.index("-c:a") + 1] == "libopus"
+    assert command[-1] == "pipe:1"
+    assert path.endswith(".ogg")
+    assert open(path, "rb").read() == b"OggSfrom a pat"
+    assert not os.path.exists(os.path.splitext(recording)[0] + ".mp3")
+
+
+def test_reruns_and_copies_reuse_the_conversion(ffmpeg, recording, tmp_path):
+    first = audio_preprocessing.preprocess_audio(recording)
+    copy = str(tmp_path / "copy.m4a")
+    shutil.copy(recording, copy)
+
+    assert audio_preprocessing.preprocess_audio(recording) == first
+    assert audio_preprocessing.preprocess_audio(copy) == first
+    assert len(ffmpeg) == 1
+
+
+def test_settings_changes_convert_again(ffmpeg, recording):
+    first = audio_preprocessing.preprocess_audio(recording)
+    audio_preprocessing.configure_audio_preprocessing(bitrate="32k")
+
+    assert audio_preprocessing.preprocess_audio(recording) != first
+    assert len(ffmpeg) == 2
+
+
+def test_bytes_are_piped_in(ffmpeg):
+    audio_preprocessing.preprocess_audio(b"raw audio bytes")
+
+    command, piped = ffmpeg[0]
+    assert command[command.index("-i") + 1] == "pipe:0"
+    assert piped == b"raw audio bytes"
+
+
+def test_convert_to_mp3_never_prompts(monkeypatch, recording):
+    existing = os.path.splitext(recording)[0] + ".mp3"
+    open(existing, "wb").close()
+    ran = []
+
+    def no_input(prompt=""):
+        raise AssertionError("prompted")
+
+    monkeypatch.setattr("builtins.input", no_input)
+    monkeypatch.setattr(subprocess, "run", lambda command, **kwargs: ran.append(command))
+
+    assert audio_tools.convert_to_mp3(recording) == existing
+    assert ran == []
+    audio_tools.convert_to_mp3(recording, overwrite=True)
+    assert len(ran) == 1
@@ -0,0 +1,148 @@
+"""Tests for offline batch prompting against local stand-ins for the batch endpoints."""
+import json
+import os
+import re
+import sys
+import types
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import batch_tools  # noqa: E402
+from aitools.third_party_apis import anthropic_tools, openai_tools  # noqa: E402
+
+
+class FakeOpenaiBatchServer:
+    """Stand-in for the OpenAI files and batches endpoints that 'completes' a batch on retrieve."""
+
+    def __init__(self):
+        self.files = types.SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = types.SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+        self._files = {}
+        self._batches = {}
+
+    def _create_file(self, file, purpose):
+        file_id = f"file-{len(self._files)}"
+        self._files[file_id] = file[1].decode("utf-8")
+        return types.SimpleNamespace(id=file_id)
+
+    def _file_content(self, file_id):
+        return types.SimpleNamespace(iter_lines=lambda: iter(self._files[file_id].split("\n")))
+
+    def _create_batch(self, input_file_id, endpoint, completion_window):
+        batch_id = f"batch-{len(self._batches)}"
+        self._batches[batch_id] = input_file_id
+        return types.SimpleNamespace(id=batch_id)
+
+    def _retrieve_batch(self, batch_id):
+        requests = [json.loads(line) for line in self._files[self._batches[batch_id]].split("\n")]
+        output = []
+        for request in requests:
+            prompt = request["body"]["messages"][-1]["content"][0]["text"]
+            if prompt == "fail":
+                output.append({"custom_id": request["custom_id"], "response": {"status_code": 400, "body": {"error": "bad request"}}})
+                continue
+            output.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": {
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": request["body"]["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": prompt.upper()}}],
+                "usage": {"prompt_tokens": 2000, "completion_tokens": 1000, "total_tokens": 3000, "prompt_tokens_details": {"cached_tokens": 0}},
+            }}})
+        output_file_id = f"file-out-{batch_id}"
+        self._files[output_file_id] = "\n".join(json.dumps(line) for line in output)
+        return types.SimpleNamespace(
+            status="completed",
+            output_file_id=output_file_id,
+            error_file_id=None,
+            request_counts=types.SimpleNamespace(completed=len(output), failed=0, total=len(output)),
+        )
+
+
+class FakeAnthropicBatchServer:
+    def __init__(self):
+        self.messages = types.SimpleNamespace(batches=types.SimpleNamespace(
+            create=self._create, retrieve=self._retrieve, results=self._results,
+        ))
+        self.submitted = None
+
+    def _create(self, requests):
+        self.submitted = requests
+        return types.SimpleNamespace(id="msgbatch-1")
+
+    def _retrieve(self, batch_id):
+        counts = types.SimpleNamespace(processing=0, succeeded=len(self.submitted), errored=0, canceled=0, expired=0)
+        return types.SimpleNamespace(processing_status="ended", request_counts=counts)
+
+    def _results(self, batch_id):
+        for request in self.submitted:
+            text = request["params"]["messages"][-1]["content"][0]["text"]
+            message = types.SimpleNamespace(
+                content=[types.SimpleNamespace(type="text", text=text[::-1])],
+                usage=types.SimpleNamespace(input_tokens=1000, output_tokens=1000),
+            )
+            yield types.SimpleNamespace(
+                custom_id=request["custom_id"],
+                result=types.SimpleNamespace(type="succeeded", message=message),
+            )
+
+
+@pytest.fixture
+def state_file(tmp_path):
+    return str(tmp_path / "batches.json")
+
+
+def test_openai_batch_round_trip(monkeypatch, state_file, capsys):
+    server = FakeOpenaiBatchServer()
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: server)
+
+    batch_id = batch_tools.submit_batch(
+        [{"id": "first/prompt", "messages": ["hello"]}, {"id": 7, "messages": ["fail"]}],
+        model="gpt-4o-mini",
+        state_file=state_file,
+    )
+    progress = batch_tools.poll_batch(batch_id, state_file=state_file)
+    results = dict(batch_tools.collect_batch(batch_id, state_file=state_file))
+
+    assert progress["ended"]
+    assert results["first/prompt"]["text"] == "HELLO"
+    assert results["first/prompt"]["input_tokens"] == 2000
+    assert "error" in results[7]
+    # 2000 input at 0.15/M plus 1000 output at 0.60/M, halved.
+    assert re.search(r"Batch Cost\s+\$0\.00045", capsys.readouterr().out)
+
+    with open(state_file) as f:
+        assert json.load(f)[batch_id]["status"] == "collected"
+
+
+def test_anthropic_batch_round_trip(monkeypatch, state_file):
+    server = FakeAnthropicBatchServer()
+    monkeypatch.setattr(anthropic_tools, "_get_client", lambda: server)
+
+    batch_id = batch_tools.submit_batch(
+        [{"id": "a", "messages": ["abc"], "system_prompt": "Be terse."}],
+        model="claude-haiku-4-5",
+        state_file=state_file,
+    )
+
+    assert server.submitted[0]["params"]["system"] == [{"type": "text", "text": "Be terse."}]
+    assert batch_tools.poll_batch(batch_id, wait=True, state_file=state_file)["ended"]
+    assert list(batch_tools.collect_batch(batch_id, state_file=state_file))[0][1]["text"] == "cba"
+
+
+def test_unsupported_provider_raises(state_file):
+    with pytest.raises(ValueError):
+        batch_tools.submit_batch([{"id": "a", "messages": ["hi"]}], model="gemini-3.5-flash", state_file=state_file)
+
+
+def test_duplicate_ids_raise(state_file):
+    with pytest.raises(ValueError):
+        batch_tools.submit_batch(
+            [{"id": "a", "messages": ["hi"]}, {"id": "a", "messages": ["there"]}],
+            model="gpt-4o-mini",
+            state_file=state_file,
+        )
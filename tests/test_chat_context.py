@@ -0,0 +1,145 @@
+"""Tests for bounded chat history in chat_context.py."""
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import chat_context, text_tools, usage_ledger  # noqa: E402
+from aitools.third_party_apis import openai_tools  # noqa: E402
+
+
+def turn(i, words=10):
+    return [
+        {"role": "user", "content": [{"type": "text", "text": f"question {i} " + "word " * words}]},
+        {"role": "assistant", "content": [{"type": "text", "text": f"answer {i} " + "word " * words}]},
+    ]
+
+
+def history(turns, words=10):
+    messages = [m for i in range(turns) for m in turn(i, words)]
+    return messages + [{"role": "user", "content": [{"type": "text", "text": "latest"}]}]
+
+
+def test_short_history_is_left_alone():
+    messages = history(3)
+
+    kept, summary = chat_context.ChatContextPolicy(max_turns=5, summarize=False).compact(messages, "gpt-4o-mini")
+
+    assert kept is messages
+    assert summary == ""
+
+
+def test_compaction_has_hysteresis():
+    policy = chat_context.ChatContextPolicy(max_turns=6, keep_last_turns=2, summarize=False)
+    messages = history(6)
+
+    kept, _ = policy.compact(messages, "gpt-4o-mini")
+
+    assert len(chat_context.split_turns(kept)) == 2
+    assert kept[-1]["content"][0]["text"] == "latest"
+    # Four more turns fit before the next compaction, so the prefix stays stable meanwhile.
+    grown = kept + [m for i in range(10, 14) for m in turn(i)][1:] + [{"role": "user", "content": [{"type": "text", "text": "again"}]}]
+    assert policy.compact(grown, "gpt-4o-mini")[0] is grown
+
+
+def test_token_budget_keeps_recent_turns_under_low_water():
+    policy = chat_context.ChatContextPolicy(max_history_tokens=1000, keep_last_turns=10, summarize=False)
+    messages = history(10, words=100)  # about 200 tokens per turn
+
+    kept, _ = policy.compact(messages, "gpt-4o-mini")
+
+    tokens = sum(chat_context.message_tokens(m, "gpt-4o-mini") for m in kept)
+    assert tokens <= 500
+    assert len(chat_context.split_turns(kept)) >= 2
+
+
+def test_dropped_turns_are_folded_into_the_summary(monkeypatch):
+    prompts = []
+
+    def fake_prompt_llm(messages, **kwargs):
+        prompts.append((messages, kwargs))
+        return "the user asked about questions 0 to 3"
+
+    monkeypatch.setattr(text_tools, "prompt_llm", fake_prompt_llm)
+    policy = chat_context.ChatContextPolicy(max_turns=4, keep_last_turns=1)
+
+    kept, summary = policy.compact(history(4), "gpt-4o-mini", summary="earlier summary")
+
+    assert summary == "the user asked about questions 0 to 3"
+    messages, kwargs = prompts[0]
+    assert messages[0]["text"].endswith("earlier summary")
+    assert "User: question 0" in messages[1]["text"]
+    assert kwargs["model"] == "gpt-4o-mini"
+    assert len(kept) == 1
+
+
+def test_summaries_use_the_chat_providers_cheapest_model(monkeypatch):
+    models = []
+
+    def fake_prompt_llm(messages, **kwargs):
+        models.append(kwargs["model"])
+        return "summary"
+
+    monkeypatch.setattr(text_tools, "prompt_llm", fake_prompt_llm)
+
+    chat_context.ChatContextPolicy(max_turns=4, keep_last_turns=1).compact(history(4), "claude-opus-4-8")
+    chat_context.ChatContextPolicy(max_turns=4, keep_last_turns=1, summary_model="gemini-3.5-flash").compact(history(4), "claude-opus-4-8")
+
+    assert models == ["claude-haiku-4-5", "gemini-3.5-flash"]
+
+
+def test_quiet_mode_silences_compaction_notices(monkeypatch, capsys):
+    def failing_prompt_llm(messages, **kwargs):
+        raise RuntimeError("summary model unavailable")
+
+    monkeypatch.setattr(text_tools, "prompt_llm", failing_prompt_llm)
+    policy = chat_context.ChatContextPolicy(max_turns=4, keep_last_turns=1)
+
+    with usage_ledger.collect_usage(quiet=True):
+        kept, summary = policy.compact(history(4), "gpt-4o-mini", summary="earlier summary")
+
+    assert summary == "earlier summary"
+    assert len(kept) == 1
+    assert capsys.readouterr().out == ""
+
+    policy.compact(history(4), "gpt-4o-mini")
+    out = capsys.readouterr().out
+    assert "Couldn't summarize" in out and "Compacted 4 earlier turns" in out
+
+
+def test_chat_sends_the_summary_before_the_kept_turns(monkeypatch):
+    sent = []
+
+    def fake_stream(formatted_messages, **kwargs):
+        sent.append(formatted_messages)
+        return {"text": "ok", "input_tokens": 10, "output_tokens": 1}
+
+    replies = iter(["second", "third"])
+
+    def fake_input(prompt=""):
+        try:
+            return next(replies)
+        except StopIteration:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(openai_tools, "stream_openai", fake_stream)
+    monkeypatch.setattr(text_tools, "prompt_llm", lambda *args, **kwargs: "SUMMARY")
+    monkeypatch.setattr("builtins.input", fake_input)
+
+    policy = chat_context.ChatContextPolicy(max_turns=2, keep_last_turns=1)
+    text_tools.chat_with_llm([{"text": "first"}], model="gpt-4o-mini", cache=False, context_policy=policy)
+
+    assert len(sent) == 3
+    assert len(sent[1]) == 3  # first, ok, second
+    last = sent[2]
+    assert last[0]["content"][0]["text"] == chat_context.SUMMARY_HEADER + "SUMMARY"
+    assert last[1]["role"] == "assistant"
+    assert [m["content"][0]["text"] for m in last[2:]] == ["third"]
+
+
+def test_policy_validates_its_marks():
+    with pytest.raises(AssertionError):
+        chat_context.ChatContextPolicy(max_turns=2, keep_last_turns=2)
@@ -0,0 +1,91 @@
+"""Tests for concurrent multi-prompt image generation in image_tools.py."""
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import image_tools  # noqa: E402
+from aitools.third_party_apis import google_image_tools, openai_tools  # noqa: E402
+
+
+class FakeGenerator:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt, model, num_variations, **kwargs):
+        with self.lock:
+            self.calls.append((prompt, num_variations))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if prompt == "boom":
+                raise RuntimeError("provider error")
+            # Later prompts finish first so completion order differs from input order.
+            time.sleep(self.delay / (1 + len(prompt)))
+            return SimpleNamespace(data=[SimpleNamespace(url=f"{prompt}-{i}") for i in range(num_variations)])
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    generator = FakeGenerator()
+    monkeypatch.setattr(openai_tools, "generate_image_via_openai", generator)
+    return generator
+
+
+def test_variations_are_split_for_single_image_models(fake_openai):
+    results = dict(image_tools.generate_images([{"prompt": "a cat", "num_variations": 5}]))
+
+    assert fake_openai.calls == [("a cat", 1)] * 5
+    assert len(results[0].data) == 5
+    assert fake_openai.max_in_flight > 1
+
+
+def test_models_that_take_n_get_one_request(fake_openai):
+    results = dict(image_tools.generate_images([{"prompt": "a cat", "model": "dall-e-2", "num_variations": 3}]))
+
+    assert fake_openai.calls == [("a cat", 3)]
+    assert len(results[0].data) == 3
+
+
+def test_results_are_yielded_as_they_complete_or_in_order(fake_openai):
+    specs = [{"prompt": "a"}, {"prompt": "a much longer prompt"}]
+
+    assert [index for index, _ in image_tools.generate_images(specs)] == [1, 0]
+    assert [index for index, _ in image_tools.generate_images(specs, ordered=True)] == [0, 1]
+
+
+def test_concurrency_is_limited_per_provider(fake_openai, monkeypatch):
+    fake_google = FakeGenerator()
+    monkeypatch.setattr(google_image_tools, "generate_image_via_google", fake_google)
+    specs = [{"prompt": f"p{i}"} for i in range(6)] + [{"prompt": f"g{i}", "model": "gemini-3.1-flash-image"} for i in range(6)]
+
+    results = list(image_tools.generate_images(specs, concurrency={"openai": 2, "google": 3}))
+
+    assert len(results) == 12
+    assert fake_openai.max_in_flight == 2
+    assert fake_google.max_in_flight == 3
+
+
+def test_failures_can_be_returned_in_place(fake_openai):
+    specs = [{"prompt": "boom"}, {"prompt": "fine"}]
+
+    results = dict(image_tools.generate_images(specs, return_exceptions=True))
+
+    assert isinstance(results[0], RuntimeError)
+    assert results[1].data[0].url == "fine-0"
+    with pytest.raises(RuntimeError):
+        list(image_tools.generate_images(specs))
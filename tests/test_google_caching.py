@@ -1,12 +1,30 @@
-"""Tests for Gemini cache-token mapping in google_tools.py."""
+"""Tests for Gemini cache-token mapping, model reuse and explicit context caching in google_tools.py."""
+import asyncio
+from collections import OrderedDict
 import os
 import sys
+import threading
+import time
+import types
 
 os.environ.setdefault("GOOGLE_API_KEY", "test-key")
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
+import pytest  # noqa: E402
+
+from aitools.media_tools import text_tools  # noqa: E402
 from aitools.third_party_apis import google_tools  # noqa: E402
 
+LONG_SYSTEM_PROMPT = "You are a meticulous contract reviewer. " * 400  # about 2000 tokens
+
+
+@pytest.fixture(autouse=True)
+def fresh_models(monkeypatch):
+    monkeypatch.setattr(google_tools, "_models", OrderedDict())
+    monkeypatch.setattr(google_tools, "_cached_contents", {})
+    monkeypatch.setattr(google_tools, "_cache_locks", {})
+    monkeypatch.setattr(google_tools, "_async_cache_locks", {})
+
 
 class FakeUsageMetadata:
     def __init__(self, prompt_token_count, candidates_token_count, cached_content_token_count=None):
@@ -29,10 +47,13 @@ class FakeGenerativeModel:
     def generate_content(self, **kwargs):
         return self._response
 
+    async def generate_content_async(self, **kwargs):
+        return self._response
+
 
 def _patch_model(monkeypatch, response):
     monkeypatch.setattr(
-        google_tools.genai,
+        google_tools._get_genai(),
         "GenerativeModel",
         lambda **kwargs: FakeGenerativeModel(response),
     )
@@ -63,3 +84,167 @@ def test_gemini_falls_back_when_no_cache_fields(monkeypatch):
     assert result["input_tokens"] == 1000
     assert result["cache_read_tokens"] == 0
     assert result["output_tokens"] == 50
+
+
+class FakeCachedContent:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.name = "cachedContents/test"
+        self.usage_metadata = types.SimpleNamespace(total_token_count=2000)
+        self.deleted = False
+
+    def delete(self):
+        self.deleted = True
+
+
+@pytest.fixture
+def fake_genai(monkeypatch):
+    created = {"models": [], "caches": [], "cached_models": []}
+    usage = FakeUsageMetadata(prompt_token_count=2100, candidates_token_count=10, cached_content_token_count=2000)
+
+    class GenerativeModel(FakeGenerativeModel):
+        def __init__(self, **kwargs):
+            super().__init__(FakeResponse("hi", usage))
+            self.kwargs = kwargs
+            created["models"].append(self)
+
+        @classmethod
+        def from_cached_content(cls, cached_content):
+            model = cls(cached_content=cached_content)
+            created["cached_models"].append(model)
+            return model
+
+    def create(**kwargs):
+        created["caches"].append(FakeCachedContent(**kwargs))
+        return created["caches"][-1]
+
+    genai = types.SimpleNamespace(
+        GenerativeModel=GenerativeModel,
+        caching=types.SimpleNamespace(CachedContent=types.SimpleNamespace(create=create)),
+        types=types.SimpleNamespace(GenerationConfig=lambda **kwargs: kwargs),
+    )
+    monkeypatch.setattr(google_tools, "_get_genai", lambda: genai)
+    monkeypatch.setitem(google_tools._settings, "delete_caches_on_exit", False)
+    return created
+
+
+def test_models_are_reused_per_system_prompt(fake_genai):
+    for _ in range(2):
+        google_tools.prompt_gemini(["hi"], system_prompt="Be brief.")
+    google_tools.prompt_gemini(["hi"], system_prompt="Be thorough.")
+
+    assert len(fake_genai["models"]) == 2
+
+
+def test_explicit_cache_is_created_once_and_billed(fake_genai):
+    first = google_tools.prompt_gemini(["question 1"], system_prompt=LONG_SYSTEM_PROMPT, cache_system_prompt=True)
+    second = google_tools.prompt_gemini(["question 2"], system_prompt=LONG_SYSTEM_PROMPT, cache_system_prompt=True)
+
+    assert len(fake_genai["caches"]) == 1
+    assert fake_genai["caches"][0].kwargs["contents"] == []
+    assert first["cache_write_tokens"] == 2000
+    assert first["cache_storage_token_hours"] == 2000  # one-hour TTL from the registry
+    assert "cache_write_tokens" not in second
+    assert second["cache_read_tokens"] == 2000
+
+
+def test_marked_messages_form_the_cached_prefix(fake_genai):
+    document = {"text": "Clause. " * 1000, "cache": True}
+
+    google_tools.prompt_gemini([document, "Summarize clause 3."], cache_system_prompt=False)
+
+    cache = fake_genai["caches"][0]
+    assert cache.kwargs["contents"][0]["parts"] == [{"text": document["text"]}]
+
+
+def test_small_prefixes_are_not_explicitly_cached(fake_genai):
+    google_tools.prompt_gemini(["hi"], system_prompt="Be brief.", cache_system_prompt=True)
+
+    assert fake_genai["caches"] == []
+
+
+def test_expired_caches_are_replaced_and_deleted_on_request(fake_genai, monkeypatch):
+    google_tools.prompt_gemini(["q"], system_prompt=LONG_SYSTEM_PROMPT, cache_system_prompt=True)
+    for entry in google_tools._cached_contents.values():
+        entry["expires_at"] = 0
+    google_tools.prompt_gemini(["q"], system_prompt=LONG_SYSTEM_PROMPT, cache_system_prompt=True)
+
+    assert len(fake_genai["caches"]) == 2
+    google_tools.delete_gemini_caches()
+    assert fake_genai["caches"][1].deleted
+    assert google_tools._cached_contents == {}
+
+
+def test_cache_creation_does_not_block_other_calls(fake_genai, monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+    create = google_tools._get_genai().caching.CachedContent.create
+
+    def slow_create(**kwargs):
+        started.set()
+        assert release.wait(5)
+        return create(**kwargs)
+
+    monkeypatch.setattr(google_tools._get_genai().caching.CachedContent, "create", slow_create)
+    results = []
+
+    def cached_call():
+        results.append(google_tools.prompt_gemini(["q"], system_prompt=LONG_SYSTEM_PROMPT, cache_system_prompt=True))
+
+    threads = [threading.Thread(target=cached_call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+
+    # An uncached call completes while the cache is still being created.
+    assert google_tools.prompt_gemini(["hi"], system_prompt="Be brief.")["text"] == "hi"
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(fake_genai["caches"]) == 1
+    assert sum("cache_write_tokens" in result for result in results) == 1
+    assert google_tools._cache_locks == {}
+
+
+def test_async_cache_creation_leaves_the_event_loop_running(fake_genai, monkeypatch):
+    create = google_tools._get_genai().caching.CachedContent.create
+
+    def slow_create(**kwargs):
+        time.sleep(0.2)
+        return create(**kwargs)
+
+    monkeypatch.setattr(google_tools._get_genai().caching.CachedContent, "create", slow_create)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.02)
+
+    async def main():
+        calls = [
+            google_tools.aprompt_gemini(["q"], system_prompt=LONG_SYSTEM_PROMPT, cache_system_prompt=True)
+            for _ in range(3)
+        ]
+        results = await asyncio.gather(ticker(), *calls)
+        return results[1:]
+
+    started = time.monotonic()
+    results = asyncio.run(main())
+
+    # The ticker kept running while the cache was created in a worker thread.
+    assert len(ticks) == 5 and ticks[-1] - started < 0.2
+    assert len(fake_genai["caches"]) == 1
+    assert sum("cache_write_tokens" in result for result in results) == 1
+    assert google_tools._async_cache_locks == {}
+
+
+def test_storage_cost_is_included_in_logged_cost(capsys):
+    usage = {"input_tokens": 0, "output_tokens": 0, "cache_write_tokens": 1000000, "cache_storage_token_hours": 1000000}
+
+    text_tools.log_token_usage(usage, model="gemini-3.5-flash")
+
+    out = capsys.readouterr().out
+    assert "Cache Storage (token-hours)" in out
+    assert "$2.50000" in out  # 1M tokens written at 1.50 plus one hour of storage at 1.00
@@ -0,0 +1,74 @@
+"""Tests for the shared client factory in http_clients.py."""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.third_party_apis import http_clients, openai_tools  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    http_clients.configure_http_clients()
+    yield
+    http_clients.configure_http_clients(max_connections=100, read_timeout=600.0)
+
+
+def test_concurrent_callers_share_one_client():
+    builds = []
+
+    def build():
+        time.sleep(0.01)  # widen the race window
+        builds.append(object())
+        return builds[-1]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(http_clients.get_client("x", build))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert all(result is builds[0] for result in results)
+
+
+def test_clients_are_rebuilt_after_fork(monkeypatch):
+    first = http_clients.get_client("x", object)
+    monkeypatch.setattr(http_clients, "_clients_pid", -1)
+
+    assert http_clients.get_client("x", object) is not first
+
+
+def test_async_clients_are_kept_per_event_loop():
+    async def get():
+        return http_clients.get_async_client("x", object), http_clients.get_async_client("x", object)
+
+    first, again = asyncio.run(get())
+    second, _ = asyncio.run(get())
+
+    assert first is again
+    assert first is not second
+
+
+def test_sdk_clients_use_the_configured_pool():
+    http_clients.configure_http_clients(max_connections=7, read_timeout=42)
+
+    client = openai_tools._get_client()
+
+    assert client is openai_tools._get_client()
+    assert client._client._transport._pool._max_connections == 7
+    assert client.timeout.read == 42
+
+
+def test_requests_session_is_shared():
+    session = http_clients.get_requests_session()
+
+    assert session is http_clients.get_requests_session()
+    assert session.get_adapter("https://example.com")._pool_maxsize == 100
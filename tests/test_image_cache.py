@@ -0,0 +1,92 @@
+"""Tests for the encoded image payload cache in image_cache.py."""
+import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import image_cache, utils  # noqa: E402
+
+
+@pytest.fixture
+def cache():
+    cache = image_cache.configure_image_cache(max_bytes=1024)
+    yield cache
+    image_cache.configure_image_cache()
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_encode_image_is_cached_until_the_file_changes(cache, tmp_path):
+    path = write(tmp_path / "a.png", b"first")
+
+    assert utils.encode_image(path) == base64.b64encode(b"first").decode()
+    assert utils.encode_image(path) == base64.b64encode(b"first").decode()
+    assert cache.stats()["hits"] == 1
+
+    write(tmp_path / "a.png", b"second")
+
+    assert utils.encode_image(path) == base64.b64encode(b"second").decode()
+    assert cache.stats()["misses"] == 2
+
+
+def test_identical_files_share_an_entry(cache, tmp_path):
+    first = write(tmp_path / "a.png", b"same pixels")
+    second = write(tmp_path / "b.png", b"same pixels")
+
+    utils.encode_image(first)
+    utils.encode_image(second)
+
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_lru_eviction_by_size(tmp_path):
+    cache = image_cache.ImageCache(max_bytes=100)
+    paths = [write(tmp_path / f"{i}.png", bytes([i]) * 45) for i in range(3)]  # 60 bytes encoded
+
+    cache.get(paths[0])
+    cache.get(paths[1])
+
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == 60
+    cache.get(paths[1])
+    assert cache.stats()["hits"] == 1
+    cache.get(paths[0])
+    assert cache.stats()["misses"] == 3
+
+
+def test_variants_are_cached_separately(tmp_path):
+    cache = image_cache.ImageCache()
+    path = write(tmp_path / "a.png", b"pixels")
+
+    assert cache.get(path, encode=lambda data: "small", variant="small") == "small"
+    assert cache.get(path) == base64.b64encode(b"pixels").decode()
+    assert cache.get(path, encode=lambda data: "other", variant="small") == "small"
+
+
+def test_disk_cache_is_shared_between_instances(tmp_path):
+    disk_dir = str(tmp_path / "cache")
+    path = write(tmp_path / "a.png", b"pixels")
+
+    image_cache.ImageCache(disk_dir=disk_dir).get(path)
+    second = image_cache.ImageCache(disk_dir=disk_dir)
+
+    assert second.get(path) == base64.b64encode(b"pixels").decode()
+    assert second.stats()["disk_hits"] == 1
+    assert second.stats()["misses"] == 0
+
+
+def test_disabled_cache_still_encodes(tmp_path):
+    image_cache.configure_image_cache(enabled=False)
+    try:
+        path = write(tmp_path / "a.png", b"pixels")
+        assert utils.encode_image(path) == base64.b64encode(b"pixels").decode()
+        assert image_cache.image_cache_stats() == {}
+    finally:
+        image_cache.configure_image_cache()
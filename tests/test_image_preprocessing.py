@@ -0,0 +1,125 @@
+"""Tests for downscaling images to each provider's image profile in image_preprocessing.py."""
+import base64
+import io
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import image_cache, image_preprocessing  # noqa: E402
+from aitools.third_party_apis import anthropic_tools, openai_tools  # noqa: E402
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    image_cache.configure_image_cache()
+    yield
+    image_preprocessing.configure_image_preprocessing(enabled=True, format="jpeg", quality=85)
+    image_preprocessing._settings["max_long_side"] = None
+
+
+def save_image(path, size, mode="RGB", format="PNG"):
+    Image.new(mode, size, color="red").save(path, format=format)
+    return str(path)
+
+
+def decoded_size(data):
+    return Image.open(io.BytesIO(base64.b64decode(data))).size
+
+
+def test_large_photo_is_downscaled_for_claude(tmp_path):
+    path = save_image(tmp_path / "photo.png", (4000, 3000))
+
+    media_type, data = image_preprocessing.prepare_image(path, "claude-haiku-4-5")
+
+    assert media_type == "image/jpeg"
+    width, height = decoded_size(data)
+    assert max(width, height) <= 1568
+    assert width * height <= 1_150_000
+
+
+def test_openai_profile_limits_the_short_side(tmp_path):
+    path = save_image(tmp_path / "photo.png", (4000, 3000))
+
+    _, data = image_preprocessing.prepare_image(path, "gpt-4o")
+
+    assert decoded_size(data) == (1024, 768)
+
+
+def test_small_images_are_sent_unchanged_with_their_own_media_type(tmp_path):
+    path = save_image(tmp_path / "icon.png", (200, 100))
+
+    media_type, data = image_preprocessing.prepare_image(path, "gpt-4o")
+
+    with open(path, "rb") as f:
+        assert base64.b64decode(data) == f.read()
+    assert media_type == "image/png"
+
+
+def test_transparent_images_stay_png_unless_webp_is_chosen(tmp_path):
+    path = save_image(tmp_path / "logo.png", (3000, 3000), mode="RGBA")
+
+    assert image_preprocessing.prepare_image(path, "claude-haiku-4-5")[0] == "image/png"
+
+    image_preprocessing.configure_image_preprocessing(format="webp")
+    assert image_preprocessing.prepare_image(path, "claude-haiku-4-5")[0] == "image/webp"
+
+
+def test_token_estimates_follow_provider_formulas():
+    # 2048x1536 -> 1024x768 -> 2x2 tiles
+    assert image_preprocessing.estimate_image_tokens(2048, 1536, "gpt-4o") == 85 + 170 * 4
+    assert image_preprocessing.estimate_image_tokens(1000, 750, "claude-haiku-4-5") == 1000
+    assert image_preprocessing.estimate_image_tokens(300, 300, "gemini-3.5-flash") == 258
+    assert image_preprocessing.estimate_image_tokens(1000, 750, "deepseek-v4-flash") == 0
+
+
+def test_lower_max_long_side_reports_tokens_saved(tmp_path, capsys):
+    image_preprocessing.configure_image_preprocessing(max_long_side=750)
+    path = save_image(tmp_path / "photo.jpg", (1500, 1000), format="JPEG")
+    before = image_preprocessing.image_preprocessing_stats()
+
+    image_preprocessing.prepare_image(path, "claude-haiku-4-5")
+
+    stats = image_preprocessing.image_preprocessing_stats()
+    assert stats["resized"] - before["resized"] == 1
+    assert (stats["tokens_before"] - before["tokens_before"]) - (stats["tokens_after"] - before["tokens_after"]) == (
+        image_preprocessing.estimate_image_tokens(1500, 1000, "claude-haiku-4-5") - 500
+    )
+    assert "fewer image tokens" in capsys.readouterr().out
+
+
+def test_fitting_the_provider_profile_reports_bytes_not_tokens(tmp_path, capsys):
+    path = save_image(tmp_path / "wide.png", (4000, 3000))
+    before = image_preprocessing.image_preprocessing_stats()
+
+    image_preprocessing.prepare_image(path, "claude-haiku-4-5")
+
+    stats = image_preprocessing.image_preprocessing_stats()
+    # Claude would have scaled the upload down itself, so only the bytes shrink.
+    assert stats["tokens_before"] - before["tokens_before"] == stats["tokens_after"] - before["tokens_after"]
+    out = capsys.readouterr().out
+    assert "KB -> " in out and "fewer image tokens" not in out
+
+
+def test_file_estimates_fit_the_image_once(tmp_path):
+    path = save_image(tmp_path / "photo.png", (4000, 3000))
+
+    assert image_preprocessing.estimate_image_file_tokens(path, "gpt-4o") == image_preprocessing.estimate_image_tokens(4000, 3000, "gpt-4o")
+    image_preprocessing.configure_image_preprocessing(max_long_side=400)
+    assert image_preprocessing.estimate_image_file_tokens(path, "gpt-4o") == 85 + 170
+    assert image_preprocessing.estimate_image_file_tokens(path, "claude-haiku-4-5") == 400 * 300 // 750
+
+
+def test_formatters_use_the_real_media_type(tmp_path):
+    path = save_image(tmp_path / "diagram.png", (100, 100))
+
+    openai_content = openai_tools.format_openai_messages([{"image": path}], model="gpt-4o")[0]["content"]
+    claude_content = anthropic_tools.format_claude_messages([{"image": path}], model="claude-haiku-4-5")[0]["content"]
+
+    assert openai_content[0]["image_url"]["url"].startswith("data:image/png;base64,")
+    assert claude_content[0]["source"]["media_type"] == "image/png"
@@ -0,0 +1,56 @@
+"""Startup budget: importing the text tools must not pull in provider SDKs."""
+import os
+import re
+import subprocess
+import sys
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+# Cumulative `python -X importtime` budget for `import aitools.media_tools.text_tools`.
+# Currently ~25ms; any provider SDK on the import path costs several hundred.
+IMPORT_BUDGET_US = 150_000
+
+HEAVY_MODULES = ["openai", "anthropic", "google.generativeai", "google.genai", "httpx", "tabulate", "sqlite3"]
+
+
+def _run(code):
+    env = {k: v for k, v in os.environ.items() if not k.endswith("_API_KEY")}
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_text_tools_import_is_within_budget():
+    # Take the best of a few runs so a busy machine doesn't cause a spurious failure.
+    timings = []
+    for _ in range(3):
+        result = _run("import aitools.media_tools.text_tools")
+        match = re.search(r"\|\s*(\d+)\s*\|\s*aitools\.media_tools\.text_tools\s*$", result.stderr, re.MULTILINE)
+        timings.append(int(match.group(1)))
+
+    assert min(timings) < IMPORT_BUDGET_US, f"import took {min(timings)}us, budget is {IMPORT_BUDGET_US}us"
+
+
+def test_text_tools_import_does_not_load_provider_sdks():
+    result = _run(
+        "import sys, aitools.media_tools.text_tools, aitools.media_tools.image_tools;"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+
+    assert result.stdout.strip() == "[]"
+
+
+def test_provider_modules_import_without_api_keys():
+    # Clients are built on first use, so missing keys only fail when a call is made.
+    result = _run(
+        "import sys;"
+        "import aitools.third_party_apis.recraft_tools, aitools.third_party_apis.google_tools;"
+        "print('openai' in sys.modules, 'google.generativeai' in sys.modules)"
+    )
+
+    assert result.stdout.strip() == "False False"
@@ -42,10 +42,10 @@ def test_log_token_usage_falls_back_to_input_rate_for_missing_cache_read_price(c
         "cache_read_tokens": 2000,
     }
 
-    log_token_usage(usage, model="gemini-3.5-flash")
+    log_token_usage(usage, model="mistral-large-latest")
 
     captured = capsys.readouterr().out
-    assert "$0.00900" in captured
+    assert "$0.00225" in captured
     assert "est. @ input rate" in captured
 
 
@@ -56,10 +56,10 @@ def test_log_token_usage_falls_back_to_input_rate_for_missing_cache_write_price(
         "cache_write_tokens": 2000,
     }
 
-    log_token_usage(usage, model="gemini-3.5-flash")
+    log_token_usage(usage, model="mistral-large-latest")
 
     captured = capsys.readouterr().out
-    assert "$0.00900" in captured
+    assert "$0.00225" in captured
     assert "est. @ input rate" in captured
 
 
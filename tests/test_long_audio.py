@@ -0,0 +1,115 @@
+"""Tests for chunked long-audio transcription in audio_tools.py."""
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import audio_preprocessing, audio_tools  # noqa: E402
+from aitools.third_party_apis import openai_tools  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def no_preprocessing(monkeypatch):
+    # These tests send the file as it is; conversion is covered in test_audio_preprocessing.py.
+    monkeypatch.setitem(audio_preprocessing._settings, "enabled", False)
+
+
+def test_chunks_are_cut_in_silences():
+    silences = [(100, 101), (550, 552), (1000, 1010), (1500, 1504)]
+
+    chunks = audio_tools.plan_chunks(1800, silences, 600)
+
+    assert chunks == [(0.0, 551.0), (551.0, 1005.0), (1005.0, 1502.0), (1502.0, 1800)]
+
+
+def test_chunks_without_silence_are_cut_at_the_limit():
+    assert audio_tools.plan_chunks(1300, [(10, 11)], 600) == [(0.0, 600.0), (600.0, 1200.0), (1200.0, 1300)]
+    assert audio_tools.plan_chunks(300, [], 600) == [(0.0, 300)]
+
+
+@pytest.fixture
+def fake_whisper(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def fake_transcribe(audio_file, model, language=None):
+        name = os.path.basename(audio_file.name)
+        with lock:
+            calls.append((name, model))
+        i = int(name.split("_")[-1].split(".")[0]) if name.startswith("chunk") else 0
+        return SimpleNamespace(
+            text=f" part {i} ",
+            language="english",
+            duration=10.0,
+            segments=[
+                SimpleNamespace(id=0, start=0.0, end=4.0, text=f"part {i} a"),
+                SimpleNamespace(id=1, start=4.0, end=10.0, text=f"part {i} b"),
+            ],
+        )
+
+    monkeypatch.setattr(openai_tools, "transcribe_via_openai", fake_transcribe)
+    return calls
+
+
+@pytest.fixture
+def mp3(tmp_path):
+    path = tmp_path / "talk.mp3"
+    path.write_bytes(b"\0" * 1000)
+    return str(path)
+
+
+def test_short_audio_is_one_request(fake_whisper, mp3):
+    transcription = audio_tools.transcribe(mp3)
+
+    assert fake_whisper == [("talk.mp3", "whisper-1")]
+    assert transcription.text == "part 0"
+    assert transcription.chunks == 1
+    assert transcription.segments[1] == {"id": 1, "start": 4.0, "end": 10.0, "text": "part 0 b"}
+
+
+def test_long_audio_is_stitched_with_offsets(fake_whisper, mp3, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(audio_tools, "audio_duration", lambda path: 25.0)
+    monkeypatch.setattr(audio_tools, "detect_silences", lambda path: [])
+
+    def fake_split(file_path, chunks, directory):
+        paths = []
+        for i, _ in enumerate(chunks):
+            paths.append(os.path.join(directory, f"chunk_{i:04d}.mp3"))
+            open(paths[-1], "wb").close()
+        return paths
+
+    monkeypatch.setattr(audio_tools, "split_audio", fake_split)
+    monkeypatch.setattr(audio_tools, "record_usage", lambda *args, **kwargs: recorded.append(kwargs))
+
+    transcription = audio_tools.transcribe(mp3, long_audio=True, max_chunk_seconds=10)
+
+    assert len(fake_whisper) == 3
+    assert transcription.text == "part 0 part 1 part 2"
+    assert [s["id"] for s in transcription.segments] == list(range(6))
+    assert [s["start"] for s in transcription.segments] == [0.0, 4.0, 10.0, 14.0, 20.0, 24.0]
+    assert transcription.duration == 30.0
+    assert recorded[0]["duration_seconds"] == 30.0
+
+
+def test_files_over_the_upload_limit_are_split_to_fit(fake_whisper, mp3, monkeypatch):
+    planned = []
+    monkeypatch.setitem(audio_tools.ALL_SPEECH_REC["whisper-1"], "max_upload_bytes", 500)
+    monkeypatch.setattr(audio_tools, "audio_duration", lambda path: 100.0)
+    monkeypatch.setattr(audio_tools, "detect_silences", lambda path: [])
+
+    def fake_split(file_path, chunks, directory):
+        planned.extend(chunks)
+        return [file_path] * len(chunks)
+
+    monkeypatch.setattr(audio_tools, "split_audio", fake_split)
+
+    audio_tools.transcribe(mp3)
+
+    # 1000 bytes over 100 seconds with a 450-byte budget: chunks of at most 45 seconds.
+    assert planned == [(0.0, 45.0), (45.0, 90.0), (90.0, 100.0)]
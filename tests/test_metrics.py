@@ -0,0 +1,122 @@
+"""Tests for the latency and throughput histograms in metrics.py."""
+import os
+import sys
+import types
+import urllib.request
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import audio_tools, image_tools, metrics, text_tools, usage_ledger  # noqa: E402
+from aitools.third_party_apis import openai_tools  # noqa: E402
+
+FAKE_RESPONSE = types.SimpleNamespace(
+    choices=[types.SimpleNamespace(message=types.SimpleNamespace(content="measured"))],
+    usage=types.SimpleNamespace(
+        prompt_tokens=100, completion_tokens=50, prompt_tokens_details=types.SimpleNamespace(cached_tokens=0),
+    ),
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=lambda **kwargs: FAKE_RESPONSE)))
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: client)
+    usage_ledger.configure_usage_ledger(quiet=True)
+    metrics.reset_metrics()
+    yield
+    metrics.configure_metrics(enabled=True)
+    usage_ledger.configure_usage_ledger()
+
+
+def series(name, model):
+    return next(s for s in metrics.metrics_snapshot()[name] if s["labels"]["model"] == model)
+
+
+def test_llm_calls_are_observed_per_provider_and_model():
+    for _ in range(2):
+        text_tools.prompt_llm(["hi"], model="gpt-4o-mini")
+
+    latency = series("request_latency_seconds", "gpt-4o-mini")
+    assert latency["labels"] == {"kind": "llm", "provider": "openai", "model": "gpt-4o-mini"}
+    assert latency["count"] == 2
+    assert latency["buckets"]["+Inf"] == 2
+    assert series("rate_limit_wait_seconds", "gpt-4o-mini")["count"] == 2
+    assert series("retry_wait_seconds", "gpt-4o-mini")["count"] == 2
+    assert series("output_tokens_per_second", "gpt-4o-mini")["count"] == 2
+
+
+def test_throughput_excludes_time_to_first_token():
+    usage_ledger.record_usage("llm", "gpt-4o-mini", "openai", output_tokens=100, latency=3.0, time_to_first_token=1.0)
+
+    tokens_per_second = series("output_tokens_per_second", "gpt-4o-mini")
+    assert tokens_per_second["sum"] == pytest.approx(50)
+    assert series("time_to_first_token_seconds", "gpt-4o-mini")["sum"] == pytest.approx(1.0)
+
+
+def test_cache_hits_are_counted_but_not_timed():
+    usage_ledger.record_usage("llm", "gpt-4o-mini", "openai", output_tokens=10, latency=2.0, response_cache_hit=True)
+
+    snapshot = metrics.metrics_snapshot()
+    assert "request_latency_seconds" not in snapshot
+    assert snapshot["response_cache_hits_total"][0]["value"] == 1
+
+
+def test_bulk_prompting_observes_queue_wait(monkeypatch):
+    async def create(**kwargs):
+        return FAKE_RESPONSE
+
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_tools, "_get_async_client", lambda: client)
+
+    list(text_tools.prompt_llm_many([{"messages": [f"hi {i}"]} for i in range(3)], concurrency=1))
+
+    assert series("queue_wait_seconds", "gpt-4o-mini")["count"] == 3
+
+
+def test_image_and_transcription_calls_are_observed(monkeypatch):
+    module = types.SimpleNamespace(generate_image_via_openai=lambda **kwargs: ["https://example.com/a.png"])
+    monkeypatch.setattr(image_tools.importlib, "import_module", lambda name: module)
+
+    image_tools.generate_image("a lighthouse", model="dall-e-3")
+    audio_tools.log_transcription_cost(30, "whisper-1", latency=1.5)
+
+    assert series("request_latency_seconds", "dall-e-3")["labels"]["kind"] == "image"
+    transcription = series("request_latency_seconds", "whisper-1")
+    assert transcription["labels"]["kind"] == "transcription"
+    assert transcription["sum"] == pytest.approx(1.5)
+
+
+def test_prometheus_exposition_format():
+    metrics.observe("request_latency_seconds", 0.3, "llm", "openai", 'model "quoted"')
+
+    text = metrics.render_metrics()
+
+    assert "# TYPE aitools_request_latency_seconds histogram" in text
+    labels = 'kind="llm",provider="openai",model="model \\"quoted\\""'
+    assert f'aitools_request_latency_seconds_bucket{{{labels},le="0.25"}} 0' in text
+    assert f'aitools_request_latency_seconds_bucket{{{labels},le="0.5"}} 1' in text
+    assert f'aitools_request_latency_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+    assert f"aitools_request_latency_seconds_count{{{labels}}} 1" in text
+
+
+def test_metrics_server_serves_the_exposition():
+    metrics.observe("retry_wait_seconds", 0.0, "llm", "openai", "gpt-4o-mini")
+    server = metrics.start_metrics_server(port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            body = response.read().decode()
+    finally:
+        server.shutdown()
+
+    assert "aitools_retry_wait_seconds_count" in body
+
+
+def test_disabled_metrics_observe_nothing():
+    metrics.configure_metrics(enabled=False)
+
+    text_tools.prompt_llm(["hi"], model="gpt-4o-mini")
+
+    assert metrics.metrics_snapshot() == {}
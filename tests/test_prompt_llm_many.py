@@ -0,0 +1,107 @@
+"""Tests for bounded-concurrency bulk prompting in text_tools.py."""
+import asyncio
+import os
+import re
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aitools.media_tools import text_tools  # noqa: E402
+from aitools.third_party_apis import openai_tools  # noqa: E402
+
+
+class FakeUsage:
+    class prompt_tokens_details:
+        cached_tokens = 0
+
+    prompt_tokens = 10
+    completion_tokens = 2
+
+
+class FakeResponse:
+    def __init__(self, text):
+        message = type("Message", (), {"content": text})
+        self.choices = [type("Choice", (), {"message": message})]
+        self.usage = FakeUsage
+
+
+class FakeAsyncCompletions:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        text = kwargs["messages"][-1]["content"][0]["text"]
+        if text == "boom":
+            raise RuntimeError("provider error")
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Later prompts finish first so completion order differs from input order.
+        await asyncio.sleep(0.02 / (1 + int(text)))
+        self.in_flight -= 1
+        return FakeResponse(f"reply {text}")
+
+
+class FakeAsyncOpenai:
+    def __init__(self):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeAsyncCompletions()
+
+
+def _patch_client(monkeypatch):
+    fake_client = FakeAsyncOpenai()
+    monkeypatch.setattr(openai_tools, "_get_async_client", lambda: fake_client)
+    return fake_client
+
+
+def _specs(n):
+    return [{"messages": [{"text": str(i)}], "model": "gpt-4o-mini"} for i in range(n)]
+
+
+def test_results_are_yielded_in_input_order(monkeypatch):
+    _patch_client(monkeypatch)
+
+    results = list(text_tools.prompt_llm_many(_specs(6)))
+
+    assert results == [(i, f"reply {i}") for i in range(6)]
+
+
+def test_as_completed_yields_every_result(monkeypatch):
+    _patch_client(monkeypatch)
+
+    results = list(text_tools.prompt_llm_many(_specs(6), ordered=False))
+
+    assert sorted(results) == [(i, f"reply {i}") for i in range(6)]
+    assert [i for i, _ in results] != list(range(6))
+
+
+def test_per_provider_concurrency_is_bounded(monkeypatch):
+    fake_client = _patch_client(monkeypatch)
+
+    list(text_tools.prompt_llm_many(_specs(10), concurrency={"openai": 3}))
+
+    assert fake_client.chat.completions.max_in_flight == 3
+
+
+def test_usage_is_logged_once_as_a_summary(monkeypatch, capsys):
+    _patch_client(monkeypatch)
+
+    list(text_tools.prompt_llm_many(_specs(4)))
+
+    captured = capsys.readouterr().out
+    assert captured.count("Prompt Tokens") == 1
+    assert re.search(r"Prompt Tokens\s+40\n", captured)
+    assert re.search(r"Response Tokens\s+8\n", captured)
+
+
+def test_return_exceptions_keeps_the_batch_running(monkeypatch):
+    _patch_client(monkeypatch)
+    specs = _specs(3)
+    specs[1] = {"messages": [{"text": "boom"}], "model": "gpt-4o-mini"}
+
+    results = list(text_tools.prompt_llm_many(specs, return_exceptions=True))
+
+    assert results[0] == (0, "reply 0")
+    assert isinstance(results[1][1], RuntimeError)
+    assert results[2] == (2, "reply 2")
@@ -0,0 +1,190 @@
+"""Tests for the token-bucket rate limiter in rate_limits.py."""
+import asyncio
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.third_party_apis import rate_limits, retries  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _patch_clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limits.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limits.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_requests_wait_once_rpm_is_exhausted(monkeypatch):
+    clock = _patch_clock(monkeypatch)
+    limiter = rate_limits.RateLimiter(rpm=2)
+
+    limiter.acquire()
+    limiter.acquire()
+    start = clock.now
+    limiter.acquire()
+
+    # Two requests per minute refill one request every 30 seconds.
+    assert clock.now - start == 30
+
+
+def test_tokens_are_charged_up_front_and_reconciled(monkeypatch):
+    clock = _patch_clock(monkeypatch)
+    limiter = rate_limits.RateLimiter(tpm=1000)
+
+    charged = limiter.acquire(800)
+    assert charged == 800
+    assert limiter._try_reserve(800) > 0
+
+    # The call only used 100 tokens, so 700 are refunded immediately.
+    limiter.reconcile(charged, 100)
+    start = clock.now
+    limiter.acquire(800)
+    assert clock.now == start
+
+
+def test_oversized_requests_are_clamped_to_bucket_capacity(monkeypatch):
+    _patch_clock(monkeypatch)
+    limiter = rate_limits.RateLimiter(tpm=1000)
+
+    assert limiter.acquire(5000) == 1000
+
+
+def test_aacquire_sleeps_without_blocking(monkeypatch):
+    clock = _patch_clock(monkeypatch)
+    limiter = rate_limits.RateLimiter(rpm=1)
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limits.asyncio, "sleep", fake_sleep)
+
+    async def run():
+        await limiter.aacquire()
+        await limiter.aacquire()
+
+    asyncio.run(run())
+
+    assert sleeps == [60]
+
+
+def test_unlimited_models_never_wait(monkeypatch):
+    clock = _patch_clock(monkeypatch)
+    limiter = rate_limits.get_rate_limiter("deepseek-v4-flash")
+
+    for _ in range(1000):
+        limiter.acquire(10**6)
+
+    assert clock.now == 1000.0
+
+
+def test_registry_limits_and_estimates():
+    limiter = rate_limits.get_rate_limiter("gpt-4o-mini")
+    assert limiter._requests.capacity == 500
+    assert limiter._tokens.capacity == 200000
+
+    estimate = rate_limits.estimate_request_tokens(
+        messages=[{"text": "x" * 400}, {"image": "photo.jpg"}],
+        system_prompt="y" * 40,
+        max_tokens=50,
+    )
+    assert estimate == 110 + rate_limits.TOKENS_PER_IMAGE + 50
+
+
+class RateLimitError(Exception):
+    status_code = 429
+    response = types.SimpleNamespace(status_code=429, headers={})
+
+
+def _failing_then(result, failures):
+    attempts = []
+
+    def call():
+        attempts.append(rate_limits.get_rate_limiter("gpt-4o-mini")._tokens.level)
+        if len(attempts) <= failures:
+            raise RateLimitError()
+        return result
+
+    return call, attempts
+
+
+def test_each_retry_acquires_and_failed_attempts_are_refunded(monkeypatch):
+    _patch_clock(monkeypatch)
+    monkeypatch.setattr(rate_limits, "_limiters", {})
+    rate_limits.set_rate_limits("gpt-4o-mini", tpm=10000)
+    estimate = rate_limits.estimate_request_tokens(["hi"], "", 100, "gpt-4o-mini")
+    call, attempts = _failing_then("ok", failures=2)
+
+    (result, charged), stats = retries.with_retries(
+        rate_limits.rate_limited(call, "gpt-4o-mini", ["hi"], "", 100), "openai",
+    )
+
+    # Every attempt saw its own charge, and the failed ones were given back.
+    assert result == "ok" and charged == estimate
+    assert attempts == [10000 - estimate] * 3
+    rate_limits.reconcile_rate_limit("gpt-4o-mini", charged, {"input_tokens": 5, "output_tokens": 5})
+    assert rate_limits.get_rate_limiter("gpt-4o-mini")._tokens.level == 10000 - 10
+
+
+def test_async_failures_are_refunded(monkeypatch):
+    _patch_clock(monkeypatch)
+    monkeypatch.setattr(rate_limits, "_limiters", {})
+    rate_limits.set_rate_limits("gpt-4o-mini", tpm=10000)
+    monkeypatch.setitem(retries._settings, "max_attempts", 1)
+    failing, _ = _failing_then("ok", failures=1)
+
+    async def call():
+        return failing()
+
+    async def run():
+        await retries.awith_retries(rate_limits.arate_limited(call, "gpt-4o-mini", ["hi"], "", 100), "openai")
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(run())
+    assert rate_limits.get_rate_limiter("gpt-4o-mini")._tokens.level == 10000
+
+
+def test_formatted_chat_messages_are_estimated():
+    formatted = [
+        {"role": "user", "content": [{"type": "text", "text": "x" * 400}, {"type": "image_url", "image_url": {"url": "data:"}}]},
+        {"role": "assistant", "content": "y" * 400},
+    ]
+
+    openai_estimate = rate_limits.estimate_formatted_tokens(formatted, [{"role": "system", "content": "z" * 40}], 50, "deepseek-v4-flash")
+    claude_estimate = rate_limits.estimate_formatted_tokens(formatted, [{"type": "text", "text": "z" * 40}], 50, "deepseek-v4-flash")
+
+    assert openai_estimate == claude_estimate > rate_limits.TOKENS_PER_IMAGE + 50
+
+
+def test_chat_streams_are_charged_to_the_shared_limiter(monkeypatch):
+    from aitools.third_party_apis import openai_tools
+
+    _patch_clock(monkeypatch)
+    monkeypatch.setattr(rate_limits, "_limiters", {})
+    rate_limits.set_rate_limits("gpt-4o-mini", rpm=10, tpm=10000)
+    usage = types.SimpleNamespace(prompt_tokens=30, completion_tokens=20, prompt_tokens_details=None)
+    chunks = [types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content="hi"))], usage=usage)]
+    completions = types.SimpleNamespace(create=lambda **kwargs: chunks)
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions)))
+
+    openai_tools.stream_openai([{"role": "user", "content": "hello"}], model="gpt-4o-mini", formatted_system_prompt=[], max_tokens=100)
+
+    limiter = rate_limits.get_rate_limiter("gpt-4o-mini")
+    assert limiter._requests.level == 9
+    assert limiter._tokens.level == 10000 - 50
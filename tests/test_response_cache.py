@@ -0,0 +1,130 @@
+"""Tests for the on-disk LLM response cache in response_cache.py."""
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import response_cache, text_tools  # noqa: E402
+from aitools.third_party_apis import openai_tools  # noqa: E402
+
+
+class FakeUsage:
+    class prompt_tokens_details:
+        cached_tokens = 0
+
+    prompt_tokens = 1000
+    completion_tokens = 500
+
+
+class FakeResponse:
+    class _Choice:
+        class message:
+            content = "fresh answer"
+
+    choices = [_Choice]
+    usage = FakeUsage
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return FakeResponse
+
+
+class FakeClient:
+    def __init__(self):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeCompletions()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = response_cache.enable_response_cache(path=str(tmp_path / "responses.sqlite"))
+    yield cache
+    response_cache.disable_response_cache()
+
+
+def test_prompt_key_ignores_formatting_and_image_paths(tmp_path):
+    first = tmp_path / "a.png"
+    second = tmp_path / "b.png"
+    first.write_bytes(b"same pixels")
+    second.write_bytes(b"same pixels")
+
+    key_a = response_cache.make_prompt_key("gpt-4o-mini", ["hi", {"image": str(first)}], "sys", 100)
+    key_b = response_cache.make_prompt_key("gpt-4o-mini", [{"text": "hi", "cache": True}, {"image": str(second)}], ["sys"], 100)
+    key_c = response_cache.make_prompt_key("gpt-4o-mini", ["hi", {"image": str(first)}], "sys", 100, temperature=0.5)
+
+    assert key_a == key_b
+    assert key_a != key_c
+
+
+def test_hits_misses_and_lru_eviction(tmp_path):
+    cache = response_cache.ResponseCache(path=str(tmp_path / "c.sqlite"), max_bytes=70)
+
+    cache.put("a", {"text": "x" * 20})
+    cache.put("b", {"text": "y" * 20})
+    assert cache.get("a") == {"text": "x" * 20}  # "a" is now most recently used
+    cache.put("c", {"text": "z" * 20})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["entries"] == 2
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = response_cache.ResponseCache(path=str(tmp_path / "c.sqlite"), ttl=60)
+    cache.put("a", {"text": "old"})
+
+    now = response_cache.time.time()
+    monkeypatch.setattr(response_cache.time, "time", lambda: now + 120)
+
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_prompt_llm_returns_cached_response_with_zeroed_usage(cache, monkeypatch, capsys):
+    fake_client = FakeClient()
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: fake_client)
+
+    first = text_tools.prompt_llm(messages=[{"text": "hi"}], model="gpt-4o-mini")
+    capsys.readouterr()
+    second = text_tools.prompt_llm(messages=[{"text": "hi"}], model="gpt-4o-mini")
+    captured = capsys.readouterr().out
+
+    assert first == second == "fresh answer"
+    assert fake_client.chat.completions.calls == 1
+    assert "Using cached response" in captured
+    assert "$0.00000" in captured
+    # 1000 input tokens at 0.15/M plus 500 output tokens at 0.60/M
+    assert "Saved by Response Cache" in captured and "$0.00045" in captured
+
+
+def test_bypass_cache_calls_the_provider(cache, monkeypatch):
+    fake_client = FakeClient()
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: fake_client)
+
+    text_tools.prompt_llm(messages=[{"text": "hi"}], model="gpt-4o-mini")
+    text_tools.prompt_llm(messages=[{"text": "hi"}], model="gpt-4o-mini", bypass_cache=True)
+
+    assert fake_client.chat.completions.calls == 2
+
+
+def test_bypass_cache_replaces_the_stale_entry(cache, monkeypatch):
+    fake_client = FakeClient()
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: fake_client)
+    text_tools.prompt_llm(messages=[{"text": "hi"}], model="gpt-4o-mini")
+
+    monkeypatch.setattr(FakeResponse._Choice.message, "content", "newer answer")
+    assert text_tools.prompt_llm(messages=[{"text": "hi"}], model="gpt-4o-mini", bypass_cache=True) == "newer answer"
+
+    assert text_tools.prompt_llm(messages=[{"text": "hi"}], model="gpt-4o-mini") == "newer answer"
+    assert fake_client.chat.completions.calls == 2
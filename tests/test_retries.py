@@ -0,0 +1,200 @@
+"""Tests for the shared retry layer in retries.py."""
+import asyncio
+import os
+import sys
+import types
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.third_party_apis import openai_tools, retries  # noqa: E402
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+class FlakyCall:
+    def __init__(self, errors, result="ok"):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(retries.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_retries_rate_limits_and_reports_stats(no_sleep):
+    call = FlakyCall([FakeStatusError(429), FakeStatusError(503)])
+
+    result, stats = retries.with_retries(call, "openai")
+
+    assert result == "ok"
+    assert call.calls == 3
+    assert stats["retries"] == 2
+    assert stats["retry_wait_seconds"] == pytest.approx(sum(no_sleep))
+
+
+def test_fatal_errors_are_not_retried():
+    call = FlakyCall([FakeStatusError(400)])
+
+    with pytest.raises(FakeStatusError):
+        retries.with_retries(call, "openai")
+
+    assert call.calls == 1
+
+
+def test_overloaded_is_retryable_only_for_anthropic():
+    assert retries.is_retryable(FakeStatusError(529), "anthropic")
+    assert not retries.is_retryable(FakeStatusError(529), "openai")
+    assert retries.is_retryable(APIConnectionError(), "mistral")
+    assert not retries.is_retryable(ValueError("bad input"), "mistral")
+
+
+def test_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setitem(retries._settings, "max_attempts", 3)
+    call = FlakyCall([FakeStatusError(500)] * 5)
+
+    with pytest.raises(FakeStatusError):
+        retries.with_retries(call, "openai")
+
+    assert call.calls == 3
+
+
+def test_backoff_is_full_jitter_within_exponential_ceiling(no_sleep, monkeypatch):
+    monkeypatch.setattr(retries.random, "uniform", lambda low, high: high)
+    call = FlakyCall([FakeStatusError(500)] * 3)
+
+    retries.with_retries(call, "openai")
+
+    assert no_sleep == [1.0, 2.0, 4.0]
+
+
+@pytest.mark.parametrize("headers,expected", [
+    ({"retry-after": "7"}, 7.0),
+    ({"retry-after-ms": "1500"}, 1.5),
+    ({"x-ratelimit-reset-requests": "1m30s"}, 90.0),
+    ({"x-ratelimit-reset-requests": "6m0s"}, retries.MAX_RETRY_AFTER),
+    ({"x-ratelimit-reset-tokens": "250ms"}, 0.25),
+])
+def test_server_requested_waits_are_honoured(no_sleep, headers, expected):
+    call = FlakyCall([FakeStatusError(429, headers)])
+
+    retries.with_retries(call, "openai")
+
+    assert no_sleep == [pytest.approx(expected)]
+
+
+def test_reset_headers_are_ignored_on_overload(no_sleep, monkeypatch):
+    monkeypatch.setattr(retries.random, "uniform", lambda low, high: high)
+    headers = {"anthropic-ratelimit-requests-reset": "2000-01-01T00:00:00Z", "x-ratelimit-reset-requests": "6ms"}
+    call = FlakyCall([FakeStatusError(529, headers)] * 2)
+
+    retries.with_retries(call, "anthropic")
+
+    # Jittered exponential backoff, not the (past or tiny) reset times.
+    assert no_sleep == [1.0, 2.0]
+
+
+def test_retry_after_is_honoured_for_any_status(no_sleep):
+    call = FlakyCall([FakeStatusError(503, {"retry-after": "3"})])
+
+    retries.with_retries(call, "openai")
+
+    assert no_sleep == [3.0]
+
+
+def test_rate_limit_waits_for_the_latest_reset(no_sleep):
+    headers = {"x-ratelimit-reset-requests": "120ms", "x-ratelimit-reset-tokens": "12s"}
+    call = FlakyCall([FakeStatusError(429, headers)])
+
+    retries.with_retries(call, "openai")
+
+    assert no_sleep == [pytest.approx(12.0)]
+
+
+def test_async_retries(monkeypatch):
+    waits = []
+
+    async def fake_sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(retries.asyncio, "sleep", fake_sleep)
+    errors = [FakeStatusError(429, {"retry-after": "2"})]
+
+    async def call():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    result, stats = asyncio.run(retries.awith_retries(call, "anthropic"))
+
+    assert result == "ok"
+    assert waits == [2.0]
+    assert stats == {"retries": 1, "retry_wait_seconds": 2.0}
+
+
+def test_prompt_openai_surfaces_retry_counters(monkeypatch):
+    usage = types.SimpleNamespace(
+        prompt_tokens=10, completion_tokens=5, prompt_tokens_details=types.SimpleNamespace(cached_tokens=0),
+    )
+    chat_response = types.SimpleNamespace(
+        choices=[types.SimpleNamespace(message=types.SimpleNamespace(content="hi"))],
+        usage=usage,
+    )
+    create = FlakyCall([FakeStatusError(429, {"retry-after": "1"})], result=chat_response)
+    fake_client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(
+        create=lambda **kwargs: create(),
+    )))
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: fake_client)
+
+    result = openai_tools.prompt_openai(messages=[{"text": "hi"}])
+
+    assert result["text"] == "hi"
+    assert result["retries"] == 1
+    assert result["retry_wait_seconds"] == 1.0
+
+
+def test_chat_streams_are_retried(no_sleep, monkeypatch, capsys):
+    chunk = types.SimpleNamespace(
+        choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content="hello"))],
+        usage=None,
+    )
+    create = FlakyCall([FakeStatusError(429)], result=[chunk])
+    completions = types.SimpleNamespace(create=lambda **kwargs: create())
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions)))
+
+    response = openai_tools.stream_openai([{"role": "user", "content": "hi"}], model="gpt-4o-mini", formatted_system_prompt=[])
+
+    assert response["text"] == "hello"
+    assert response["retries"] == 1
+    assert capsys.readouterr().out.endswith("\nhello")
+
+
+@pytest.mark.parametrize("settings", [{"max_attempts": 0}, {"base_delay": -1}, {"max_delay": -0.5}])
+def test_invalid_retry_settings_are_rejected(settings):
+    before = dict(retries._settings)
+
+    with pytest.raises(ValueError):
+        retries.configure_retries(**settings)
+
+    assert retries._settings == before
@@ -0,0 +1,83 @@
+"""Tests for saving generated images to disk in image_tools.py."""
+import base64
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import image_tools  # noqa: E402
+from aitools.third_party_apis import http_clients  # noqa: E402
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4000  # about 1 MB, several decode slices
+
+
+class FakeDownload:
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.content is None:
+            raise RuntimeError("404")
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+class FakeSession:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def get(self, url, stream=False, timeout=None):
+        assert stream and timeout
+        self.requested.append(url)
+        return FakeDownload(self.pages.get(url))
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = FakeSession({"https://img/1": PNG, "https://img/2": PNG[:1000]})
+    monkeypatch.setattr(http_clients, "get_requests_session", lambda: session)
+    return session
+
+
+def test_b64_images_are_decoded_without_a_download(tmp_path, session):
+    image = SimpleNamespace(b64_json=base64.b64encode(PNG).decode(), url="https://img/1")
+
+    saved = image_tools.save_images(SimpleNamespace(data=[image]), str(tmp_path / "out.png"))
+
+    assert session.requested == []
+    assert saved[0]["source"] == "b64"
+    assert saved[0]["bytes"] == len(PNG)
+    assert (tmp_path / "out.png").read_bytes() == PNG
+
+
+def test_urls_are_downloaded_to_distinct_names(tmp_path, session):
+    (tmp_path / "out.png").write_bytes(b"existing")
+    response = SimpleNamespace(data=[SimpleNamespace(url="https://img/1"), SimpleNamespace(url="https://img/2")])
+
+    saved = image_tools.save_images(response, str(tmp_path / "out.png"))
+
+    assert [os.path.basename(s["path"]) for s in saved] == ["out_v2.png", "out_v3.png"]
+    assert [s["bytes"] for s in saved] == [len(PNG), 1000]
+    assert (tmp_path / "out_v3.png").read_bytes() == PNG[:1000]
+    assert (tmp_path / "out.png").read_bytes() == b"existing"
+
+
+def test_failed_downloads_leave_no_files(tmp_path, session):
+    response = SimpleNamespace(data=[SimpleNamespace(url="https://img/1"), SimpleNamespace(url="https://img/missing")])
+
+    with pytest.raises(RuntimeError):
+        image_tools.save_images(response, str(tmp_path / "out.png"))
+
+    assert sorted(os.listdir(tmp_path)) == ["out.png"]
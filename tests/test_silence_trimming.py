@@ -0,0 +1,66 @@
+"""Tests for silence trimming before transcription in audio_tools.py."""
+import os
+import sys
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import audio_preprocessing, audio_tools  # noqa: E402
+from aitools.third_party_apis import openai_tools  # noqa: E402
+
+SILENCES = [(0.0, 3.0), (10.0, 10.5), (20.0, 50.0), (58.0, 60.0)]
+
+
+def test_long_silences_are_cut_down_to_padding():
+    spans = audio_tools.plan_speech_spans(60.0, SILENCES, min_silence=1.0, padding=0.25)
+
+    # The half-second pause is kept; the rest are cut, keeping 0.25s at each edge.
+    assert spans == [(2.75, 20.25), (49.75, 58.25)]
+
+
+def test_trimmed_times_map_back_to_the_original():
+    mapping = audio_tools.offset_map([(2.75, 20.25), (49.75, 58.25)])
+
+    assert mapping == [(0.0, 2.75), (17.5, 49.75)]
+    assert audio_tools.original_time(0.0, mapping) == 2.75
+    assert audio_tools.original_time(10.0, mapping) == 12.75
+    assert audio_tools.original_time(18.5, mapping) == 50.75
+
+
+def test_transcribe_sends_the_trimmed_audio(monkeypatch, tmp_path):
+    monkeypatch.setitem(audio_preprocessing._settings, "enabled", False)
+    note = tmp_path / "note.mp3"
+    note.write_bytes(b"voice note")
+    sent, recorded = [], []
+
+    def fake_trim(file_path, spans, output_path):
+        open(output_path, "wb").close()
+        return output_path
+
+    def fake_transcribe(audio_file, model, language=None):
+        sent.append(os.path.basename(audio_file.name))
+        return SimpleNamespace(
+            text="hello ... again",
+            language="english",
+            duration=26.0,
+            segments=[
+                SimpleNamespace(id=0, start=0.0, end=5.0, text="hello"),
+                SimpleNamespace(id=1, start=18.0, end=26.0, text="again"),
+            ],
+        )
+
+    monkeypatch.setattr(audio_tools, "audio_duration", lambda path: 60.0)
+    monkeypatch.setattr(audio_tools, "detect_silences", lambda path: SILENCES)
+    monkeypatch.setattr(audio_tools, "trim_audio", fake_trim)
+    monkeypatch.setattr(openai_tools, "transcribe_via_openai", fake_transcribe)
+    monkeypatch.setattr(audio_tools, "record_usage", lambda *args, **kwargs: recorded.append(kwargs))
+
+    transcription = audio_tools.transcribe(str(note), trim_silence=True)
+
+    assert sent == ["trimmed.ogg"]
+    assert transcription.trimmed_seconds == pytest.approx(34.0)
+    assert [(s["start"], s["end"]) for s in transcription.segments] == [(2.75, 7.75), (50.25, 58.25)]
+    assert recorded[0]["duration_seconds"] == 26.0
@@ -0,0 +1,170 @@
+"""Tests for the generator-based streaming API (stream_llm and the provider stream adapters)."""
+import asyncio
+from collections import OrderedDict
+import os
+import sys
+import types
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("MISTRAL_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import response_cache, text_tools  # noqa: E402
+from aitools.third_party_apis import anthropic_tools, google_tools, mistral_tools, openai_tools  # noqa: E402
+
+
+def openai_chunks(deltas, usage):
+    for delta in deltas:
+        yield types.SimpleNamespace(
+            choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=delta))],
+            usage=None,
+        )
+    # With include_usage, the final chunk has no choices and carries the totals.
+    yield types.SimpleNamespace(choices=[], usage=usage)
+
+
+OPENAI_USAGE = types.SimpleNamespace(
+    prompt_tokens=100, completion_tokens=3, prompt_tokens_details=types.SimpleNamespace(cached_tokens=40),
+)
+
+
+class FakeStreamingCompletions:
+    def __init__(self, deltas, usage):
+        self.deltas = deltas
+        self.usage = usage
+        self.last_kwargs = None
+
+    def create(self, **kwargs):
+        self.last_kwargs = kwargs
+        return openai_chunks(self.deltas, self.usage)
+
+
+class FakeAsyncStreamingCompletions(FakeStreamingCompletions):
+    async def create(self, **kwargs):
+        self.last_kwargs = kwargs
+
+        async def chunks():
+            for chunk in openai_chunks(self.deltas, self.usage):
+                yield chunk
+
+        return chunks()
+
+
+def fake_openai_client(completions):
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+
+
+@pytest.fixture
+def openai_stream(monkeypatch):
+    completions = FakeStreamingCompletions(["Hel", "lo", "!"], OPENAI_USAGE)
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: fake_openai_client(completions))
+    return completions
+
+
+def test_stream_llm_yields_deltas_then_usage(openai_stream):
+    events = list(text_tools.stream_llm(["hi"], model="gpt-4o-mini"))
+
+    assert events[:-1] == ["Hel", "lo", "!"]
+    final = events[-1]
+    assert final["text"] == "Hello!"
+    assert final["input_tokens"] == 60
+    assert final["cache_read_tokens"] == 40
+    assert final["output_tokens"] == 3
+    assert 0 <= final["time_to_first_token"] <= final["latency"]
+    assert openai_stream.last_kwargs["stream_options"] == {"include_usage": True}
+
+
+def test_astream_llm_yields_deltas_then_usage(monkeypatch):
+    completions = FakeAsyncStreamingCompletions(["a", "b"], OPENAI_USAGE)
+    monkeypatch.setattr(openai_tools, "_get_async_client", lambda: fake_openai_client(completions))
+
+    async def collect():
+        return [event async for event in text_tools.astream_llm(["hi"], model="gpt-4o-mini")]
+
+    events = asyncio.run(collect())
+
+    assert events[:-1] == ["a", "b"]
+    assert events[-1]["text"] == "ab"
+    assert events[-1]["retries"] == 0
+
+
+def test_claude_stream_reads_usage_from_events(monkeypatch):
+    def events(**kwargs):
+        usage = types.SimpleNamespace(input_tokens=12, output_tokens=1, cache_creation_input_tokens=0, cache_read_input_tokens=8)
+        yield types.SimpleNamespace(type="message_start", message=types.SimpleNamespace(usage=usage))
+        yield types.SimpleNamespace(type="content_block_start")
+        for text in ["Bon", "jour"]:
+            yield types.SimpleNamespace(type="content_block_delta", delta=types.SimpleNamespace(type="text_delta", text=text))
+        yield types.SimpleNamespace(type="message_delta", usage=types.SimpleNamespace(output_tokens=4))
+        yield types.SimpleNamespace(type="message_stop")
+
+    client = types.SimpleNamespace(messages=types.SimpleNamespace(create=events))
+    monkeypatch.setattr(anthropic_tools, "_get_client", lambda: client)
+
+    events = list(text_tools.stream_llm(["hi"], model="claude-haiku-4-5"))
+
+    assert events[:-1] == ["Bon", "jour"]
+    assert events[-1]["text"] == "Bonjour"
+    assert events[-1]["input_tokens"] == 12
+    assert events[-1]["cache_read_tokens"] == 8
+    assert events[-1]["output_tokens"] == 4
+
+
+def test_gemini_stream_skips_usage_only_chunks(monkeypatch):
+    def chunk(text, output_tokens):
+        parts = [types.SimpleNamespace(text=text)] if text else []
+        return types.SimpleNamespace(
+            candidates=[types.SimpleNamespace(content=types.SimpleNamespace(parts=parts))],
+            usage_metadata=types.SimpleNamespace(prompt_token_count=20, candidates_token_count=output_tokens),
+        )
+
+    class FakeGenerativeModel:
+        def __init__(self, **kwargs):
+            pass
+
+        def generate_content(self, stream=False, **kwargs):
+            assert stream
+            return iter([chunk("Gu", 1), chunk("ten Tag", 3), chunk("", 3)])
+
+    monkeypatch.setattr(google_tools._get_genai(), "GenerativeModel", FakeGenerativeModel)
+    monkeypatch.setattr(google_tools, "_models", OrderedDict())
+
+    events = list(google_tools.iter_gemini_stream(["hi"]))
+
+    assert events[:-1] == ["Gu", "ten Tag"]
+    assert events[-1]["text"] == "Guten Tag"
+    assert events[-1]["output_tokens"] == 3
+
+
+def test_mistral_stream_reuses_openai_chunk_parser(monkeypatch):
+    usage = types.SimpleNamespace(prompt_tokens=7, completion_tokens=2)
+    completions = FakeStreamingCompletions(["Ciao"], usage)
+    monkeypatch.setattr(mistral_tools, "_get_client", lambda: fake_openai_client(completions))
+
+    events = list(mistral_tools.iter_mistral_stream(["hi"]))
+
+    assert events == ["Ciao", {"text": "Ciao", "input_tokens": 7, "output_tokens": 2, "retries": 0, "retry_wait_seconds": 0.0}]
+
+
+def test_every_provider_has_stream_adapters():
+    for provider in {info["provider"] for info in text_tools.ALL_LLMS.values()}:
+        assert text_tools._get_adapter_function(provider, "iter_stream") is not None
+        assert text_tools._get_adapter_function(provider, "aiter_stream") is not None
+
+
+def test_stream_llm_replays_cached_responses(openai_stream, tmp_path):
+    response_cache.enable_response_cache(path=str(tmp_path / "responses.sqlite"))
+    try:
+        first = list(text_tools.stream_llm(["hi"], model="gpt-4o-mini"))
+        openai_stream.deltas = ["should", "not", "stream"]
+        second = list(text_tools.stream_llm(["hi"], model="gpt-4o-mini"))
+    finally:
+        response_cache.disable_response_cache()
+
+    assert first[-1]["text"] == "Hello!"
+    assert second[0] == "Hello!"
+    assert second[-1]["response_cache_hit"]
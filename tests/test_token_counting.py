@@ -0,0 +1,88 @@
+"""Tests for local token estimates and pre-flight context-window checks in token_counting.py."""
+import os
+import sys
+import types
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import text_tools  # noqa: E402
+from aitools.third_party_apis import anthropic_tools, openai_tools, token_counting  # noqa: E402
+
+
+@pytest.fixture
+def small_window(monkeypatch):
+    # Shrink haiku's input limit so the tests don't need megabytes of text.
+    model_info = {**text_tools.ALL_LLMS["claude-haiku-4-5"], "input_limit": 1000}
+    monkeypatch.setitem(text_tools.ALL_LLMS, "claude-haiku-4-5", model_info)
+    return model_info
+
+
+def test_heuristic_uses_provider_chars_per_token():
+    tokens = token_counting.estimate_input_tokens(["x" * 3500], "claude-haiku-4-5", system_prompt="")
+
+    assert tokens == token_counting.REQUEST_OVERHEAD_TOKENS + 1001
+
+
+def test_tiktoken_is_used_when_available(monkeypatch):
+    class FakeEncoding:
+        def encode(self, text, disallowed_special=()):
+            return text.split()
+
+    monkeypatch.setitem(token_counting._encodings, "o200k_base", FakeEncoding())
+
+    assert token_counting.estimate_text_tokens("three short words", "gpt-4o-mini") == 3
+
+
+def test_oversized_prompt_is_rejected_before_sending(small_window, monkeypatch):
+    def fail(**kwargs):
+        raise AssertionError("request should not be sent")
+
+    monkeypatch.setattr(anthropic_tools, "_get_client", lambda: types.SimpleNamespace(messages=types.SimpleNamespace(create=fail)))
+
+    with pytest.raises(ValueError, match="input limit"):
+        text_tools.prompt_llm(["word " * 2000], model="claude-haiku-4-5")
+
+
+def test_truncation_keeps_the_beginning_and_fits(small_window):
+    messages = [{"text": "keep me"}, {"text": "start " + "filler " * 1000}]
+
+    fitted = token_counting.fit_context_window(messages, "claude-haiku-4-5", truncate=True)
+
+    assert fitted[0] == {"text": "keep me"}
+    assert fitted[1]["text"].startswith("start ")
+    assert fitted[1]["text"].endswith(token_counting.TRUNCATION_MARKER)
+    assert token_counting.estimate_input_tokens(fitted, "claude-haiku-4-5") <= 1000
+    assert len(messages[1]["text"]) > len(fitted[1]["text"])  # originals untouched
+
+
+def test_small_prompts_skip_counting(monkeypatch):
+    monkeypatch.setattr(token_counting, "estimate_input_tokens", lambda *args, **kwargs: pytest.fail("should not count"))
+
+    assert token_counting.fit_context_window(["hello"], "gpt-4o-mini") == ["hello"]
+
+
+def test_endpoint_counts_are_cached(monkeypatch):
+    calls = []
+
+    def count_tokens(**kwargs):
+        calls.append(kwargs)
+        return types.SimpleNamespace(input_tokens=42)
+
+    client = types.SimpleNamespace(messages=types.SimpleNamespace(count_tokens=count_tokens))
+    monkeypatch.setattr(anthropic_tools, "_get_client", lambda: client)
+
+    for _ in range(2):
+        assert token_counting.estimate_input_tokens(["cached?"], "claude-haiku-4-5", "sys", use_endpoint=True) == 42
+
+    assert len(calls) == 1
+    assert "max_tokens" not in calls[0]
+
+
+def test_endpoint_falls_back_to_local_estimate_for_openai(monkeypatch):
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: pytest.fail("no endpoint call expected"))
+
+    assert token_counting.estimate_input_tokens(["hi"], "gpt-4o-mini", use_endpoint=True) > 0
@@ -0,0 +1,96 @@
+"""Tests for the pipelined transcribe-then-translate flow in audio_tools.py."""
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import audio_preprocessing, audio_tools, text_tools, usage_ledger  # noqa: E402
+from aitools.third_party_apis import openai_tools  # noqa: E402
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    monkeypatch.setitem(audio_preprocessing._settings, "enabled", False)
+    recording = tmp_path / "talk.mp3"
+    recording.write_bytes(b"audio")
+    events = []
+    lock = threading.Lock()
+
+    def fake_split(file_path, chunks, directory):
+        paths = [os.path.join(directory, f"chunk_{i}.mp3") for i in range(len(chunks))]
+        for path in paths:
+            open(path, "wb").close()
+        return paths
+
+    def fake_transcribe(audio_file, model, language=None):
+        i = int(os.path.basename(audio_file.name).split("_")[1].split(".")[0])
+        # The first chunk is the slowest, so translation of later chunks starts before it is done.
+        time.sleep(0.05 if i == 0 else 0.01)
+        with lock:
+            events.append(("transcribed", i))
+        return SimpleNamespace(
+            text=f" hola {i} ",
+            language="english" if i == 2 else "spanish",
+            duration=60.0,
+            segments=[SimpleNamespace(id=0, start=1.0, end=2.0, text=f"hola {i}")],
+        )
+
+    def fake_translate(text, target_lang="English", model="gpt-4o-mini"):
+        with lock:
+            events.append(("translated", text))
+        usage_ledger.record_usage("llm", model, "openai", cost=0.001)
+        return text.replace("hola", "hello")
+
+    monkeypatch.setattr(audio_tools, "audio_duration", lambda path: 240.0)
+    monkeypatch.setattr(audio_tools, "detect_silences", lambda path: [])
+    monkeypatch.setattr(audio_tools, "split_audio", fake_split)
+    monkeypatch.setattr(openai_tools, "transcribe_via_openai", fake_transcribe)
+    monkeypatch.setattr(text_tools, "translate", fake_translate)
+    return str(recording), events
+
+
+def test_chunks_are_translated_as_they_arrive_and_reassembled_in_order(pipeline):
+    recording, events = pipeline
+
+    result = audio_tools.transcribe_and_translate(recording, chunk_seconds=60, transcribe_concurrency=4)
+
+    assert result["transcription"].text == "hola 0 hola 1 hola 2 hola 3"
+    assert [s["start"] for s in result["transcription"].segments] == [1.0, 61.0, 121.0, 181.0]
+    # Chunk 2 is already English, so it is passed through untranslated.
+    assert result["translation"] == "hello 0 hello 1 hola 2 hello 3"
+    assert events.index(("translated", "hola 1")) < events.index(("transcribed", 0))
+
+
+def test_one_combined_cost_report(pipeline, capsys):
+    recording, _ = pipeline
+
+    result = audio_tools.transcribe_and_translate(recording, chunk_seconds=60)
+
+    # Four minutes of whisper-1 at $0.0006 a minute, plus three translations.
+    assert result["cost"] == pytest.approx(4 * 0.0006 + 3 * 0.001)
+    output = capsys.readouterr().out
+    assert output.count("Total") == 1
+    assert "Duration" not in output
+
+
+def test_cached_transcriptions_are_only_translated(pipeline, tmp_path):
+    from aitools.media_tools import response_cache
+
+    recording, events = pipeline
+    response_cache.enable_transcription_cache(path=str(tmp_path / "responses.sqlite"))
+    try:
+        first = audio_tools.transcribe_and_translate(recording, chunk_seconds=60)
+        transcribed = len([e for e in events if e[0] == "transcribed"])
+        second = audio_tools.transcribe_and_translate(recording, chunk_seconds=60)
+    finally:
+        response_cache.disable_transcription_cache()
+
+    assert len([e for e in events if e[0] == "transcribed"]) == transcribed
+    assert second["transcription"] == first["transcription"]
+    assert second["cost"] == pytest.approx(0.001)
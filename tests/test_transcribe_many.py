@@ -0,0 +1,73 @@
+"""Tests for folder-scale batch transcription in audio_tools.py."""
+import json
+import os
+import sys
+import threading
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import audio_preprocessing, audio_tools  # noqa: E402
+
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    # With preprocessing off, MP3s go to the model as they are, so no ffmpeg is needed.
+    monkeypatch.setitem(audio_preprocessing._settings, "enabled", False)
+    (tmp_path / "notes" / "old").mkdir(parents=True)
+    for name in ["a.mp3", "b.mp3", "old/c.mp3", "readme.txt"]:
+        (tmp_path / "notes" / name).write_bytes(b"audio")
+    return tmp_path / "notes"
+
+
+@pytest.fixture
+def fake_transcribe(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def fake(file_path, **kwargs):
+        with lock:
+            calls.append(os.path.basename(file_path))
+        if os.path.basename(file_path) == "fail.mp3":
+            raise RuntimeError("upload failed")
+        return audio_tools.Transcription(text=f"text of {os.path.basename(file_path)}", duration=5.0)
+
+    monkeypatch.setattr(audio_tools, "transcribe", fake)
+    return calls
+
+
+def test_folder_is_transcribed_to_jsonl(folder, fake_transcribe, tmp_path):
+    output = tmp_path / "out" / "results.jsonl"
+
+    records = audio_tools.transcribe_many(str(folder), str(output), processes=2)
+
+    assert sorted(fake_transcribe) == ["a.mp3", "b.mp3", "c.mp3"]
+    assert [os.path.basename(r["file"]) for r in records] == ["a.mp3", "b.mp3", "c.mp3"]
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(line["text"] for line in lines) == ["text of a.mp3", "text of b.mp3", "text of c.mp3"]
+
+
+def test_reruns_resume_and_retry_failures(folder, fake_transcribe, tmp_path):
+    output = tmp_path / "results.jsonl"
+    done = {"file": str(folder / "a.mp3"), "text": "earlier"}
+    failed = {"file": str(folder / "b.mp3"), "error": "RuntimeError: timeout"}
+    output.write_text(json.dumps(done) + "\n" + json.dumps(failed) + "\n" + '{"file": "cut sh')
+
+    records = audio_tools.transcribe_many(str(folder), str(output), processes=1)
+
+    assert sorted(fake_transcribe) == ["b.mp3", "c.mp3"]
+    assert records[0]["text"] == "earlier"
+    assert records[1]["text"] == "text of b.mp3"
+
+
+def test_failures_are_recorded_without_stopping_the_batch(folder, fake_transcribe, tmp_path):
+    (folder / "fail.mp3").write_bytes(b"audio")
+    output = tmp_path / "results.jsonl"
+
+    records = audio_tools.transcribe_many(str(folder), str(output), processes=1)
+
+    by_name = {os.path.basename(r["file"]): r for r in records}
+    assert by_name["fail.mp3"]["error"] == "RuntimeError: upload failed"
+    assert by_name["c.mp3"]["text"] == "text of c.mp3"
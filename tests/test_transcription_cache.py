@@ -0,0 +1,84 @@
+"""Tests for the transcription cache used by audio_tools.transcribe."""
+import os
+import sys
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import audio_preprocessing, audio_tools, response_cache  # noqa: E402
+from aitools.third_party_apis import openai_tools  # noqa: E402
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setitem(audio_preprocessing._settings, "enabled", False)
+    cache = response_cache.enable_transcription_cache(path=str(tmp_path / "responses.sqlite"))
+    yield cache
+    response_cache.disable_transcription_cache()
+
+
+@pytest.fixture
+def whisper(monkeypatch):
+    calls = []
+
+    def fake_transcribe(audio_file, model, language=None):
+        calls.append(language)
+        return SimpleNamespace(
+            text="hello there",
+            language="english",
+            duration=120.0,
+            segments=[SimpleNamespace(id=0, start=0.0, end=2.0, text="hello there")],
+        )
+
+    monkeypatch.setattr(openai_tools, "transcribe_via_openai", fake_transcribe)
+    return calls
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    records = []
+    monkeypatch.setattr(audio_tools, "record_usage", lambda *args, **kwargs: records.append(kwargs))
+    return records
+
+
+@pytest.fixture
+def note(tmp_path):
+    path = tmp_path / "note.mp3"
+    path.write_bytes(b"voice note")
+    return str(path)
+
+
+def test_reruns_are_served_from_the_cache_at_no_cost(cache, whisper, recorded, note):
+    first = audio_tools.transcribe(note)
+    second = audio_tools.transcribe(note)
+
+    assert whisper == [None]
+    assert second == first
+    assert second.segments[0]["text"] == "hello there"
+    assert recorded[0]["cost"] == pytest.approx(0.0012)
+    assert recorded[1]["cost"] == 0
+    assert recorded[1]["response_cache_hit"] is True
+    assert recorded[1]["saved_cost"] == pytest.approx(0.0012)
+
+
+def test_key_covers_content_model_and_language(cache, whisper, recorded, note, tmp_path):
+    copy = tmp_path / "renamed.mp3"
+    copy.write_bytes(b"voice note")
+
+    audio_tools.transcribe(note)
+    audio_tools.transcribe(str(copy))
+    audio_tools.transcribe(note, language="en")
+
+    assert whisper == [None, "en"]
+
+
+def test_bypass_and_disabled_cache_always_call_the_model(cache, whisper, recorded, note):
+    audio_tools.transcribe(note)
+    audio_tools.transcribe(note, bypass_cache=True)
+    response_cache.disable_transcription_cache()
+    audio_tools.transcribe(note)
+
+    assert len(whisper) == 3
@@ -0,0 +1,169 @@
+"""Tests for the structured usage ledger in usage_ledger.py."""
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+from aitools.media_tools import audio_tools, text_tools, usage_ledger  # noqa: E402
+from aitools.third_party_apis import openai_tools  # noqa: E402
+
+
+class FakeUsage:
+    class prompt_tokens_details:
+        cached_tokens = 0
+
+    prompt_tokens = 1000
+    completion_tokens = 500
+
+
+class FakeResponse:
+    class _Choice:
+        class message:
+            content = "ledger me"
+
+    choices = [_Choice]
+    usage = FakeUsage
+
+
+class FakeCompletions:
+    def create(self, **kwargs):
+        return FakeResponse
+
+
+class FakeClient:
+    def __init__(self):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeCompletions()
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, records):
+        self.records.extend(records)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fake_openai(monkeypatch):
+    monkeypatch.setattr(openai_tools, "_get_client", lambda: FakeClient())
+    yield
+    usage_ledger.configure_usage_ledger()
+
+
+@pytest.fixture
+def ledger_files(tmp_path):
+    jsonl = str(tmp_path / "usage.jsonl")
+    db = str(tmp_path / "usage.sqlite")
+    usage_ledger.configure_usage_ledger(sinks=[usage_ledger.JsonlSink(jsonl), usage_ledger.SqliteSink(db)], quiet=True)
+    return jsonl, db
+
+
+def test_calls_are_written_to_every_sink(ledger_files, capsys):
+    jsonl, db = ledger_files
+
+    with usage_ledger.usage_tag("report-job"):
+        text_tools.prompt_llm(["hi"], model="gpt-4o-mini")
+    usage_ledger.flush_usage_ledger()
+
+    with open(jsonl) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 1
+    record = records[0]
+    assert record["kind"] == "llm"
+    assert record["model"] == "gpt-4o-mini"
+    assert record["provider"] == "openai"
+    assert record["tag"] == "report-job"
+    assert record["input_tokens"] == 1000
+    # 1000 input at 0.15/M plus 500 output at 0.60/M
+    assert record["cost"] == pytest.approx(0.00045)
+    assert record["latency"] >= 0
+
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT model, tag FROM usage").fetchall() == [("gpt-4o-mini", "report-job")]
+
+    # Quiet mode suppresses the usage table.
+    assert "Cost" not in capsys.readouterr().out
+
+
+def test_totals_aggregate_per_model():
+    usage_ledger.configure_usage_ledger()
+
+    for _ in range(3):
+        text_tools.prompt_llm(["hi"], model="gpt-4o-mini")
+    audio_tools.log_transcription_cost(90, "whisper-1")
+
+    totals = usage_ledger.usage_totals()
+    assert totals["gpt-4o-mini"]["calls"] == 3
+    assert totals["gpt-4o-mini"]["output_tokens"] == 1500
+    assert totals["gpt-4o-mini"]["cost"] == pytest.approx(3 * 0.00045)
+    assert totals["whisper-1"]["duration_seconds"] == 90
+
+
+def test_bulk_prompting_records_each_call_once(monkeypatch):
+    usage_ledger.configure_usage_ledger(quiet=True)
+
+    async def create(**kwargs):
+        return FakeResponse
+
+    client = FakeClient()
+    client.chat.completions.create = create
+    monkeypatch.setattr(openai_tools, "_get_async_client", lambda: client)
+
+    list(text_tools.prompt_llm_many([{"messages": [f"hi {i}"]} for i in range(4)]))
+
+    assert usage_ledger.usage_totals()["gpt-4o-mini"]["calls"] == 4
+
+
+def test_tags_follow_asyncio_tasks():
+    sink = ListSink()
+    usage_ledger.configure_usage_ledger(sinks=[sink])
+
+    async def tagged(tag):
+        with usage_ledger.usage_tag(tag):
+            await asyncio.sleep(0)
+            usage_ledger.record_usage("llm", "gpt-4o-mini", "openai", cost=0)
+
+    async def main():
+        await asyncio.gather(tagged("a"), tagged("b"))
+
+    asyncio.run(main())
+    usage_ledger.flush_usage_ledger()
+
+    assert sorted(record["tag"] for record in sink.records) == ["a", "b"]
+
+
+def test_a_slow_sink_never_blocks_recording(monkeypatch, capsys):
+    release = threading.Event()
+
+    class SlowSink(ListSink):
+        def write(self, records):
+            release.wait(5)
+            super().write(records)
+
+    monkeypatch.setattr(usage_ledger, "WRITER_QUEUE_SIZE", 3)
+    sink = SlowSink()
+    ledger = usage_ledger.configure_usage_ledger(sinks=[sink], quiet=True)
+
+    started = time.perf_counter()
+    for _ in range(20):
+        usage_ledger.record_usage("llm", "gpt-4o-mini", "openai", cost=0)
+    assert time.perf_counter() - started < 1
+
+    release.set()
+    usage_ledger.flush_usage_ledger()
+    assert usage_ledger.usage_totals()["gpt-4o-mini"]["calls"] == 20
+    assert ledger.dropped > 0
+    assert len(sink.records) == 20 - ledger.dropped
+    assert capsys.readouterr().out.count("dropping records") == 1